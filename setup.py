@@ -52,6 +52,9 @@ setup(
         # No external dependencies - pure Python!
     ],
     extras_require={
+        "columnar": [
+            "numpy>=1.20",
+        ],
         "dev": [
             "pytest>=7.0.0",
             "pytest-cov>=4.0.0",
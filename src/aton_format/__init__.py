@@ -21,11 +21,12 @@ __author__ = "Stefano D'Agostino"
 # Core
 from .core.encoder import ATONEncoder
 from .core.decoder import ATONDecoder
-from .core.types import ATONType, SortOrder
+from .core.types import ATONType, SortOrder, CompressionStats
 
 # Compression
 from .compression.modes import CompressionMode
 from .compression.engine import ATONCompressionEngine
+from .compression.shared import SharedDictionary, train_dictionary
 
 # Query
 from .query.engine import ATONQueryEngine
@@ -53,10 +54,13 @@ __all__ = [
     "ATONDecoder",
     "ATONType",
     "SortOrder",
+    "CompressionStats",
     
     # Compression
     "CompressionMode",
     "ATONCompressionEngine",
+    "SharedDictionary",
+    "train_dictionary",
     
     # Query
     "ATONQueryEngine",
@@ -2,11 +2,15 @@
 
 from .modes import CompressionMode
 from .engine import ATONCompressionEngine
+from .planner import CompressionPlan, plan_compression
+from .shared import SharedDictionary, train_dictionary
 from .algorithms import (
     CompressionAlgorithm,
     DictionaryCompression,
     DeltaCompression,
     PatternCompression,
+    RunLengthCompression,
+    estimate_tokens,
 )
 
 __all__ = [
@@ -16,4 +20,10 @@ __all__ = [
     "DictionaryCompression",
     "DeltaCompression",
     "PatternCompression",
+    "RunLengthCompression",
+    "estimate_tokens",
+    "CompressionPlan",
+    "plan_compression",
+    "SharedDictionary",
+    "train_dictionary",
 ]
@@ -2,188 +2,1114 @@
 ATON Format - Compression Algorithms
 """
 
+import os
+import string
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Tuple
-from collections import Counter
+from functools import lru_cache
+from itertools import accumulate, count, product
+from operator import sub
+from typing import Any, Callable, Container, Dict, Iterator, List, Optional, Set, Tuple
+
+from .shared import SharedDictionary
+
+# Rough characters per LLM token, used to estimate dictionary savings
+CHARS_PER_TOKEN = 4
+
+# Consecutive values per column inspected when choosing delta encoding
+DELTA_SAMPLE_SIZE = 256
+
+# Values per column sampled when looking for a shared prefix/suffix
+PATTERN_SAMPLE_SIZE = 256
+
+# Consecutive rows inspected when looking for runs
+RLE_SAMPLE_SIZE = 256
+
+# Values per column sampled when looking for frequent prefixes/suffixes
+AFFIX_SAMPLE_SIZE = 256
+
+# Characters dictionary refs are spelled with after the leading '#'
+REF_ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+# Ref lengths ranked up front; longer refs are only generated when needed
+REF_RANKED_LENGTH = 2
+
+# String columns with more distinct values than this share of the sample
+# are treated as free text by DictionaryCompression.score_column()
+DICTIONARY_MAX_DISTINCT = 0.9
+
+# Characters a dictionary entry adds besides its string (ref, quotes, separator)
+DICTIONARY_ENTRY_OVERHEAD = 6
+
+# Characters of a typical dictionary ref
+DICTIONARY_REF_LENGTH = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens text costs (about four characters per token)"""
+    if not text:
+        return 0
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+class RefAllocator:
+    """Dictionary refs ordered from cheapest to dearest under a tokenizer
+    
+    Refs are '#' followed by REF_ALPHABET characters, ranked by token cost,
+    then length, then generation order, so single-token spellings are
+    handed out first.
+    """
+    
+    def __init__(self, tokenizer: Callable[[str], int] = estimate_tokens):
+        self.tokenizer = tokenizer
+        self._ranked: List[Tuple[int, int, int, str]] = []
+        self._length = 0
+        while self._length < REF_RANKED_LENGTH:
+            self._grow()
+    
+    def refs(self, n: int, exclude: Container[str] = ()) -> List[str]:
+        """The n cheapest refs not in exclude"""
+        while True:
+            refs: List[str] = []
+            for entry in self._ranked:
+                if len(refs) == n:
+                    break
+                if entry[3] not in exclude:
+                    refs.append(entry[3])
+            if len(refs) == n:
+                return refs
+            self._grow()
+    
+    def ref(self, rank: int) -> str:
+        """The rank-th cheapest ref ranked so far (the dearest past the end)"""
+        return self._ranked[min(rank, len(self._ranked) - 1)][3]
+    
+    def _grow(self) -> None:
+        """Rank the refs one character longer than any so far"""
+        self._length += 1
+        order = count(len(self._ranked))
+        for chars in product(REF_ALPHABET, repeat=self._length):
+            ref = '#' + ''.join(chars)
+            self._ranked.append((self.tokenizer(ref), self._length, next(order), ref))
+        self._ranked.sort()
+
+
+@lru_cache(maxsize=8)
+def ref_allocator(tokenizer: Callable[[str], int] = estimate_tokens) -> RefAllocator:
+    """Shared RefAllocator for tokenizer (ranking refs costs one call each)"""
+    return RefAllocator(tokenizer)
 
 
 class CompressionAlgorithm(ABC):
     """Base class for compression algorithms"""
     
     @abstractmethod
-    def compress(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-        """Compress data and return compressed data + metadata"""
+    def compress(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Compress data and return compressed data + metadata
+        
+        columns restricts table columns to {table: {column, ...}}; tables
+        missing from it are left alone. None means every column.
+        """
         pass
     
     @abstractmethod
     def estimate_savings(self, data: Dict[str, Any]) -> float:
         """Estimate compression savings (0.0 to 1.0)"""
         pass
+    
+    def score_column(self, values: List[Any]) -> float:
+        """Characters this algorithm would save on sampled values of one column
+        
+        values are consecutive sampled rows' cells, with MISSING where a
+        record lacks the column; 0 means the algorithm does not apply.
+        """
+        return 0.0
 
 
 
 
 class DictionaryCompression(CompressionAlgorithm):
-    """Dictionary-based compression for repeated strings"""
+    """Dictionary-based compression for repeated strings
+    
+    Candidates are ranked by estimated net token savings and at most
+    max_entries are kept; the most frequent strings get the cheapest refs,
+    and no dictionary is produced unless it saves tokens overall. Token
+    costs come from tokenizer (a str -> token count callable), and refs
+    are allocated afresh for every document.
+    
+    With a shared dictionary, strings it covers use its refs and only the
+    remaining entries are returned as the per-message dictionary.
     
-    def __init__(self, min_length: int = 5, min_occurrences: int = 3):
+    Table values that don't repeat exactly (URLs, paths, e-mail addresses)
+    can still share long prefixes/suffixes of at least min_affix_length
+    characters; those become entries too, and the values are written as
+    #prefix"middle"#suffix with either ref optional (0 disables this).
+    """
+    
+    def __init__(self, min_length: int = 5, min_occurrences: int = 3,
+                 max_entries: Optional[int] = None,
+                 shared: Optional[SharedDictionary] = None,
+                 tokenizer: Optional[Callable[[str], int]] = None,
+                 min_affix_length: int = 8):
+        if max_entries is not None and max_entries < 0:
+            raise ValueError("max_entries must be >= 0")
         self.min_length = min_length
         self.min_occurrences = min_occurrences
+        self.max_entries = max_entries
+        self.shared = shared
+        self.tokenizer = tokenizer or estimate_tokens
+        self.min_affix_length = min_affix_length
         self.dictionary: Dict[str, str] = {}
-        self.ref_counter = 0
+        self.tokens_saved = 0
     
-    def compress(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def compress(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Build dictionary and replace strings"""
-        # Extract all strings
-        strings = self._extract_strings(data)
+        # Count occurrences (one walk, no intermediate list of strings)
+        candidate_columns: Optional[Dict[str, Set[str]]] = {}
+        string_counts = self._count_strings(data, candidate_columns, columns)
         
-        # Count occurrences
-        string_counts = Counter(strings)
+        # Strings the shared dictionary covers need no entry of their own
+        shared_refs: Dict[str, str] = {}
+        if self.shared is not None:
+            for text in string_counts:
+                ref = self.shared.ref_for(text)
+                if ref is not None:
+                    shared_refs[text] = ref
+                    if len(text) < self.min_length:
+                        candidate_columns = None  # Short hits: visit every column
+            shared_counts = {s: string_counts.pop(s) for s in shared_refs}
         
         # Build dictionary
-        self.dictionary = {}
-        for string, count in string_counts.items():
-            if (len(string) >= self.min_length and 
-                count >= self.min_occurrences and
-                not string.startswith('#')):
-                ref = f"#{self.ref_counter}"
-                self.dictionary[ref] = string
-                self.ref_counter += 1
+        dictionary = self.select_entries(string_counts)
+        self.dictionary = dictionary
+        self.tokens_saved = sum(
+            self._net_savings(s, string_counts[s], ref) for ref, s in dictionary.items()
+        )
+        if shared_refs:
+            self.tokens_saved += sum(
+                shared_counts[s] * self._use_savings(s, ref) for s, ref in shared_refs.items()
+            )
         
         # Create reverse map
-        reverse_dict = {v: k for k, v in self.dictionary.items()}
+        reverse_dict = {v: k for k, v in dictionary.items()}
+        reverse_dict.update(shared_refs)
         
         # Replace strings in data
-        compressed = self._replace_strings(data, reverse_dict)
+        compressed = self._replace_strings(data, reverse_dict, candidate_columns)
+        
+        # Shared prefixes/suffixes of what is left
+        if self.min_affix_length:
+            compressed, affixes, saved = self._splice_affixes(compressed, columns, reverse_dict)
+            if affixes or saved:
+                dictionary = {**dictionary, **affixes}
+                self.dictionary = dictionary
+                self.tokens_saved += saved
         
-        metadata = {'dictionary': self.dictionary}
+        metadata: Dict[str, Any] = {'dictionary': dictionary, 'tokens_saved': self.tokens_saved}
+        if shared_refs:
+            metadata['shared_dictionary'] = self.shared
         return compressed, metadata
     
+    def select_entries(self, string_counts: Dict[str, int]) -> Dict[str, str]:
+        """Pick ref -> string entries from string counts.
+        
+        Strings are ranked by net token savings and the cheapest refs go to
+        the most frequent ones; returns {} when the dictionary would not pay
+        for its own @dict line.
+        """
+        candidates = [
+            s for s, count in string_counts.items()
+            if len(s) >= self.min_length and count >= self.min_occurrences
+            and not s.startswith('#')
+        ]
+        if not candidates or self.max_entries == 0:
+            return {}
+        
+        # Rank with the dearest ref the dictionary could need
+        allocator = ref_allocator(self.tokenizer)
+        exclude = self.shared.entries if self.shared is not None else ()
+        widest_ref = allocator.ref(len(candidates) - 1 + len(exclude))
+        ranked = []
+        for s in candidates:
+            net = self._net_savings(s, string_counts[s], widest_ref)
+            if net > 0:
+                ranked.append((net, s))
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        if self.max_entries is not None:
+            ranked = ranked[:self.max_entries]
+        
+        # Cheapest refs go to the most frequent strings
+        selected = sorted((s for _, s in ranked), key=lambda s: (-string_counts[s], s))
+        dictionary = dict(zip(allocator.refs(len(selected), exclude), selected))
+        total = sum(self._net_savings(s, string_counts[s], ref) for ref, s in dictionary.items())
+        
+        # The @dict[...] line itself must pay off as well
+        if total <= self.tokenizer("@dict[]"):
+            return {}
+        return dictionary
+    
+    def score_column(self, values: List[Any]) -> float:
+        """Characters saved by exact and prefix/suffix entries on sampled values"""
+        strings = [v for v in values if isinstance(v, str)]
+        if not strings:
+            # Nested values: let the dictionary look inside
+            return 1.0 if any(isinstance(v, (list, dict)) for v in values) else 0.0
+        counts: Dict[str, int] = {}
+        for s in strings:
+            counts[s] = counts.get(s, 0) + 1
+        score = 0
+        if len(counts) <= DICTIONARY_MAX_DISTINCT * len(strings):
+            # Each use saves the string for a ref; its entry costs it once more
+            score = sum(
+                len(s) * (c - 1) - DICTIONARY_ENTRY_OVERHEAD for s, c in counts.items()
+                if c > 1 and len(s) >= self.min_length
+            )
+        if self.min_affix_length:
+            rare = [s for s in strings if counts[s] < self.min_occurrences]
+            score += self._affix_score(rare)
+        return score
+    
+    def _affix_score(self, strings: List[str]) -> int:
+        """Characters saved by prefix/suffix entries on sampled strings"""
+        strings = [s for s in strings if _spliceable(s)]
+        
+        def gain(affix: str, shorter: int, members: List[str]) -> int:
+            # Each member loses the affix beyond the shorter one (or its ref)
+            saved = len(affix) - (shorter or DICTIONARY_REF_LENGTH)
+            return saved * len(members) - len(affix) - DICTIONARY_ENTRY_OVERHEAD
+        
+        prefixes = frequent_prefixes(strings, self.min_affix_length, self.min_occurrences, gain)
+        suffixes = frequent_prefixes([s[::-1] for s in strings], self.min_affix_length,
+                                     self.min_occurrences, gain)
+        return round(sum(prefixes.values()) + sum(suffixes.values()))
+    
+    def _use_savings(self, string: str, ref: str) -> int:
+        """Tokens saved by writing ref in place of one occurrence of string"""
+        escaped = string.replace('"', '\\"')
+        return self.tokenizer(f'"{escaped}"') - self.tokenizer(ref)
+    
+    def _net_savings(self, string: str, count: int, ref: str) -> int:
+        """Tokens saved by replacing count occurrences of string with ref"""
+        escaped = string.replace('"', '\\"')
+        return count * self._use_savings(string, ref) - self.tokenizer(f'{ref}:"{escaped}", ')
+    
     def estimate_savings(self, data: Dict[str, Any]) -> float:
         """Estimate potential savings"""
-        strings = self._extract_strings(data)
-        string_counts = Counter(strings)
+        string_counts = self._count_strings(data)
         
-        total_chars = sum(len(s) * count for s, count in string_counts.items())
+        total_tokens = sum(self.tokenizer(f'"{s}"') * count for s, count in string_counts.items())
         
-        # Estimate compressed size
-        saved_chars = 0
-        for string, count in string_counts.items():
-            if len(string) >= self.min_length and count >= self.min_occurrences:
-                # Save (string_length - 3) * (count - 1) characters
-                saved_chars += (len(string) - 3) * (count - 1)
+        # Net tokens saved by the dictionary compress() would build
+        saved_tokens = sum(
+            self._net_savings(s, string_counts[s], ref)
+            for ref, s in self.select_entries(string_counts).items()
+        )
         
-        return saved_chars / total_chars if total_chars > 0 else 0.0
+        return saved_tokens / total_tokens if total_tokens > 0 else 0.0
+    
+    def count_strings(self, data: Any) -> Dict[str, int]:
+        """Count every string value in data (input for select_entries)"""
+        return self._count_strings(data)
     
-    def _extract_strings(self, obj: Any, strings: List[str] = None) -> List[str]:
-        """Recursively extract strings"""
-        if strings is None:
-            strings = []
+    def _count_strings(self, data: Any,
+                       candidate_columns: Optional[Dict[str, Set[str]]] = None,
+                       allowed: Optional[Dict[str, Set[str]]] = None) -> Dict[str, int]:
+        """Count every string value in data with one iterative walk.
         
-        if isinstance(obj, str):
-            strings.append(obj)
-        elif isinstance(obj, dict):
-            for value in obj.values():
-                self._extract_strings(value, strings)
-        elif isinstance(obj, list):
-            for item in obj:
-                self._extract_strings(item, strings)
-        
-        return strings
-    
-    def _replace_strings(self, obj: Any, ref_map: Dict[str, str]) -> Any:
-        """Replace strings with references"""
-        if isinstance(obj, str) and obj in ref_map:
-            return ref_map[obj]
-        elif isinstance(obj, dict):
-            return {k: self._replace_strings(v, ref_map) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._replace_strings(item, ref_map) for item in obj]
+        When candidate_columns is given, it is filled with the columns of each
+        table (top-level list of records) that hold strings long enough to be
+        dictionary entries, or nested values that may contain some. Only
+        allowed columns of tables are counted, if allowed is given.
+        """
+        counts: Dict[str, int] = {}
+        get = counts.get
+        min_length = self.min_length
+        stack: List[Any] = []
+        
+        if isinstance(data, str):
+            return {data: 1}
+        if not isinstance(data, dict):
+            stack.append(data)
         else:
+            for name, table in data.items():
+                if not isinstance(table, list) or candidate_columns is None:
+                    stack.append(table)
+                    continue
+                columns = candidate_columns.setdefault(name, set())
+                permitted = allowed.get(name, ()) if allowed is not None else None
+                if permitted is not None and not permitted:
+                    continue
+                for record in table:
+                    if not isinstance(record, dict):
+                        stack.append(record)
+                        continue
+                    for column, value in record.items():
+                        if permitted is not None and column not in permitted:
+                            continue
+                        if isinstance(value, str):
+                            counts[value] = get(value, 0) + 1
+                            if len(value) >= min_length:
+                                columns.add(column)
+                        elif isinstance(value, (dict, list)):
+                            stack.append(value)
+                            columns.add(column)
+        
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, str):
+                counts[obj] = get(obj, 0) + 1
+                continue
+            if isinstance(obj, dict):
+                obj = obj.values()
+            elif not isinstance(obj, list):
+                continue
+            for value in obj:
+                if isinstance(value, str):
+                    counts[value] = get(value, 0) + 1
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        return counts
+    
+    def _replace_strings(self, data: Any, ref_map: Dict[str, str],
+                         candidate_columns: Optional[Dict[str, Set[str]]] = None) -> Any:
+        """Replace strings with references, copying only what changes.
+        
+        Only the candidate columns of each table are visited; records are
+        copied only when one of their values is replaced, and tables or
+        values without hits are returned as the same objects.
+        """
+        if not ref_map or not isinstance(data, dict):
+            return self._replace_value(data, ref_map) if ref_map else data
+        
+        compressed = {}
+        for name, table in data.items():
+            columns = candidate_columns.get(name) if candidate_columns else None
+            if columns is None or not isinstance(table, list):
+                compressed[name] = self._replace_value(table, ref_map)
+                continue
+            
+            rows = None
+            for pos, record in enumerate(table):
+                if isinstance(record, dict):
+                    new_record = None
+                    for column in columns:
+                        value = record.get(column)
+                        if value is None:
+                            continue
+                        new_value = self._replace_value(value, ref_map)
+                        if new_value is not value:
+                            if new_record is None:
+                                new_record = dict(record)
+                            new_record[column] = new_value
+                else:
+                    replaced = self._replace_value(record, ref_map)
+                    new_record = replaced if replaced is not record else None
+                if new_record is not None:
+                    if rows is None:
+                        rows = list(table)
+                    rows[pos] = new_record
+            compressed[name] = table if rows is None else rows
+        return compressed
+    
+    def _replace_value(self, obj: Any, ref_map: Dict[str, str]) -> Any:
+        """Replace strings inside one value, returning obj itself if unchanged.
+        
+        Nested values are walked with an explicit stack, so depth is not
+        limited by the recursion limit; containers are copied only when
+        something inside them is replaced.
+        """
+        if isinstance(obj, str):
+            return ref_map.get(obj, obj)
+        if not isinstance(obj, (dict, list)):
             return obj
+        
+        def entries(container: Any) -> Iterator[Tuple[Any, Any]]:
+            return iter(container.items() if isinstance(container, dict) else enumerate(container))
+        
+        def copy(container: Any) -> Any:
+            return dict(container) if isinstance(container, dict) else list(container)
+        
+        # Frames: [container, remaining entries, copy (None until changed), key in parent]
+        stack: List[List[Any]] = [[obj, entries(obj), None, None]]
+        while True:
+            frame = stack[-1]
+            for key, value in frame[1]:
+                if isinstance(value, str):
+                    new_value = ref_map.get(value, value)
+                    if new_value is not value:
+                        if frame[2] is None:
+                            frame[2] = copy(frame[0])
+                        frame[2][key] = new_value
+                elif isinstance(value, (dict, list)):
+                    stack.append([value, entries(value), None, key])
+                    break
+            else:
+                stack.pop()
+                container, _, copied, key = frame
+                if not stack:
+                    return container if copied is None else copied
+                if copied is not None:
+                    parent = stack[-1]
+                    if parent[2] is None:
+                        parent[2] = copy(parent[0])
+                    parent[2][key] = copied
+    
+    def _splice_affixes(self, data: Any, columns: Optional[Dict[str, Set[str]]],
+                        reverse_dict: Dict[str, str]) -> Tuple[Any, Dict[str, str], int]:
+        """Replace frequent prefixes/suffixes of table values by inline refs
+        
+        Affixes are proposed per column from a sample, counted on the whole
+        column and kept when their entry pays off. Returns the data,
+        the new entries and the tokens saved.
+        """
+        if not isinstance(data, dict):
+            return data, {}, 0
+        allocator = ref_allocator(self.tokenizer)
+        exclude = self.shared.entries if self.shared is not None else ()
+        taken = sum(1 for ref in reverse_dict.values() if ref not in exclude)
+        next_ref = allocator.ref(taken + len(exclude))
+        
+        # Propose: {(table, column): (prefixes, suffixes)}
+        proposals: Dict[Tuple[str, str], Tuple[Set[str], Set[str]]] = {}
+        for table, records in data.items():
+            if not isinstance(records, list) or not records or not isinstance(records[0], dict):
+                continue
+            allowed = columns.get(table, ()) if columns is not None else None
+            step = max(1, len(records) // AFFIX_SAMPLE_SIZE)
+            sample_rows = records[::step][:AFFIX_SAMPLE_SIZE]
+            scale = len(records) / len(sample_rows)
+            for column in records[0]:
+                if allowed is not None and column not in allowed:
+                    continue
+                values = [r.get(column) for r in sample_rows if isinstance(r, dict)]
+                sample = [v for v in values if isinstance(v, str) and _spliceable(v)]
+                if len(sample) < self.min_occurrences:
+                    continue
+                heads = frequent_prefixes(sample, self.min_affix_length, self.min_occurrences,
+                                          self._affix_gain(next_ref, scale))
+                tails = frequent_prefixes([v[::-1] for v in sample], self.min_affix_length,
+                                          self.min_occurrences,
+                                          self._affix_gain(next_ref, scale, reverse=True))
+                if heads or tails:
+                    proposals[(table, column)] = (set(heads), {s[::-1] for s in tails})
+        if not proposals:
+            return data, {}, 0
+        
+        # Match the whole columns and keep the entries that pay off
+        uses: Dict[str, int] = {}
+        matches: Dict[Tuple[str, str], List[Tuple[int, str, str]]] = {}
+        for (table, column), (prefixes, suffixes) in proposals.items():
+            match = _affix_matcher(prefixes, suffixes)
+            found = matches[(table, column)] = []
+            for pos, record in enumerate(data[table]):
+                value = record.get(column) if isinstance(record, dict) else None
+                if not isinstance(value, str) or not _spliceable(value):
+                    continue
+                prefix, suffix = match(value)
+                if prefix or suffix:
+                    found.append((pos, prefix, suffix))
+                    for affix in (prefix, suffix):
+                        if affix:
+                            uses[affix] = uses.get(affix, 0) + 1
+        kept = [
+            a for a, n in uses.items()
+            if a in reverse_dict or self._net_savings(a, n, next_ref) > 0
+        ]
+        kept.sort(key=lambda a: (-uses[a], a))
+        new = [a for a in kept if a not in reverse_dict]
+        if self.max_entries is not None:
+            new = new[:max(0, self.max_entries - taken)]
+        entries = dict(zip(allocator.refs(taken + len(new), exclude)[taken:], new))
+        refs = {a: ref for ref, a in entries.items()}
+        refs.update((a, reverse_dict[a]) for a in kept if a in reverse_dict)
+        saved = sum(uses[a] * self._use_savings(a, refs[a]) for a in refs)
+        saved -= sum(self.tokenizer(f'{ref}:"{a}", ') for ref, a in entries.items())
+        if saved <= (0 if reverse_dict else self.tokenizer("@dict[]")):
+            return data, {}, 0
+        
+        # Splice, copying only the records that change
+        compressed = dict(data)
+        for (table, column), (prefixes, suffixes) in proposals.items():
+            match = _affix_matcher(prefixes & refs.keys(), suffixes & refs.keys())
+            original = data[table]
+            rows = compressed[table]
+            for pos, prefix, suffix in matches[(table, column)]:
+                row = rows[pos]
+                value = row[column]
+                if (prefix and prefix not in refs) or (suffix and suffix not in refs):
+                    prefix, suffix = match(value)  # An affix was dropped; match again
+                    if not (prefix or suffix):
+                        continue
+                if rows is original:
+                    rows = compressed[table] = list(original)
+                if row is original[pos]:
+                    row = rows[pos] = dict(row)
+                middle = value[len(prefix):len(value) - len(suffix)].replace('"', '\\"')
+                row[column] = AffixRef(f'{refs.get(prefix, "")}"{middle}"{refs.get(suffix, "")}')
+        return compressed, entries, saved
+    
+    def _affix_gain(self, ref: str, scale: float,
+                    reverse: bool = False) -> Callable[[str, int, List[str]], float]:
+        """frequent_prefixes() gain: tokens the sampled members save, scaled, minus the entry
+        
+        Members are measured whole, so extending a prefix by a character or
+        two only pays off if it really saves tokens on the values.
+        """
+        tokenizer = self.tokenizer
+        
+        def text(s: str) -> str:
+            return s[::-1] if reverse else s
+        
+        def gain(affix: str, shorter: int, members: List[str]) -> float:
+            before = ref if shorter else ""
+            saved = sum(
+                tokenizer(f'{before}"{text(m[shorter:])}"')
+                - tokenizer(f'{ref}"{text(m[len(affix):])}"')
+                for m in members
+            )
+            return saved * scale - tokenizer(f'{ref}:"{text(affix)}", ')
+        
+        return gain
+
 
+class AffixRef(str):
+    """A value written as #prefix"middle"#suffix (emitted verbatim)"""
+    __slots__ = ()
 
 
+def _spliceable(value: Any) -> bool:
+    """Whether value is a plain string affix refs may be spliced into"""
+    return type(value) is str and not value.startswith('#')
+
+
+def frequent_prefixes(values: List[str], min_length: int, min_count: int,
+                      gain: Callable[[str, int, List[str]], float]) -> Dict[str, float]:
+    """Prefixes worth a dictionary entry, with their estimated net gain
+    
+    Sorting puts values that share a prefix next to each other, so the
+    prefixes where values branch are the intervals of the longest common
+    prefixes of neighbours (as in a suffix array), found in one stack pass.
+    Deepest first, each value is credited to its longest selected prefix;
+    gain(prefix, shorter, members) scores a prefix for the values credited
+    to it against the length of the nearest shorter branching prefix (0 if
+    none is min_length long).
+    """
+    values = sorted(values)
+    n = len(values)
+    intervals = []  # (prefix length, first, last, shorter candidate length), children first
+    stack = [(0, 0)]  # (prefix length, first value)
+    for i in range(1, n + 1):
+        if i < n:
+            a, b = values[i - 1], values[i]
+            depth = 0
+            limit = min(len(a), len(b))
+            while depth < limit and a[depth] == b[depth]:
+                depth += 1
+        else:
+            depth = 0
+        first = i - 1
+        while depth < stack[-1][0]:
+            length, first = stack.pop()
+            parent = max(depth, stack[-1][0])
+            intervals.append((length, first, i - 1, parent if parent >= min_length else 0))
+        if depth > stack[-1][0]:
+            stack.append((depth, first))
+    
+    selected: Dict[str, float] = {}
+    claimed = [False] * n
+    for length, first, last, shorter in intervals:
+        if length < min_length or last - first + 1 < min_count:
+            continue
+        members = [i for i in range(first, last + 1) if not claimed[i]]
+        if len(members) < min_count:
+            continue
+        prefix = values[first][:length]
+        net = gain(prefix, shorter, [values[i] for i in members])
+        if net > 0:
+            selected[prefix] = net
+            for i in members:
+                claimed[i] = True
+    return selected
+
+
+def _affix_matcher(prefixes: Set[str], suffixes: Set[str]) -> Callable[[str], Tuple[str, str]]:
+    """Function returning a value's longest prefix, then the rest's longest suffix
+    
+    Only the lengths present in the sets are tried, longest first.
+    """
+    prefix_lengths = sorted({len(a) for a in prefixes}, reverse=True)
+    suffix_lengths = sorted({len(a) for a in suffixes}, reverse=True)
+    
+    def match(value: str) -> Tuple[str, str]:
+        prefix = suffix = ""
+        for n in prefix_lengths:
+            if value[:n] in prefixes:
+                prefix = value[:n]
+                break
+        room = len(value) - len(prefix)
+        for n in suffix_lengths:
+            if n <= room and value[-n:] in suffixes:
+                suffix = value[-n:]
+                break
+        return prefix, suffix
+    
+    return match
+
 
 class DeltaCompression(CompressionAlgorithm):
-    """Delta encoding for numeric sequences"""
+    """Delta encoding for integer columns
+    
+    Integer columns whose consecutive differences (or differences of
+    differences) print much shorter than the values themselves, like ids
+    and epoch timestamps, are stored as the first value followed by deltas.
+    Detection only looks at a sample of consecutive values per column.
+    """
     
-    def compress(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def __init__(self, sample_size: int = DELTA_SAMPLE_SIZE, min_gain: float = 0.2,
+                 min_rows: int = 4):
+        self.sample_size = sample_size
+        self.min_gain = min_gain
+        self.min_rows = min_rows
+    
+    def compress(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Apply delta encoding to numeric sequences"""
-        compressed, delta_fields = self._apply_delta(data)
+        compressed, delta_fields = self._apply_delta(data, columns)
         metadata = {'delta_fields': delta_fields}
         return compressed, metadata
     
     def estimate_savings(self, data: Dict[str, Any]) -> float:
         """Estimate delta encoding savings"""
-        numeric_sequences = self._find_numeric_sequences(data)
-        
-        if not numeric_sequences:
+        total_chars = 0
+        saved_chars = 0
+        for records in data.values() if isinstance(data, dict) else ():
+            if not isinstance(records, list):
+                continue
+            for sample in self._column_samples(records).values():
+                raw = _printed_length(sample)
+                codec, size = self._best_codec(sample)
+                total_chars += raw
+                if codec:
+                    saved_chars += raw - size
+        return saved_chars / total_chars if total_chars > 0 else 0.0
+    
+    def score_column(self, values: List[Any]) -> float:
+        """Characters saved by the best delta codec on an integer column"""
+        if len(values) < self.min_rows or not all(map(_is_int, values)):
             return 0.0
-        
-        total_saved = 0
-        total_values = 0
-        
-        for seq in numeric_sequences:
-            if len(seq) > 1:
-                deltas = [seq[i] - seq[i-1] for i in range(1, len(seq))]
-                # Estimate: deltas are usually smaller
-                avg_delta = sum(abs(d) for d in deltas) / len(deltas)
-                avg_value = sum(abs(v) for v in seq) / len(seq)
-                
-                if avg_delta < avg_value * 0.5:
-                    total_saved += len(seq) - 1
-                    total_values += len(seq)
-        
-        return total_saved / total_values if total_values > 0 else 0.0
+        codec, size = self._best_codec(values)
+        return _printed_length(values) - size if codec else 0.0
     
-    def _apply_delta(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    def _apply_delta(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                     ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, str]]]:
         """Apply delta encoding where beneficial"""
-        # Simplified for now - would need full implementation
-        return data, []
-    
-    def _find_numeric_sequences(self, data: Dict[str, Any]) -> List[List[float]]:
-        """Find numeric sequences in data"""
-        sequences = []
+        if not isinstance(data, dict):
+            return data, {}
         
-        if isinstance(data, dict):
-            for value in data.values():
-                if isinstance(value, list) and all(isinstance(x, (int, float)) for x in value):
-                    sequences.append(value)
-                else:
-                    sequences.extend(self._find_numeric_sequences(value))
-        elif isinstance(data, list):
-            for item in data:
-                sequences.extend(self._find_numeric_sequences(item))
-        
-        return sequences
+        compressed = {}
+        delta_fields: Dict[str, Dict[str, str]] = {}
+        for table, records in data.items():
+            compressed[table] = records
+            if not isinstance(records, list) or len(records) < self.min_rows:
+                continue
+            
+            encoded_columns = {}
+            allowed = columns.get(table, ()) if columns is not None else None
+            for column, sample in self._column_samples(records, allowed).items():
+                codec, _ = self._best_codec(sample)
+                if not codec:
+                    continue
+                values = _int_column(records, column)
+                if values is not None:
+                    encoded_columns[column] = encode_deltas(values, codec)
+                    delta_fields.setdefault(table, {})[column] = codec
+            
+            if encoded_columns:
+                rows = [dict(record) for record in records]
+                for column, encoded in encoded_columns.items():
+                    for row, value in zip(rows, encoded):
+                        row[column] = value
+                compressed[table] = rows
+        return compressed, delta_fields
+    
+    def _column_samples(self, records: List[Dict[str, Any]],
+                        allowed: Optional[Container[str]] = None) -> Dict[str, List[int]]:
+        """First sample_size values of each (allowed) integer column"""
+        if not records or not isinstance(records[0], dict):
+            return {}
+        head = records[:self.sample_size]
+        samples = {}
+        for column, value in records[0].items():
+            if not _is_int(value) or (allowed is not None and column not in allowed):
+                continue
+            sample = _int_column(head, column)
+            if sample is not None and len(sample) >= self.min_rows:
+                samples[column] = sample
+        return samples
+    
+    def _best_codec(self, sample: List[int]) -> Tuple[Optional[str], int]:
+        """Cheapest of delta/delta2 on sample, if it beats raw by min_gain"""
+        raw = _printed_length(sample)
+        best, best_size = None, raw
+        for codec in DELTA_CODECS:
+            size = _printed_length(encode_deltas(sample, codec))
+            if size < best_size:
+                best, best_size = codec, size
+        if best is None or best_size > raw * (1.0 - self.min_gain):
+            return None, raw
+        return best, best_size
+
+
+DELTA_CODECS = ("delta", "delta2")
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _int_column(records: List[Dict[str, Any]], column: str) -> Optional[List[int]]:
+    """The column as a list of ints, or None if any row lacks an int there"""
+    values = [record.get(column) if isinstance(record, dict) else None for record in records]
+    ints = [v for v in values if isinstance(v, int) and not isinstance(v, bool)]
+    return ints if len(ints) == len(values) else None
+
+
+def _printed_length(values: List[int]) -> int:
+    return sum(map(len, map(str, values)))
+
+
+def encode_deltas(values: List[int], codec: str) -> List[int]:
+    """First value followed by deltas ("delta") or deltas of deltas ("delta2")"""
+    deltas = list(map(sub, values[1:], values[:-1]))
+    if codec == "delta":
+        return values[:1] + deltas
+    if codec == "delta2":
+        return values[:1] + deltas[:1] + list(map(sub, deltas[1:], deltas[:-1]))
+    raise ValueError(f"Unknown delta codec: {codec}")
+
+
+def decode_deltas(values: List[Any], codec: str) -> List[Any]:
+    """Inverse of encode_deltas"""
+    if codec == "delta":
+        return list(accumulate(values))
+    if codec == "delta2":
+        return list(accumulate(values[:1] + list(accumulate(values[1:]))))
+    raise ValueError(f"Unknown delta codec: {codec}")
 
 
 
 
 class PatternCompression(CompressionAlgorithm):
-    """Pattern-based compression for structured data"""
+    """Template compression for string columns sharing a prefix/suffix
+    
+    A column like user_000123, user_000124, ... becomes the template
+    "user_{}" (emitted once, in the table header) and the varying part
+    per row. Candidates are found on a sample, then checked on the column.
+    """
     
-    def compress(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def __init__(self, sample_size: int = PATTERN_SAMPLE_SIZE, min_affix: int = 3,
+                 min_rows: int = 4):
+        self.sample_size = sample_size
+        self.min_affix = min_affix
+        self.min_rows = min_rows
+    
+    def compress(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Identify and compress patterns"""
-        patterns = self._identify_patterns(data)
+        patterns = self._identify_patterns(data, columns)
         compressed = self._apply_patterns(data, patterns)
         metadata = {'patterns': patterns}
         return compressed, metadata
     
     def estimate_savings(self, data: Dict[str, Any]) -> float:
         """Estimate pattern compression savings"""
-        patterns = self._identify_patterns(data)
-        return len(patterns) * 0.05  # Rough estimate
+        total_chars = 0
+        saved_chars = 0
+        for records in data.values() if isinstance(data, dict) else ():
+            if not isinstance(records, list) or len(records) < self.min_rows:
+                continue
+            for column, sample in self._column_samples(records).items():
+                total_chars += sum(map(len, sample))
+                prefix, suffix = _common_affixes(sample)
+                if len(prefix) + len(suffix) >= self.min_affix:
+                    saved_chars += (len(prefix) + len(suffix)) * len(sample)
+        return saved_chars / total_chars if total_chars > 0 else 0.0
+    
+    def score_column(self, values: List[Any]) -> float:
+        """Characters a shared prefix/suffix template saves on a string column"""
+        if len(values) < self.min_rows or not all(isinstance(v, str) for v in values):
+            return 0.0
+        prefix, suffix = _common_affixes(values)
+        affix = len(prefix) + len(suffix)
+        return affix * len(values) if affix >= self.min_affix else 0.0
     
-    def _identify_patterns(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Identify repeating patterns"""
-        # Simplified - would implement full pattern detection
-        return {}
+    def _identify_patterns(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                           ) -> Dict[str, Dict[str, Tuple[str, str]]]:
+        """Find (prefix, suffix) templates per (allowed) table column"""
+        patterns: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        if not isinstance(data, dict):
+            return patterns
+        for table, records in data.items():
+            if not isinstance(records, list) or len(records) < self.min_rows:
+                continue
+            allowed = columns.get(table, ()) if columns is not None else None
+            for column, sample in self._column_samples(records, allowed).items():
+                prefix, suffix = _common_affixes(sample)
+                if len(prefix) + len(suffix) < self.min_affix:
+                    continue
+                # The sample only proposes; the whole column must agree
+                template = self._fit_column(records, column, prefix, suffix)
+                if template is not None:
+                    patterns.setdefault(table, {})[column] = template
+        return patterns
     
-    def _apply_patterns(self, data: Dict[str, Any], patterns: Dict[str, Any]) -> Dict[str, Any]:
-        """Apply identified patterns"""
-        return data
+    def _apply_patterns(self, data: Dict[str, Any],
+                        patterns: Dict[str, Dict[str, Tuple[str, str]]]) -> Dict[str, Any]:
+        """Replace templated values by their varying part"""
+        if not patterns:
+            return data
+        compressed = dict(data)
+        for table, templates in patterns.items():
+            rows = [dict(record) for record in data[table]]
+            for column, (prefix, suffix) in templates.items():
+                end = -len(suffix) if suffix else None
+                middles = [row[column][len(prefix):end] for row in rows]
+                if all(map(_is_canonical_int, middles)):
+                    middles = list(map(int, middles))  # Unquoted in the output
+                for row, middle in zip(rows, middles):
+                    row[column] = middle
+            compressed[table] = rows
+        return compressed
+    
+    def _column_samples(self, records: List[Dict[str, Any]],
+                        allowed: Optional[Container[str]] = None) -> Dict[str, List[str]]:
+        """Evenly spaced values of each (allowed) string column"""
+        if not isinstance(records[0], dict):
+            return {}
+        step = max(1, len(records) // self.sample_size)
+        sample_rows = records[::step][:self.sample_size]
+        samples = {}
+        for column, value in records[0].items():
+            if not isinstance(value, str) or (allowed is not None and column not in allowed):
+                continue
+            values = [r.get(column) if isinstance(r, dict) else None for r in sample_rows]
+            sample = [v for v in values if isinstance(v, str)]
+            if len(sample) == len(values):
+                samples[column] = sample
+        return samples
+    
+    def _fit_column(self, records: List[Dict[str, Any]], column: str,
+                    prefix: str, suffix: str) -> Optional[Tuple[str, str]]:
+        """Shrink prefix/suffix until every value matches, or None"""
+        shortest = None
+        for record in records:
+            value = record.get(column) if isinstance(record, dict) else None
+            if not isinstance(value, str):
+                return None
+            if not value.startswith(prefix):
+                prefix = _common_affixes([prefix, value])[0]
+            if not value.endswith(suffix):
+                suffix = _common_affixes([suffix, value])[1]
+            if shortest is None or len(value) < shortest:
+                shortest = len(value)
+        
+        # Prefix and suffix must not overlap in the shortest value
+        room = (shortest or 0) - len(prefix)
+        if room < 0:
+            prefix, suffix = prefix[:shortest], ""
+        elif len(suffix) > room:
+            suffix = suffix[len(suffix) - room:]
+        
+        # Prefer integer varying parts (written unquoted): u-10|07 -> u-|1007
+        values = [record[column] for record in records]
+        end = -len(suffix) if suffix else None
+        ints = all(_is_canonical_int(v[len(prefix):end]) for v in values)
+        if not ints:
+            digits = len(prefix) - len(prefix.rstrip("0123456789"))
+            for cut in range(1, digits + 1):
+                start = len(prefix) - cut
+                if all(_is_canonical_int(v[start:end]) for v in values):
+                    prefix, ints = prefix[:start], True
+                    break
+        
+        saved = len(prefix) + len(suffix) + (2 if ints else 0)  # Ints drop quotes
+        if saved < self.min_affix or "{}" in prefix or "{}" in suffix:
+            return None
+        
+        # Varying parts starting with '#' would read back as dictionary refs
+        if any(v[len(prefix):end].startswith('#') for v in values):
+            return None
+        return prefix, suffix
+
+
+class RunLengthCompression(CompressionAlgorithm):
+    """Run-length encoding for grouped or sorted tables
+    
+    A row identical to the one before it is dropped and counted in a
+    repeat marker; in columns where most values equal the previous row's
+    (long runs of the same host, session, ...), those cells become DITTO.
+    Columns are chosen from run statistics on a sample of consecutive rows.
+    """
+    
+    def __init__(self, sample_size: int = RLE_SAMPLE_SIZE, min_repeat_ratio: float = 0.5,
+                 min_rows: int = 4):
+        self.sample_size = sample_size
+        self.min_repeat_ratio = min_repeat_ratio
+        self.min_rows = min_rows
+    
+    def compress(self, data: Dict[str, Any], columns: Optional[Dict[str, Set[str]]] = None
+                 ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Collapse repeated rows and ditto repeated column values"""
+        if not isinstance(data, dict):
+            return data, {'rle_fields': {}, 'row_runs': {}}
+        
+        compressed = {}
+        rle_fields: Dict[str, List[str]] = {}
+        row_runs: Dict[str, Dict[int, int]] = {}
+        for table, records in data.items():
+            compressed[table] = records
+            if (not isinstance(records, list) or len(records) < self.min_rows
+                    or (columns is not None and table not in columns)
+                    or not all(isinstance(r, dict) for r in records)):
+                continue
+            
+            sample = records[:self.sample_size]
+            if any(_same_row(a, b) for a, b in zip(sample, sample[1:])):
+                records, runs = _collapse_rows(records)
+                if runs:
+                    row_runs[table] = runs
+            
+            allowed = columns.get(table) if columns is not None else None
+            ditto_columns = self._ditto_columns(records[:self.sample_size], allowed)
+            if ditto_columns:
+                records = _ditto(records, ditto_columns)
+                rle_fields[table] = ditto_columns
+            compressed[table] = records
+        
+        metadata = {'rle_fields': rle_fields, 'row_runs': row_runs}
+        return compressed, metadata
+    
+    def estimate_savings(self, data: Dict[str, Any]) -> float:
+        """Estimate run-length savings from run statistics on samples"""
+        total_chars = 0
+        saved_chars = 0
+        for records in data.values() if isinstance(data, dict) else ():
+            if not isinstance(records, list) or len(records) < self.min_rows:
+                continue
+            sample = records[:self.sample_size]
+            if not all(isinstance(r, dict) for r in sample):
+                continue
+            for column in sample[0]:
+                values = [r.get(column) for r in sample]
+                total_chars += sum(map(_printed_size, values))
+                saved_chars += self._repeat_savings(values)[1]
+        return saved_chars / total_chars if total_chars > 0 else 0.0
+    
+    def score_column(self, values: List[Any]) -> float:
+        """Characters dittos save in a column dominated by runs"""
+        ratio, saved = self._repeat_savings(values)
+        if len(values) < self.min_rows or ratio < self.min_repeat_ratio:
+            return 0.0
+        return saved
+    
+    def _ditto_columns(self, sample: List[Dict[str, Any]],
+                       allowed: Optional[Set[str]] = None) -> List[str]:
+        """(Allowed) columns whose sampled runs are long enough to pay for dittos"""
+        if len(sample) < 2:
+            return []
+        columns = []
+        for column in sample[0]:
+            if allowed is not None and column not in allowed:
+                continue
+            values = [r.get(column, MISSING) for r in sample]
+            ratio, saved = self._repeat_savings(values)
+            if ratio >= self.min_repeat_ratio and saved > 0:
+                columns.append(column)
+        return columns
+    
+    @staticmethod
+    def _repeat_savings(values: List[Any]) -> Tuple[float, int]:
+        """(share of values equal to the previous one, chars dittos save)"""
+        repeats = saved = 0
+        for prev, value in zip(values, values[1:]):
+            if _same_value(prev, value):
+                repeats += 1
+                saved += _printed_size(value) - 1
+        return repeats / max(len(values) - 1, 1), saved
+
+
+class _Ditto:
+    """Marks a cell equal to the same column in the previous row"""
+    
+    def __repr__(self) -> str:
+        return DITTO_MARKER
+
+
+DITTO_MARKER = "^"
+DITTO = _Ditto()
+MISSING = object()  # Cell of a record that lacks the column
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    """Equality that keeps 1, 1.0 and True apart"""
+    return a is not MISSING and type(a) is type(b) and a == b
+
+
+def _same_row(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+
+
+def _printed_size(value: Any) -> int:
+    return len(value) + 2 if isinstance(value, str) else len(str(value))
+
+
+def _collapse_rows(records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[int, int]]:
+    """Drop rows equal to their predecessor; runs maps kept index -> repeats"""
+    kept = [records[0]]
+    runs: Dict[int, int] = {}
+    for prev, record in zip(records, records[1:]):
+        if _same_row(prev, record):
+            index = len(kept) - 1
+            runs[index] = runs.get(index, 0) + 1
+        else:
+            kept.append(record)
+    return (kept, runs) if runs else (records, runs)
+
+
+def _ditto(records: List[Dict[str, Any]], columns: List[str]) -> List[Dict[str, Any]]:
+    """Copy of records with repeated column values replaced by DITTO"""
+    rows = [records[0]]
+    for prev, record in zip(records, records[1:]):
+        row = None
+        for column in columns:
+            if column in record and _same_value(prev.get(column, MISSING), record[column]):
+                if row is None:
+                    row = dict(record)
+                row[column] = DITTO
+        rows.append(record if row is None else row)
+    return rows
+
+
+def undo_ditto(values: List[Any]) -> List[Any]:
+    """Replace DITTO cells with the value above them"""
+    out = []
+    prev = None
+    for value in values:
+        if value is DITTO:
+            value = prev
+        out.append(value)
+        prev = value
+    return out
+
 
+def _common_affixes(values: List[str]) -> Tuple[str, str]:
+    """Longest prefix and suffix shared by all values"""
+    prefix = os.path.commonprefix(values)
+    suffix = os.path.commonprefix([v[::-1] for v in values])[::-1]
+    return prefix, suffix
 
 
+def _is_canonical_int(text: str) -> bool:
+    """Whether text reads back unchanged through int() and str()"""
+    return text.isascii() and text.isdigit() and (text == "0" or text[0] != "0")
@@ -3,25 +3,93 @@ ATON Format - Compression Engine
 """
 
 import json
+import math
 import time
-from typing import Any, Dict, Tuple
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from aton_format.compression.modes import CompressionMode
-from aton_format.compression.algorithms import DictionaryCompression, DeltaCompression, PatternCompression
+from aton_format.compression.algorithms import (
+    DictionaryCompression, DeltaCompression, PatternCompression, RunLengthCompression,
+)
+from aton_format.compression.planner import (
+    METHODS, SAMPLE_SIZE, CompressionPlan, plan_compression, sample_rows,
+)
+from aton_format.compression.shared import SharedDictionary
+
+# Table profiles kept between ADAPTIVE calls
+PROFILE_CACHE_SIZE = 64
+
+# Most rows per table measured by estimate_size() (kept small: it runs per encode)
+SIZE_SAMPLE_SIZE = 16
+
+# Table rows per row estimate_size() measures, so its cost stays a small,
+# fixed share of encoding the table
+SIZE_SAMPLE_RATIO = 64
+
+# Reused for values _json_size() encodes: json.dumps(default=...) builds an
+# encoder per call
+_SIZE_ENCODER = json.JSONEncoder(default=str)
+
+
+def _json_size(value: Any) -> int:
+    """Length of json.dumps(value, default=str), computed directly for flat records
+    
+    ASCII strings, numbers, booleans and None in a record are measured
+    without building any text (encoding one small record costs more than
+    the arithmetic); anything else is encoded.
+    """
+    if not isinstance(value, dict):
+        return len(_SIZE_ENCODER.encode(value))
+    # {"key": value, ...}: quotes, colon, space and separator per item,
+    # for keys and strings JSON writes without escapes
+    try:
+        keys = "".join(value)
+    except TypeError:  # Non-string keys
+        return len(_SIZE_ENCODER.encode(value))
+    if not _unescaped(keys):
+        return len(_SIZE_ENCODER.encode(value))
+    size = len(keys) + (6 * len(value) if value else 2)
+    for item in value.values():
+        cls = type(item)
+        if cls is str and _unescaped(item):
+            size += len(item) + 2
+        elif cls is int or (cls is float and math.isfinite(item)):
+            size += len(repr(item))
+        elif cls is bool:
+            size += 4 if item else 5
+        elif item is None:
+            size += 4
+        else:
+            size += len(_SIZE_ENCODER.encode(item))
+    return size
+
+
+def _unescaped(text: str) -> bool:
+    """Whether JSON writes text as is between its quotes"""
+    return text.isascii() and text.isprintable() and '"' not in text and '\\' not in text
+
 
 class ATONCompressionEngine:
     """Production-grade compression orchestrator"""
     
-    def __init__(self, mode: CompressionMode = CompressionMode.BALANCED):
+    def __init__(self, mode: CompressionMode = CompressionMode.BALANCED,
+                 shared_dictionary: Optional[SharedDictionary] = None,
+                 tokenizer: Optional[Callable[[str], int]] = None):
         self.mode = mode
         self.algorithms: List[CompressionAlgorithm] = [
-            DictionaryCompression(min_length=5, min_occurrences=3),
+            DictionaryCompression(min_length=5, min_occurrences=3, shared=shared_dictionary,
+                                  tokenizer=tokenizer),
             DeltaCompression(),
-            PatternCompression()
+            PatternCompression(),
+            RunLengthCompression(),
         ]
+        self.methods = dict(zip(("dictionary", "delta", "pattern", "rle"), self.algorithms))
+        # (table, rows, sample fingerprint) -> [estimated size, savings or None]
+        self._profiles: "OrderedDict[Tuple, List[Any]]" = OrderedDict()
     
     def compress(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Apply compression based on mode"""
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
         if self.mode == CompressionMode.FAST:
             compressed, metadata = self._compress_fast(data)
@@ -32,7 +100,7 @@ class ATONCompressionEngine:
         else:  # ADAPTIVE
             compressed, metadata = self._compress_adaptive(data)
         
-        encoding_time = (time.time() - start_time) * 1000
+        encoding_time = (time.perf_counter_ns() - start_time) / 1e6
         metadata['encoding_time_ms'] = encoding_time
         
         return compressed, metadata
@@ -43,41 +111,113 @@ class ATONCompressionEngine:
         return algo.compress(data)
     
     def _compress_balanced(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-        """Balanced compression - dictionary + selective others"""
-        compressed = data
-        combined_metadata = {}
-        
-        # Apply dictionary
-        compressed, meta = self.algorithms[0].compress(compressed)
-        combined_metadata.update(meta)
-        
-        return compressed, combined_metadata
+        """Balanced compression - dictionary on the columns where it pays off"""
+        return self._compress_planned(data, ("dictionary",))
     
     def _compress_ultra(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-        """Ultra compression - all algorithms"""
+        """Ultra compression - all algorithms, one per column"""
+        return self._compress_planned(data, METHODS)
+    
+    def plan(self, data: Dict[str, Any], methods: Tuple[str, ...] = METHODS) -> CompressionPlan:
+        """Per-table, per-column compression plan from sampled statistics"""
+        return plan_compression(data, self.methods, methods)
+    
+    def _compress_planned(self, data: Dict[str, Any],
+                          methods: Tuple[str, ...]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Run each method over the columns planned for it"""
+        plan = self.plan(data, methods)
         compressed = data
-        combined_metadata = {}
+        combined_metadata: Dict[str, Any] = {}
         
-        for algo in self.algorithms:
-            compressed, meta = algo.compress(compressed)
+        # Column transforms first (templates, then deltas of what they leave,
+        # then runs), so the dictionary also sees their output
+        for method in METHODS:
+            if method not in methods:
+                continue
+            columns = plan.columns(method)
+            if method == "delta":
+                # Templates may leave integer parts worth delta encoding
+                for table, names in plan.columns("pattern").items():
+                    columns[table] |= names
+            compressed, meta = self.methods[method].compress(compressed, columns=columns)
             combined_metadata.update(meta)
         
+        combined_metadata['plan'] = plan
         return compressed, combined_metadata
     
     def _compress_adaptive(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Adaptive compression - choose best strategy"""
-        data_str = json.dumps(data)
-        
-        # Analyze data characteristics
-        size = len(data_str)
-        
+        # Analyze data characteristics on per-table samples
+        profiles = self._profile(data)
+        size = sum(profile[0] for profile in profiles.values())
+        compressed, metadata = self._compress_choice(data, profiles, size)
+        metadata['estimated_size'] = round(size)
+        return compressed, metadata
+    
+    def _compress_choice(self, data: Dict[str, Any], profiles: Dict[str, List[Any]],
+                         size: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Compress with the strategy the estimated size and savings call for"""
         if size < 1000:
             return self._compress_fast(data)
         elif size < 10000:
             return self._compress_balanced(data)
         else:
-            # Estimate each algorithm
-            best_algo = max(self.algorithms, key=lambda a: a.estimate_savings(data))
-            return best_algo.compress(data)
+            # Estimate each algorithm, weighting tables by size
+            savings = [0.0] * len(self.algorithms)
+            for name, profile in profiles.items():
+                for i, saved in enumerate(self._savings(name, data[name], profile)):
+                    savings[i] += saved * profile[0]
+            best = max(range(len(self.algorithms)), key=savings.__getitem__)
+            method = list(self.methods)[best]
+            return self._compress_planned(data, (method,))
+    
+    def estimate_size(self, data: Dict[str, Any], sample_size: int = SIZE_SAMPLE_SIZE) -> int:
+        """Estimated JSON size of data's tables in characters, from small samples
+        
+        Tables are sampled at one row in SIZE_SAMPLE_RATIO, at most
+        sample_size rows, so the estimate costs a fixed share of encoding.
+        Tables too small for two sampled rows are measured in full.
+        """
+        size = 0.0
+        for table in data.values():
+            if not isinstance(table, list) or not table:
+                size += _json_size(table)
+                continue
+            count = len(table)
+            rows = min(sample_size, count // SIZE_SAMPLE_RATIO)
+            sample = table if rows < 2 else sample_rows(table, rows)
+            row_size = sum(map(_json_size, sample)) / len(sample)
+            size += (row_size + 2) * count  # ", " between rows, [] around them
+        return round(size)
+    
+    def _profile(self, data: Dict[str, Any]) -> Dict[str, List[Any]]:
+        """Estimated serialized size (and cached savings) per table, from samples"""
+        profiles = {}
+        for name, table in data.items():
+            if not isinstance(table, list):
+                profiles[name] = [len(json.dumps(table, default=str)), None]
+                continue
+            sample = sample_rows(table, SAMPLE_SIZE)
+            dumps = [json.dumps(record, default=str) for record in sample]
+            key = (name, len(table), hash("\n".join(dumps)))
+            profile = self._profiles.get(key)
+            if profile is None:
+                scale = len(table) / len(sample) if sample else 0
+                profile = [(sum(map(len, dumps)) + 2 * len(dumps)) * scale, None]
+                self._profiles[key] = profile
+                if len(self._profiles) > PROFILE_CACHE_SIZE:
+                    self._profiles.popitem(last=False)
+            else:
+                self._profiles.move_to_end(key)
+            profiles[name] = profile
+        return profiles
+    
+    def _savings(self, name: str, table: Any, profile: List[Any]) -> List[float]:
+        """Each algorithm's estimated savings on the table sample (cached)"""
+        savings: Optional[List[float]] = profile[1]
+        if savings is None:
+            sample = {name: sample_rows(table, SAMPLE_SIZE) if isinstance(table, list) else table}
+            savings = profile[1] = [algo.estimate_savings(sample) for algo in self.algorithms]
+        return savings
 
 
@@ -0,0 +1,101 @@
+"""
+ATON Format - Column Compression Planning
+
+Chooses one compression method per table column (RLE, delta, pattern,
+dictionary or none) from statistics on a bounded sample of rows, so each
+algorithm only visits the columns where it is expected to pay off and
+incompressible columns (free text, unique ids without structure) are
+skipped entirely.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set
+
+from .algorithms import (
+    CompressionAlgorithm,
+    DeltaCompression,
+    DictionaryCompression,
+    MISSING,
+    PatternCompression,
+    RunLengthCompression,
+)
+
+# Methods in application order; earlier ones win ties
+METHODS = ("pattern", "delta", "rle", "dictionary")
+NO_COMPRESSION = "none"
+
+# Rows per table sampled for planning and ADAPTIVE profiling
+SAMPLE_SIZE = 200
+
+# Contiguous chunks samples are taken in (keeps runs/deltas visible)
+SAMPLE_CHUNKS = 4
+
+
+@dataclass
+class CompressionPlan:
+    """Compression method chosen for each table column."""
+    tables: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+    def method(self, table: str, column: str) -> str:
+        return self.tables.get(table, {}).get(column, NO_COMPRESSION)
+
+    def columns(self, method: str) -> Dict[str, Set[str]]:
+        """{table: columns} planned for method (every planned table is a key)"""
+        return {
+            table: {column for column, m in columns.items() if m == method}
+            for table, columns in self.tables.items()
+        }
+
+
+def sample_rows(records: List[Any], size: int, chunks: int = SAMPLE_CHUNKS) -> List[Any]:
+    """Up to size rows in evenly spaced contiguous chunks"""
+    if len(records) <= size:
+        return records
+    chunks = max(1, min(chunks, size))
+    chunk = size // chunks
+    span = len(records) - chunk
+    sample = []
+    for k in range(chunks):
+        start = span * k // max(chunks - 1, 1)
+        sample.extend(records[start:start + chunk])
+    return sample
+
+
+def plan_compression(data: Dict[str, Any],
+                     algorithms: Optional[Mapping[str, CompressionAlgorithm]] = None,
+                     methods: Sequence[str] = METHODS,
+                     sample_size: int = SAMPLE_SIZE) -> CompressionPlan:
+    """Pick the method with the largest estimated savings for every column.
+
+    algorithms maps method names to the configured instances whose
+    thresholds are used; missing ones use defaults.
+    """
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise ValueError(f"Unknown compression methods: {sorted(unknown)}")
+    algorithms = dict(algorithms or {})
+    algorithms.setdefault("dictionary", DictionaryCompression())
+    algorithms.setdefault("delta", DeltaCompression())
+    algorithms.setdefault("pattern", PatternCompression())
+    algorithms.setdefault("rle", RunLengthCompression())
+
+    plan = CompressionPlan()
+    for table, records in data.items() if isinstance(data, dict) else ():
+        if not isinstance(records, list) or not records:
+            continue
+        sample = sample_rows(records, sample_size)
+        if not all(isinstance(r, dict) for r in sample):
+            continue
+        columns = plan.tables.setdefault(table, {})
+        for column in sample[0]:
+            values = [r.get(column, MISSING) for r in sample]
+            columns[column] = _choose(values, algorithms, methods)
+    return plan
+
+
+def _choose(values: List[Any], algorithms: Mapping[str, CompressionAlgorithm],
+            methods: Sequence[str]) -> str:
+    """Method with the most characters saved on the sampled values"""
+    scores = {method: algorithms[method].score_column(values) for method in methods}
+    best = max(METHODS, key=lambda m: scores.get(m, 0))
+    return best if scores.get(best, 0) > 0 else NO_COMPRESSION
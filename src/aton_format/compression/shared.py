@@ -0,0 +1,108 @@
+"""
+ATON Format - Shared Dictionaries
+
+Pre-trained, versioned string dictionaries shared by encoders and decoders
+across messages (like zstd trained dictionaries). A message that uses one
+carries ``@dict-ref[vN-<hash>]`` instead of the full entries, plus an
+incremental ``@dict+[...]`` line for strings the shared dictionary does not
+cover. The hash is taken over the entries, so two dictionaries trained
+independently never share an ID.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from ..exceptions import ATONCompressionError
+
+DICTIONARY_FORMAT = "aton-dict"
+
+# Hex digits of the entries' SHA-256 kept in dictionary IDs
+ID_HASH_LENGTH = 12
+
+
+@dataclass(frozen=True)
+class SharedDictionary:
+    """A versioned ref -> string dictionary known to both sides."""
+    version: int
+    entries: Dict[str, str] = field(default_factory=dict)
+    _id: str = field(init=False, repr=False, compare=False)
+    _refs: Dict[str, str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.version < 0:
+            raise ValueError("Shared dictionary version must be >= 0")
+        # Reverse map for the encoder (frozen, so set through object)
+        object.__setattr__(self, "_refs", {s: ref for ref, s in self.entries.items()})
+        canonical = json.dumps(self.entries, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:ID_HASH_LENGTH]
+        object.__setattr__(self, "_id", f"v{self.version}-{digest}")
+
+    @property
+    def dict_id(self) -> str:
+        """Identifier written in @dict-ref[...]: version plus a hash of the entries"""
+        return self._id
+
+    def ref_for(self, string: str) -> Optional[str]:
+        """Ref of string in this dictionary, if any"""
+        return self._refs.get(string)
+
+    def extend(self, entries: Dict[str, str]) -> "SharedDictionary":
+        """New version with entries (e.g. a message's @dict+ line) added"""
+        merged = dict(self.entries)
+        merged.update(entries)
+        return SharedDictionary(version=self.version + 1, entries=merged)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"format": DICTIONARY_FORMAT, "version": self.version, "id": self.dict_id,
+                "entries": self.entries}
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "SharedDictionary":
+        if not isinstance(payload, dict) or payload.get("format") != DICTIONARY_FORMAT:
+            raise ATONCompressionError("Not an ATON shared dictionary")
+        try:
+            shared = cls(version=int(payload["version"]), entries=dict(payload["entries"]))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ATONCompressionError(f"Invalid shared dictionary: {e}") from e
+        if payload.get("id", shared.dict_id) != shared.dict_id:
+            raise ATONCompressionError(
+                f"Shared dictionary entries do not match its id '{payload['id']}'"
+            )
+        return shared
+
+    def save(self, path: str) -> None:
+        """Write the dictionary to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str) -> "SharedDictionary":
+        """Read a dictionary written by save()"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except ValueError as e:
+            raise ATONCompressionError(f"Invalid shared dictionary file: {e}") from e
+        return cls.from_dict(payload)
+
+
+def train_dictionary(samples: Iterable[Dict[str, Any]], version: int = 1,
+                     min_length: int = 5, min_occurrences: int = 3,
+                     max_entries: Optional[int] = None,
+                     tokenizer: Optional[Callable[[str], int]] = None) -> SharedDictionary:
+    """Build a shared dictionary from sample payloads.
+
+    Strings are counted across all samples and selected with the same net
+    token savings ranking DictionaryCompression uses per message.
+    """
+    from .algorithms import DictionaryCompression
+
+    algo = DictionaryCompression(min_length=min_length, min_occurrences=min_occurrences,
+                                 max_entries=max_entries, tokenizer=tokenizer)
+    counts: Dict[str, int] = {}
+    for sample in samples:
+        for string, count in algo.count_strings(sample).items():
+            counts[string] = counts.get(string, 0) + count
+    return SharedDictionary(version=version, entries=algo.select_entries(counts))
@@ -2,7 +2,18 @@
 
 from .encoder import ATONEncoder
 from .decoder import ATONDecoder
-from .types import ATONType, SortOrder, CompressionStats, QueryExpression, ParsedQuery, QueryCondition
+from .types import (
+    ATONType,
+    SortOrder,
+    CompressionStats,
+    QueryExpression,
+    ParsedQuery,
+    QueryCondition,
+    QueryParameter,
+    AggregateField,
+    JoinClause,
+    OrderKey,
+)
 
 __all__ = [
     "ATONEncoder",
@@ -13,4 +24,8 @@ __all__ = [
     "QueryExpression",
     "ParsedQuery",
     "QueryCondition",
+    "QueryParameter",
+    "AggregateField",
+    "JoinClause",
+    "OrderKey",
 ]
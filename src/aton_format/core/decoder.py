@@ -1,23 +1,43 @@
 """ATON Format - Decoder"""
 
-from typing import Any, Dict, List, Tuple
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from ..compression.algorithms import DELTA_CODECS, DITTO, DITTO_MARKER, decode_deltas, undo_ditto
+from ..compression.shared import SharedDictionary
 from ..exceptions import ATONDecodingError
 
+# #prefix"middle"#suffix values (either ref optional) written by DictionaryCompression
+AFFIX_REF = re.compile(r'(#[0-9A-Za-z]+)?"(.*)"(#[0-9A-Za-z]+)?\Z')
+
 
 class ATONDecoder:
     """Production-grade ATON decoder"""
     
-    def __init__(self, validate: bool = True):
+    def __init__(self, validate: bool = True,
+                 shared_dictionaries: Optional[
+                     Union[SharedDictionary, Iterable[SharedDictionary]]
+                 ] = None):
         self.validate = validate
         self.dictionary: Dict[str, str] = {}
+        if isinstance(shared_dictionaries, SharedDictionary):
+            shared_dictionaries = [shared_dictionaries]
+        self.shared_dictionaries: Dict[str, SharedDictionary] = {
+            d.dict_id: d for d in shared_dictionaries or ()
+        }
+    
+    def add_shared_dictionary(self, dictionary: SharedDictionary) -> None:
+        """Make a shared dictionary available to @dict-ref[...] lines"""
+        self.shared_dictionaries[dictionary.dict_id] = dictionary
     
     def decode(self, aton_string: str) -> Dict[str, List[Dict]]:
         """Decode ATON string"""
         try:
+            self.dictionary = {}
             lines = [l.rstrip() for l in aton_string.split('\n')]
             result = {}
             schema = []
             defaults = {}
+            patterns: Dict[str, Tuple[str, str]] = {}
             
             i = 0
             while i < len(lines):
@@ -27,12 +47,21 @@ class ATONDecoder:
                     i += 1
                     continue
                 
-                if line.startswith('@dict'):
+                if line.startswith('@dict-ref'):
+                    self.dictionary = self._resolve_shared(line)
+                elif line.startswith('@dict+'):
+                    self.dictionary.update(self._parse_dict(line))
+                elif line.startswith('@dict'):
                     self.dictionary = self._parse_dict(line)
                 elif line.startswith('@schema'):
+                    # Each table starts with its schema; header lines don't carry over
                     schema = self._parse_schema(line)
+                    defaults = {}
+                    patterns = {}
                 elif line.startswith('@defaults'):
                     defaults = self._parse_defaults(line)
+                elif line.startswith('@pattern'):
+                    patterns = self._parse_patterns(line)
                 elif line.startswith('@'):
                     pass
                 elif '(' in line and line.endswith('):'):
@@ -41,20 +70,20 @@ class ATONDecoder:
                     count = int(line.split('(')[1].split(')')[0])
                     result[table] = []
                     
-                    # Read count records
+                    # Read count records (a *N line repeats the previous one N times)
                     i += 1
-                    for _ in range(count):
-                        while i < len(lines):
-                            data_line = lines[i].strip()
-                            if data_line and not data_line.startswith('@') and not ('(' in data_line and data_line.endswith('):')):
-                                record = self._parse_record(data_line, schema, defaults)
-                                result[table].append(record)
-                                i += 1
-                                break
-                            elif data_line.startswith('@') or not data_line:
-                                i += 1
-                            else:
-                                break
+                    records = result[table]
+                    while len(records) < count and i < len(lines):
+                        data_line = lines[i].strip()
+                        if '(' in data_line and data_line.endswith('):'):
+                            break
+                        if data_line.startswith('*') and data_line[1:].isdigit() and records:
+                            repeats = min(int(data_line[1:]), count - len(records))
+                            records.extend(dict(records[-1]) for _ in range(repeats))
+                        elif data_line and not data_line.startswith('@'):
+                            records.append(self._parse_record(data_line, schema, defaults))
+                        i += 1
+                    self._decode_columns(result[table], schema, patterns)
                     continue
                 
                 i += 1
@@ -69,10 +98,21 @@ class ATONDecoder:
         for item in self._split_smart(content, ','):
             if ':' in item:
                 k, v = item.split(':', 1)
-                v = v.strip().strip('"').replace('\\"', '"')
-                d[k.strip()] = v
+                v = v.strip()
+                if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+                    v = v[1:-1]  # One pair only: an escaped quote may end the string
+                d[k.strip()] = v.replace('\\"', '"')
         return d
     
+    def _resolve_shared(self, line: str) -> Dict[str, str]:
+        dict_id = line[line.index('[')+1:line.rindex(']')].strip()
+        shared = self.shared_dictionaries.get(dict_id)
+        if shared is None:
+            # IDs carry a hash of the entries, so only the exact dictionary matches
+            known = ", ".join(sorted(self.shared_dictionaries)) or "none"
+            raise ATONDecodingError(f"Unknown shared dictionary '{dict_id}' (loaded: {known})")
+        return dict(shared.entries)
+    
     def _parse_schema(self, line: str) -> List[Tuple[str, str]]:
         content = line[line.index('[')+1:line.rindex(']')]
         schema = []
@@ -88,10 +128,7 @@ class ATONDecoder:
         for item in self._split_smart(content, ','):
             if ':' in item:
                 k, v = item.split(':', 1)
-                val = self._parse_val(v.strip())
-                if isinstance(val, str) and val.startswith('#') and val in self.dictionary:
-                    val = self.dictionary[val]
-                defaults[k.strip()] = val
+                defaults[k.strip()] = self._parse_cell(v.strip())
         return defaults
     
     def _parse_record(self, line: str, schema: List[Tuple], defaults: Dict) -> Dict:
@@ -100,14 +137,60 @@ class ATONDecoder:
         
         for idx, (name, _) in enumerate(schema):
             if idx < len(vals):
-                val = self._parse_val(vals[idx].strip())
-                if isinstance(val, str) and val.startswith('#') and val in self.dictionary:
-                    val = self.dictionary[val]
-                rec[name] = val
+                rec[name] = self._parse_cell(vals[idx].strip())
         return rec
     
+    def _parse_cell(self, v: str) -> Any:
+        """Parse a value, expanding dictionary refs (whole or #prefix"middle"#suffix)"""
+        spliced = None
+        if (v[:1] == '#' and '"' in v) or (v[:1] == '"' and v[-1:] != '"'):
+            spliced = AFFIX_REF.match(v)
+        if spliced is not None:
+            prefix, middle, suffix = spliced.groups()
+            for ref in (prefix, suffix):
+                if ref and ref not in self.dictionary:
+                    raise ATONDecodingError(f"Unknown dictionary ref '{ref}'")
+            middle = middle.replace('\\"', '"')
+            return self.dictionary.get(prefix, "") + middle + self.dictionary.get(suffix, "")
+        val = self._parse_val(v)
+        if isinstance(val, str) and val.startswith('#') and val in self.dictionary:
+            val = self.dictionary[val]
+        return val
+    
+    def _parse_patterns(self, line: str) -> Dict[str, Tuple[str, str]]:
+        patterns = {}
+        for column, template in self._parse_dict(line).items():
+            if '{}' not in template:
+                raise ATONDecodingError(f"Template for '{column}' has no {{}} placeholder")
+            prefix, _, suffix = template.partition('{}')
+            patterns[column] = (prefix, suffix)
+        return patterns
+    
+    def _decode_columns(self, records: List[Dict], schema: List[Tuple[str, str]],
+                        patterns: Dict[str, Tuple[str, str]]) -> None:
+        """Undo column encodings: name:type~codec~... last first, then @pattern templates"""
+        for name, type_ in schema:
+            codecs = type_.split('~')[1:]
+            if not codecs:
+                continue
+            values = [record.get(name) for record in records]
+            for codec in reversed(codecs):
+                if codec == 'rle':
+                    values = undo_ditto(values)
+                elif codec in DELTA_CODECS:
+                    values = decode_deltas(values, codec)
+                else:
+                    raise ATONDecodingError(f"Unknown column encoding '{codec}' for '{name}'")
+            for record, value in zip(records, values):
+                record[name] = value
+        for name, (prefix, suffix) in patterns.items():
+            for record in records:
+                if name in record:
+                    record[name] = f"{prefix}{record[name]}{suffix}"
+    
     def _parse_val(self, v: str) -> Any:
         if v == 'null': return None
+        if v == DITTO_MARKER: return DITTO
         if v == 'true': return True
         if v == 'false': return False
         if v.startswith('"') and v.endswith('"'):
@@ -1,13 +1,19 @@
 """ATON Format - Encoder"""
 
 import time
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from collections import Counter, defaultdict
 
 from ..compression.modes import CompressionMode
+from ..compression.algorithms import CHARS_PER_TOKEN, DITTO, DITTO_MARKER, AffixRef
 from ..compression.engine import ATONCompressionEngine
+from ..compression.shared import SharedDictionary
 from ..query.engine import ATONQueryEngine
 from ..exceptions import ATONEncodingError, ATONQueryError
+from .types import CompressionStats
+
+# Encoding phases timed for CompressionStats.phase_times_ns
+PHASES = ("validation", "compression", "inference", "formatting")
 
 
 class ATONEncoder:
@@ -17,11 +23,16 @@ class ATONEncoder:
                  optimize: bool = True,
                  compression: Union[str, CompressionMode] = CompressionMode.BALANCED,
                  queryable: bool = False,
-                 validate: bool = True):
+                 validate: bool = True,
+                 result_cache_size: int = 0,
+                 shared_dictionary: Optional[SharedDictionary] = None,
+                 tokenizer: Optional[Callable[[str], int]] = None):
         """Initialize encoder"""
         self.optimize = optimize
         self.queryable = queryable
         self.validate = validate
+        self.shared_dictionary = shared_dictionary
+        self.tokenizer = tokenizer
         
         # Parse compression mode
         if isinstance(compression, str):
@@ -33,31 +44,62 @@ class ATONEncoder:
             self.compression_mode = compression
         
         # Initialize engines
-        self.compression_engine = ATONCompressionEngine(self.compression_mode)
-        self.query_engine = ATONQueryEngine()
+        self.compression_engine = ATONCompressionEngine(
+            self.compression_mode, shared_dictionary, tokenizer
+        )
+        self.query_engine = ATONQueryEngine(result_cache_size=result_cache_size)
     
-    def encode(self, data: Dict[str, Any], compress: bool = True) -> str:
-        """Encode data to ATON format"""
+    def encode(self, data: Dict[str, Any], compress: bool = True,
+               return_stats: bool = False) -> Union[str, Tuple[str, CompressionStats]]:
+        """Encode data to ATON format (with return_stats, also its CompressionStats)"""
         try:
+            clock = time.perf_counter_ns
+            times = dict.fromkeys(PHASES, 0)
+            start = clock()
+            
             # Validate input
             if self.validate:
                 self._validate_data(data)
+            mark = clock()
+            times["validation"] = mark - start
             
             # Apply compression
+            metadata: Dict[str, Any] = {}
             if compress and self.compression_mode != CompressionMode.FAST:
                 compressed_data, metadata = self.compression_engine.compress(data)
                 dictionary = metadata.get('dictionary', {})
+                shared = metadata.get('shared_dictionary')
+                delta_fields = metadata.get('delta_fields', {})
+                patterns = metadata.get('patterns', {})
+                rle_fields = metadata.get('rle_fields', {})
+                row_runs = metadata.get('row_runs', {})
             else:
                 compressed_data = data
                 dictionary = {}
+                shared = None
+                delta_fields = {}
+                patterns = {}
+                rle_fields = {}
+                row_runs = {}
+            now = clock()
+            times["compression"] = now - mark
+            mark = now
             
             # Build ATON string
             aton_parts = []
             
-            # Add dictionary
-            if dictionary:
+            # Add dictionary (shared by reference, plus this message's entries)
+            if shared is not None:
+                aton_parts.append(f"@dict-ref[{shared.dict_id}]")
+                if dictionary:
+                    aton_parts.append(self._format_dictionary(dictionary, "@dict+"))
+                aton_parts.append("")
+            elif dictionary:
                 aton_parts.append(self._format_dictionary(dictionary))
                 aton_parts.append("")
+            now = clock()
+            times["formatting"] = now - mark
+            mark = now
             
             # Encode tables
             for table_name, records in compressed_data.items():
@@ -65,45 +107,109 @@ class ATONEncoder:
                     continue
                 
                 # Infer structure
+                codecs = dict(delta_fields.get(table_name, {}))
+                for column in rle_fields.get(table_name, ()):
+                    codecs[column] = f"{codecs[column]}~rle" if column in codecs else "rle"
+                runs = row_runs.get(table_name, {})
                 if records:
                     schema = self._infer_schema(records[0])
-                    defaults = self._infer_defaults(records) if self.optimize else {}
+                    defaults = (self._infer_defaults(records, exclude=codecs)
+                                if self.optimize else {})
                 else:
                     schema = []
                     defaults = {}
+                now = clock()
+                times["inference"] += now - mark
+                mark = now
                 
                 # Add schema
-                aton_parts.append(self._format_schema(schema))
+                aton_parts.append(self._format_schema(schema, codecs))
                 
                 # Add defaults
                 if defaults:
                     aton_parts.append(self._format_defaults(defaults))
                 
+                # Add column templates
+                if table_name in patterns:
+                    aton_parts.append(self._format_patterns(patterns[table_name]))
+                
                 # Add queryable marker
                 if self.queryable:
                     aton_parts.append(f"@queryable[{table_name}]")
                 
                 # Add table header
-                aton_parts.append(f"\n{table_name}({len(records)}):")
+                aton_parts.append(f"\n{table_name}({len(records) + sum(runs.values())}):")
                 
-                # Add records
-                for record in records:
+                # Add records (*N repeats the previous row N more times)
+                for index, record in enumerate(records):
                     row = self._format_record(record, schema, defaults)
                     aton_parts.append(f"  {row}")
+                    if index in runs:
+                        aton_parts.append(f"  *{runs[index]}")
+                now = clock()
+                times["formatting"] += now - mark
+                mark = now
             
-            return "\n".join(aton_parts)
+            aton = "\n".join(aton_parts)
+            times["formatting"] += clock() - mark
+            if not return_stats:
+                return aton
+            return aton, self._stats(data, aton, metadata, times)
         
         except Exception as e:
             raise ATONEncodingError(f"Encoding failed: {str(e)}") from e
     
-    def encode_with_query(self, data: Dict[str, Any], query_string: str) -> str:
-        """Encode with query filtering"""
+    def _stats(self, data: Dict[str, Any], aton: str, metadata: Dict[str, Any],
+               times: Dict[str, int]) -> CompressionStats:
+        """CompressionStats for one encode() call
+        
+        The original size is the JSON size ADAPTIVE mode already estimated,
+        or else a sampled estimate costing a fixed small share of encoding,
+        so collecting stats does not serialize the whole input.
+        """
+        original_size = metadata.get('estimated_size')
+        if original_size is None:
+            original_size = self.compression_engine.estimate_size(data)
+        compressed_size = len(aton)
+        stats_metadata: Dict[str, Any] = {}
+        if 'tokens_saved' in metadata:
+            stats_metadata['dictionary_tokens_saved'] = metadata['tokens_saved']
+        if 'plan' in metadata:
+            stats_metadata['plan'] = metadata['plan']
+        return CompressionStats(
+            original_size=original_size,
+            compressed_size=compressed_size,
+            compression_ratio=compressed_size / original_size if original_size else 1.0,
+            tokens_saved=max(0, round((original_size - compressed_size) / CHARS_PER_TOKEN)),
+            encoding_time_ms=sum(times.values()) / 1e6,
+            mode=self.compression_mode.value,
+            dictionary_size=len(metadata.get('dictionary', {})),
+            metadata=stats_metadata,
+            phase_times_ns=times,
+        )
+    
+    def encode_with_query(self, data: Optional[Dict[str, Any]], query_string: str) -> str:
+        """Encode with query filtering (data=None queries registered tables)"""
         try:
-            query = self.query_engine.parse(f"@query[{query_string}]")
-            filtered_records = self.query_engine.execute(data, query)
-            filtered_data = {query.table: filtered_records}
-            aton = self.encode(filtered_data)
-            return f"@query[{query_string}]\n\n{aton}"
+            engine = self.query_engine
+            compiled = engine.compile(query_string)
+            
+            def build() -> str:
+                # Only the encoded text is cached, not the rows behind it
+                filtered_records = list(engine.execute_iter(data, compiled))
+                filtered_data = {compiled.query.table: filtered_records}
+                aton = self.encode(filtered_data)
+                return f"@query[{query_string}]\n\n{aton}"
+            
+            # Encoded text is cached under the same table versions as results
+            key = engine.result_key(data, compiled)
+            if key is None or engine.result_cache is None:
+                return build()
+            shared_id = self.shared_dictionary.dict_id if self.shared_dictionary else None
+            settings = (self.compression_mode, self.optimize, self.queryable, shared_id,
+                        self.tokenizer, query_string)
+            text: str = engine.result_cache.get_or_create(("aton", settings) + key, build)
+            return text
         except Exception as e:
             raise ATONQueryError(f"Query encoding failed: {str(e)}") from e
     
@@ -119,26 +225,35 @@ class ATONEncoder:
                 raise ATONEncodingError(f"Table '{table_name}' must be a list of records")
             for i, record in enumerate(records):
                 if not isinstance(record, dict):
-                    raise ATONEncodingError(f"Record {i} in table '{table_name}' must be a dictionary")
+                    raise ATONEncodingError(
+                        f"Record {i} in table '{table_name}' must be a dictionary"
+                    )
     
-    def _format_dictionary(self, dictionary: Dict[str, str]) -> str:
+    def _format_dictionary(self, dictionary: Dict[str, str], tag: str = "@dict") -> str:
         """Format compression dictionary"""
         entries = []
         for key, value in sorted(dictionary.items()):
             escaped_value = value.replace('"', '\\"')
             entries.append(f'{key}:"{escaped_value}"')
-        return f"@dict[{', '.join(entries)}]"
+        return f"{tag}[{', '.join(entries)}]"
     
-    def _format_schema(self, schema: List[Tuple[str, str]]) -> str:
-        """Format schema line"""
-        fields = [f"{name}:{type_}" for name, type_ in schema]
+    def _format_schema(self, schema: List[Tuple[str, str]],
+                       codecs: Optional[Dict[str, str]] = None) -> str:
+        """Format schema line (encoded columns as name:type~codec)"""
+        codecs = codecs or {}
+        fields = [
+            f"{name}:{type_}~{codecs[name]}" if name in codecs else f"{name}:{type_}"
+            for name, type_ in schema
+        ]
         return f"@schema[{', '.join(fields)}]"
     
     def _format_defaults(self, defaults: Dict[str, Any]) -> str:
         """Format defaults line"""
         entries = []
         for key, value in sorted(defaults.items()):
-            if isinstance(value, str):
+            if isinstance(value, AffixRef):
+                entries.append(f'{key}:{value}')
+            elif isinstance(value, str):
                 escaped_value = value.replace('"', '\\"')
                 entries.append(f'{key}:"{escaped_value}"')
             elif isinstance(value, bool):
@@ -149,6 +264,14 @@ class ATONEncoder:
                 entries.append(f'{key}:{value}')
         return f"@defaults[{', '.join(entries)}]"
     
+    def _format_patterns(self, patterns: Dict[str, Tuple[str, str]]) -> str:
+        """Format column templates line ({} marks the per-row part)"""
+        entries = []
+        for column, (prefix, suffix) in patterns.items():
+            template = f"{prefix}{{}}{suffix}".replace('"', '\\"')
+            entries.append(f'{column}:"{template}"')
+        return f"@pattern[{', '.join(entries)}]"
+    
     def _format_record(self, record: Dict, schema: List[Tuple], defaults: Dict) -> str:
         """Format single record"""
         values = []
@@ -159,10 +282,12 @@ class ATONEncoder:
             
             if value is None:
                 formatted = "null"
+            elif value is DITTO:
+                formatted = DITTO_MARKER
             elif isinstance(value, bool):
                 formatted = "true" if value else "false"
             elif isinstance(value, str):
-                if value.startswith('#'):
+                if value.startswith('#') or isinstance(value, AffixRef):
                     formatted = value
                 else:
                     escaped = value.replace('"', '\\"')
@@ -180,8 +305,9 @@ class ATONEncoder:
             schema.append((key, type_str))
         return schema
     
-    def _infer_defaults(self, records: List[Dict]) -> Dict[str, Any]:
-        """Infer default values"""
+    def _infer_defaults(self, records: List[Dict],
+                        exclude: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Infer default values (columns in exclude never get one)"""
         defaults = {}
         if not records:
             return defaults
@@ -194,7 +320,7 @@ class ATONEncoder:
                 field_values[key].append(value)
         
         for field, values in field_values.items():
-            if values:
+            if values and not (exclude and field in exclude):
                 # Skip unhashable types (lists, dicts) for default detection
                 try:
                     value_counts = Counter(values)
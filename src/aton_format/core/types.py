@@ -7,7 +7,7 @@ Core type definitions, enums, and data classes.
 
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import re
 
 
@@ -29,9 +29,18 @@ class SortOrder(Enum):
     DESC = "DESC"
 
 
+def _frozen(value: Any) -> Any:
+    """Tuple copy of a list, so frozen query objects hold no mutable state"""
+    return tuple(value) if isinstance(value, list) else value
+
+
 @dataclass
 class CompressionStats:
-    """Statistics from compression operation."""
+    """Statistics from compression operation.
+    
+    phase_times_ns holds the time spent in each encoding phase
+    (validation, compression, inference, formatting).
+    """
     original_size: int
     compressed_size: int
     compression_ratio: float
@@ -40,16 +49,20 @@ class CompressionStats:
     mode: str
     dictionary_size: int = 0
     metadata: Dict[str, Any] = field(default_factory=dict)
+    phase_times_ns: Dict[str, int] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(frozen=True)
 class QueryCondition:
     """Single query condition."""
     field: str
     operator: str
-    value: Any
+    value: Any  # IN / NOT IN lists are stored as tuples
     value2: Optional[Any] = None  # For BETWEEN
     
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "value", _frozen(self.value))
+    
     def evaluate(self, record: Dict[str, Any]) -> bool:
         """Evaluate condition against record."""
         if self.field not in record:
@@ -84,12 +97,15 @@ class QueryCondition:
         return False
 
 
-@dataclass
+@dataclass(frozen=True)
 class QueryExpression:
     """AST node for query expressions."""
-    conditions: List[Any]  # List[Union[QueryCondition, QueryExpression]]
+    conditions: Sequence[Any]  # Tuple of QueryCondition / QueryExpression
     operator: str
     
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "conditions", _frozen(self.conditions))
+    
     def evaluate(self, record: Dict[str, Any]) -> bool:
         """Recursively evaluate expression against record."""
         if self.operator == "AND":
@@ -111,16 +127,77 @@ class QueryExpression:
         return False
 
 
-@dataclass
+@dataclass(frozen=True, repr=False)
+class QueryParameter:
+    """``?`` placeholder in a prepared query, bound by position."""
+    index: int
+    
+    def __repr__(self) -> str:
+        return "?"
+
+
+@dataclass(frozen=True)
+class AggregateField:
+    """Aggregate function in a SELECT list."""
+    function: str  # COUNT, SUM, AVG, MIN or MAX
+    field: Optional[str]  # None for COUNT(*)
+    alias: str
+
+
+@dataclass(frozen=True)
+class JoinClause:
+    """JOIN of another table on a single equality (or -> reference)."""
+    table: str
+    left_field: str
+    right_field: str
+    kind: str = "INNER"  # INNER or LEFT
+
+
+@dataclass(frozen=True)
+class OrderKey:
+    """One ORDER BY key. NULL and missing values sort last unless nulls_first."""
+    field: str
+    direction: SortOrder = SortOrder.ASC
+    nulls_first: bool = False
+
+
+@dataclass(frozen=True)
 class ParsedQuery:
-    """Parsed query structure."""
+    """Parsed query structure (immutable, safe to share from caches).
+    
+    List arguments are stored as tuples, so callers sharing a cached
+    query cannot change it under each other.
+    """
     table: str
-    select_fields: Optional[List[str]] = None
+    select_fields: Optional[Sequence[str]] = None
     where_expression: Optional[QueryExpression] = None
     order_by: Optional[str] = None
     order_direction: SortOrder = SortOrder.ASC
     limit: Optional[int] = None
     offset: int = 0
+    aggregates: Optional[Sequence[AggregateField]] = None
+    group_by: Optional[Sequence[str]] = None
+    joins: Optional[Sequence[JoinClause]] = None
+    parameter_count: int = 0  # Unbound ? placeholders in the WHERE clause
+    order_keys: Optional[Sequence[OrderKey]] = None  # All ORDER BY keys; order_by is the first
+    
+    def __post_init__(self) -> None:
+        for name in ("select_fields", "aggregates", "group_by", "joins", "order_keys"):
+            object.__setattr__(self, name, _frozen(getattr(self, name)))
+    
+    @property
+    def sort_keys(self) -> List[OrderKey]:
+        """ORDER BY keys, including a bare order_by/order_direction."""
+        if self.order_keys:
+            return list(self.order_keys)
+        if self.order_by:
+            return [OrderKey(self.order_by, self.order_direction)]
+        return []
+    
+    @property
+    def is_aggregate(self) -> bool:
+        """Whether the query produces aggregated rows."""
+        return bool(self.aggregates or self.group_by)
 
 
 @dataclass
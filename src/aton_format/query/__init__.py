@@ -2,6 +2,10 @@
 
 from .operators import QueryOperator, LogicalOperator
 from .parser import QueryTokenizer, QueryParser
+from .compiler import CompiledQuery, PreparedQuery, compile_expression
+from .cache import LRUCache, normalize_query, query_key
+from .aggregates import HashAggregator
+from .parallel import ParallelExecutor
 from .engine import ATONQueryEngine
 
 __all__ = [
@@ -9,5 +13,13 @@ __all__ = [
     "LogicalOperator",
     "QueryTokenizer",
     "QueryParser",
+    "CompiledQuery",
+    "PreparedQuery",
+    "compile_expression",
+    "LRUCache",
+    "normalize_query",
+    "query_key",
+    "HashAggregator",
+    "ParallelExecutor",
     "ATONQueryEngine",
 ]
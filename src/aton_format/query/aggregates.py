@@ -0,0 +1,212 @@
+"""
+ATON Format - Aggregation
+
+Streaming accumulators and single-pass hash aggregation for COUNT, SUM,
+AVG, MIN, MAX and GROUP BY. Accumulators can be fed row by row and merged,
+so aggregation works over iterators and partitioned inputs alike.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from ..core.types import AggregateField
+from ..exceptions import ATONQueryError
+
+A = TypeVar("A", bound="Accumulator")
+
+
+class Accumulator(ABC):
+    """Base class for aggregate accumulators"""
+
+    @abstractmethod
+    def add(self, value: Any) -> None:
+        """Feed one value"""
+
+    @abstractmethod
+    def merge(self, other: "Accumulator") -> None:
+        """Fold in another accumulator of the same kind"""
+
+    @abstractmethod
+    def result(self) -> Any:
+        """Aggregate of the values fed so far"""
+
+
+def _like(accumulator: A, other: Accumulator) -> A:
+    """other, checked to be the same kind of accumulator as accumulator"""
+    if not isinstance(other, type(accumulator)):
+        raise TypeError(
+            f"Cannot merge {type(other).__name__} into {type(accumulator).__name__}"
+        )
+    return other
+
+
+class CountAccumulator(Accumulator):
+    """COUNT(*) counts rows, COUNT(field) counts non-null values"""
+
+    def __init__(self, count_rows: bool = False) -> None:
+        self.count_rows = count_rows
+        self.count = 0
+
+    def add(self, value: Any) -> None:
+        if self.count_rows or value is not None:
+            self.count += 1
+
+    def merge(self, other: Accumulator) -> None:
+        other = _like(self, other)
+        self.count += other.count
+
+    def result(self) -> int:
+        return self.count
+
+
+class SumAccumulator(Accumulator):
+    """SUM of non-null values (None when there are none)"""
+
+    def __init__(self) -> None:
+        self.total: Any = None
+
+    def add(self, value: Any) -> None:
+        if value is not None:
+            self.total = value if self.total is None else self.total + value
+
+    def merge(self, other: Accumulator) -> None:
+        other = _like(self, other)
+        self.add(other.total)
+
+    def result(self) -> Any:
+        return self.total
+
+
+class AvgAccumulator(Accumulator):
+    """AVG of non-null values (None when there are none)"""
+
+    def __init__(self) -> None:
+        self.total: Any = 0
+        self.count = 0
+
+    def add(self, value: Any) -> None:
+        if value is not None:
+            self.total += value
+            self.count += 1
+
+    def merge(self, other: Accumulator) -> None:
+        other = _like(self, other)
+        self.total += other.total
+        self.count += other.count
+
+    def result(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class MinAccumulator(Accumulator):
+    """MIN of non-null values"""
+
+    def __init__(self) -> None:
+        self.value: Any = None
+
+    def add(self, value: Any) -> None:
+        if value is not None and (self.value is None or value < self.value):
+            self.value = value
+
+    def merge(self, other: Accumulator) -> None:
+        other = _like(self, other)
+        self.add(other.value)
+
+    def result(self) -> Any:
+        return self.value
+
+
+class MaxAccumulator(Accumulator):
+    """MAX of non-null values"""
+
+    def __init__(self) -> None:
+        self.value: Any = None
+
+    def add(self, value: Any) -> None:
+        if value is not None and (self.value is None or value > self.value):
+            self.value = value
+
+    def merge(self, other: Accumulator) -> None:
+        other = _like(self, other)
+        self.add(other.value)
+
+    def result(self) -> Any:
+        return self.value
+
+
+AGGREGATE_FUNCTIONS: Dict[str, Type[Accumulator]] = {
+    "COUNT": CountAccumulator,
+    "SUM": SumAccumulator,
+    "AVG": AvgAccumulator,
+    "MIN": MinAccumulator,
+    "MAX": MaxAccumulator,
+}
+
+
+def make_accumulator(aggregate: AggregateField) -> Accumulator:
+    """Create a fresh accumulator for an aggregate"""
+    if aggregate.function == "COUNT":
+        return CountAccumulator(count_rows=aggregate.field is None)
+    return AGGREGATE_FUNCTIONS[aggregate.function]()
+
+
+class HashAggregator:
+    """Single-pass hash aggregation keyed by GROUP BY values.
+
+    Groups are emitted in first-seen order. Without GROUP BY the whole input
+    is one group, which produces one row even for empty input (as in SQL).
+    """
+
+    def __init__(self, group_by: Sequence[str], aggregates: Sequence[AggregateField],
+                 output_fields: Optional[Sequence[str]] = None):
+        self.group_by = list(group_by)
+        self.aggregates = list(aggregates)
+        self.output_fields = list(output_fields) if output_fields else (
+            self.group_by + [a.alias for a in self.aggregates]
+        )
+        self.groups: Dict[Tuple, List[Accumulator]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Feed one record"""
+        key = tuple(record.get(f) for f in self.group_by)
+        try:
+            accumulators = self.groups.get(key)
+        except TypeError:
+            raise ATONQueryError(f"Cannot group by unhashable value: {key!r}")
+        if accumulators is None:
+            accumulators = [make_accumulator(a) for a in self.aggregates]
+            self.groups[key] = accumulators
+        for aggregate, accumulator in zip(self.aggregates, accumulators):
+            accumulator.add(record.get(aggregate.field) if aggregate.field else None)
+
+    def consume(self, records: Iterable[Dict[str, Any]]) -> "HashAggregator":
+        """Feed every record from an iterable"""
+        add = self.add
+        for record in records:
+            add(record)
+        return self
+
+    def merge(self, other: "HashAggregator") -> "HashAggregator":
+        """Fold another aggregator's partial groups into this one"""
+        for key, accumulators in other.groups.items():
+            mine = self.groups.get(key)
+            if mine is None:
+                self.groups[key] = accumulators
+            else:
+                for acc, other_acc in zip(mine, accumulators):
+                    acc.merge(other_acc)
+        return self
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Aggregated output rows"""
+        groups = self.groups
+        if not groups and not self.group_by:
+            groups = {(): [make_accumulator(a) for a in self.aggregates]}
+
+        rows = []
+        for key, accumulators in groups.items():
+            row = dict(zip(self.group_by, key))
+            for aggregate, accumulator in zip(self.aggregates, accumulators):
+                row[aggregate.alias] = accumulator.result()
+            rows.append({f: row.get(f) for f in self.output_fields})
+        return rows
@@ -0,0 +1,134 @@
+"""
+ATON Format - Query Caches
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, Hashable
+
+_QUERY_WRAPPER = re.compile(r'@query\[(.*)\]', re.IGNORECASE | re.DOTALL)
+_WHITESPACE_OUTSIDE_STRINGS = re.compile(r"('[^']*'|\"[^\"]*\")|\s+")
+_MISSING = object()
+
+
+def normalize_query(query_string: str) -> str:
+    """Normalize query text for use as a cache key.
+
+    Strips an optional ``@query[...]`` wrapper and collapses whitespace runs
+    outside string literals, so formatting differences share one entry.
+    """
+    wrapped = _QUERY_WRAPPER.search(query_string)
+    if wrapped:
+        query_string = wrapped.group(1)
+    return _WHITESPACE_OUTSIDE_STRINGS.sub(
+        lambda m: m.group(1) or ' ', query_string
+    ).strip()
+
+
+def query_key(query: Any) -> Hashable:
+    """Hashable key for a parsed query tree.
+
+    Dataclass nodes become (type name, field keys...) tuples and lists
+    become tuples; literal values are keyed by their type and value rather
+    than their repr, so bound objects without a stable repr cannot collide.
+    Raises TypeError for unhashable values.
+    """
+    if is_dataclass(query) and not isinstance(query, type):
+        return (type(query).__name__,) + tuple(
+            query_key(getattr(query, f.name)) for f in fields(query)
+        )
+    if isinstance(query, (list, tuple)):
+        return tuple(query_key(value) for value in query)
+    hash(query)
+    return (type(query), query)
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache with hit/eviction counters"""
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Number of cached entries"""
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value and mark it as recently used"""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Insert or refresh an entry, evicting the least recently used"""
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return cached value, building it with factory on a miss.
+
+        The factory runs outside the lock so slow builds (parsing) do not
+        serialize other threads; if two threads miss on the same key at
+        once, the first value stored wins and both return it.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = factory()
+        with self._lock:
+            existing = self._entries.get(key, _MISSING)
+            if existing is not _MISSING:
+                self._entries.move_to_end(key)
+                return existing
+            self._store(key, value)
+            return value
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of cache counters for metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        """Store entry; caller must hold the lock"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
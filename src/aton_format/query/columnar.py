@@ -0,0 +1,213 @@
+"""
+ATON Format - Columnar Query Execution
+
+Optional NumPy backend for tables stored as ``{column: ndarray}``. WHERE
+trees are evaluated as boolean masks, ORDER BY uses stable ``argsort`` (or
+``partition`` for small LIMITs), and rows are carried as index arrays until
+the final result is materialized into records.
+
+Requires NumPy (``pip install aton-format[columnar]``).
+"""
+
+import re
+from typing import Any, Dict, List, Mapping
+
+from ..core.types import OrderKey, ParsedQuery, QueryCondition, QueryExpression, SortOrder
+from ..exceptions import ATONQueryError
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - exercised only without numpy
+    HAS_NUMPY = False
+
+_COMPARISONS = {
+    "<": "less",
+    ">": "greater",
+    "<=": "less_equal",
+    ">=": "greater_equal",
+}
+
+
+def _require_numpy() -> None:
+    if not HAS_NUMPY:
+        raise ImportError(
+            "Columnar execution requires NumPy: pip install aton-format[columnar]"
+        )
+
+
+class ColumnarExecutor:
+    """Evaluate parsed queries over dict-of-NumPy-array tables"""
+
+    def __init__(self) -> None:
+        _require_numpy()
+
+    def row_count(self, columns: Mapping[str, Any]) -> int:
+        """Validate column lengths and return the table's row count"""
+        lengths = {len(col) for col in columns.values()}
+        if len(lengths) > 1:
+            raise ATONQueryError("Columnar table has columns of different lengths")
+        return lengths.pop() if lengths else 0
+
+    def mask(self, columns: Mapping[str, Any], expression: Any, n: int) -> "np.ndarray":
+        """Evaluate a WHERE tree into a boolean mask of length n"""
+        if isinstance(expression, QueryCondition):
+            return self._condition_mask(columns, expression, n)
+        if not isinstance(expression, QueryExpression):
+            return np.zeros(n, dtype=bool)
+
+        masks = [self.mask(columns, c, n) for c in expression.conditions]
+        if expression.operator == "AND":
+            return np.logical_and.reduce(masks) if masks else np.ones(n, dtype=bool)
+        if expression.operator == "OR":
+            return np.logical_or.reduce(masks) if masks else np.zeros(n, dtype=bool)
+        if expression.operator == "NOT":
+            return ~masks[0]
+        return masks[0]
+
+    def select_indices(self, columns: Mapping[str, Any], query: ParsedQuery) -> "np.ndarray":
+        """Row indices of the query result, in result order"""
+        n = self.row_count(columns)
+
+        if query.where_expression:
+            indices = np.flatnonzero(self.mask(columns, query.where_expression, n))
+        else:
+            indices = np.arange(n)
+
+        sort_keys = query.sort_keys
+        if len(sort_keys) == 1:
+            k = query.offset + query.limit if query.limit else None
+            indices = self._order(columns, indices, sort_keys[0], k)
+        else:
+            # Successive stable sorts, least significant key first
+            for key in reversed(sort_keys):
+                indices = self._order(columns, indices, key, None)
+
+        stop = query.offset + query.limit if query.limit else None
+        return indices[query.offset:stop]
+
+    def materialize(self, columns: Mapping[str, Any], indices: "np.ndarray",
+                    fields: Any = None) -> List[Dict[str, Any]]:
+        """Build records for the given row indices (Python scalars, not NumPy)"""
+        fields = list(fields) if fields else list(columns)
+        values = [
+            columns[f][indices].tolist() if f in columns else [None] * len(indices)
+            for f in fields
+        ]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def execute(self, columns: Mapping[str, Any], query: ParsedQuery) -> List[Dict[str, Any]]:
+        """Execute query and materialize the resulting records"""
+        indices = self.select_indices(columns, query)
+        return self.materialize(columns, indices, query.select_fields)
+
+    def _condition_mask(self, columns: Mapping[str, Any],
+                        condition: QueryCondition, n: int) -> "np.ndarray":
+        """Vectorized evaluation of a single condition"""
+        if condition.field not in columns:
+            return np.zeros(n, dtype=bool)
+
+        col = np.asarray(columns[condition.field])
+        op = condition.operator
+        value = condition.value
+
+        if op == "=":
+            return np.asarray(col == value, dtype=bool)
+        if op == "!=":
+            return np.asarray(col != value, dtype=bool)
+        if op in _COMPARISONS:
+            compare = getattr(np, _COMPARISONS[op])
+            return self._non_null(col, lambda c: compare(c, value))
+        if op == "BETWEEN":
+            high = condition.value2
+            return self._non_null(col, lambda c: (c >= value) & (c <= high))
+        if op in ("IN", "NOT IN"):
+            if not value:
+                return np.full(n, op == "NOT IN", dtype=bool)
+            found = self._isin(col, value)
+            return ~found if op == "NOT IN" else found
+        if op == "LIKE":
+            pattern = str(value).replace("%", ".*").replace("_", ".")
+            search = re.compile(pattern, re.IGNORECASE).search
+            return np.fromiter(
+                (isinstance(v, str) and search(v) is not None for v in col.tolist()),
+                dtype=bool, count=n
+            )
+        return np.zeros(n, dtype=bool)
+
+    def _non_null(self, col: "np.ndarray", compare: Any) -> "np.ndarray":
+        """Apply compare, treating None entries of object columns as no match"""
+        if col.dtype != object:
+            return np.asarray(compare(col), dtype=bool)
+        present = np.asarray(col != None, dtype=bool)  # noqa: E711 - elementwise
+        result = np.zeros(len(col), dtype=bool)
+        if present.any():
+            result[present] = np.asarray(compare(col[present]), dtype=bool)
+        return result
+
+    def _isin(self, col: "np.ndarray", values: Any) -> "np.ndarray":
+        """Membership test; falls back to Python sets for mixed/object data"""
+        numeric = col.dtype.kind in "biuf"
+        if numeric and all(isinstance(v, (int, float)) for v in values):
+            return np.isin(col, list(values))
+        if col.dtype.kind == "U" and all(isinstance(v, str) for v in values):
+            return np.isin(col, list(values))
+        try:
+            members = frozenset(values)
+            return np.fromiter((v in members for v in col.tolist()),
+                               dtype=bool, count=len(col))
+        except TypeError:
+            return np.fromiter((v in values for v in col.tolist()),
+                               dtype=bool, count=len(col))
+
+    def _order(self, columns: Mapping[str, Any], indices: "np.ndarray",
+               key: OrderKey, k: Any) -> "np.ndarray":
+        """Stable sort of selected indices on one key, with partition-based top-K.
+
+        None entries of object columns are set aside with a mask and placed
+        last (first with NULLS FIRST), as the row engine sorts them.
+        """
+        if key.field not in columns or len(indices) == 0:
+            return indices  # Missing sort column: every key ties, order kept
+
+        keys = np.asarray(columns[key.field])[indices]
+        nulls = None
+        if keys.dtype == object:
+            is_null = np.asarray(keys == None, dtype=bool)  # noqa: E711 - elementwise
+            if is_null.any():
+                nulls = indices[is_null]
+                indices, keys = indices[~is_null], keys[~is_null]
+        try:
+            ordered = self._sort(indices, keys, key.direction == SortOrder.DESC, k)
+        except TypeError:
+            raise ATONQueryError(
+                f"Column '{key.field}' mixes types the columnar backend cannot order"
+            ) from None
+        if nulls is None:
+            return ordered
+        return np.concatenate([nulls, ordered] if key.nulls_first else [ordered, nulls])
+
+    def _sort(self, indices: "np.ndarray", keys: "np.ndarray", descending: bool,
+              k: Any) -> "np.ndarray":
+        """Stable sort of indices by their (non-null) keys"""
+        if k is not None and k < len(indices):
+            # Keep every row strictly inside the top-K plus the earliest
+            # ties at the boundary, exactly like a stable full sort would.
+            if descending:
+                kth = np.partition(keys, len(keys) - k)[len(keys) - k]
+                inside = keys > kth
+            else:
+                kth = np.partition(keys, k - 1)[k - 1]
+                inside = keys < kth
+            ties = np.flatnonzero(keys == kth)[:k - int(inside.sum())]
+            chosen = np.sort(np.concatenate([np.flatnonzero(inside), ties]))
+            indices, keys = indices[chosen], keys[chosen]
+
+        if descending:
+            # Stable descending: sort the reversed keys, then map back, so
+            # equal keys keep their original relative order
+            order = np.argsort(keys[::-1], kind="stable")[::-1]
+            order = len(keys) - 1 - order
+        else:
+            order = np.argsort(keys, kind="stable")
+        return indices[order]
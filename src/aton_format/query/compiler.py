@@ -0,0 +1,345 @@
+"""
+ATON Format - Query Compiler
+
+Turns WHERE expression trees into plain Python closures so records are
+filtered without walking the AST (and re-dispatching on operator strings)
+for every row. Compiled predicates follow ``QueryCondition.evaluate`` and
+``QueryExpression.evaluate`` semantics exactly.
+"""
+
+import operator
+import re
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..core.types import ParsedQuery, QueryCondition, QueryExpression, QueryParameter
+from ..exceptions import ATONQueryError
+from .statistics import ORDERED_OPERATORS, TableStats, reorder
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+# Prepared predicate: (bound leaf predicates, record) -> bool
+Template = Callable[[Sequence[Predicate], Dict[str, Any]], bool]
+
+_MISSING = object()
+
+_COMPARISONS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+def _always_false(record: Dict[str, Any]) -> bool:
+    return False
+
+
+def compile_condition(condition: QueryCondition) -> Predicate:
+    """Compile a single condition into a predicate"""
+    field = condition.field
+    op = condition.operator
+    value = condition.value
+
+    if op == "=":
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field, _MISSING)
+            return v is not _MISSING and v == value
+    elif op == "!=":
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field, _MISSING)
+            return v is not _MISSING and v != value
+    elif op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field)
+            return v is not None and compare(v, value)
+    elif op == "LIKE":
+        pattern = str(value).replace("%", ".*").replace("_", ".")
+        try:
+            search = re.compile(pattern, re.IGNORECASE).search
+        except re.error:
+            return condition.evaluate
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field)
+            return isinstance(v, str) and search(v) is not None
+    elif op in ("IN", "NOT IN"):
+        if not value:
+            if op == "IN":
+                return _always_false
+            return lambda record: field in record
+        members = value
+        if isinstance(value, (list, tuple, set)):
+            try:
+                members = frozenset(value)
+            except TypeError:
+                pass
+        negate = op == "NOT IN"
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field, _MISSING)
+            if v is _MISSING:
+                return False
+            try:
+                found = v in members
+            except TypeError:
+                found = v in value
+            return found != negate
+    elif op == "BETWEEN":
+        low, high = value, condition.value2
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            v = record.get(field)
+            return v is not None and low <= v <= high
+    else:
+        return _always_false
+
+    return predicate
+
+
+def compile_expression(expression: Any) -> Predicate:
+    """Compile a condition or expression tree into a predicate"""
+    if isinstance(expression, QueryCondition):
+        return compile_condition(expression)
+    if not isinstance(expression, QueryExpression):
+        return _always_false
+
+    children = [compile_expression(c) for c in expression.conditions]
+
+    if expression.operator == "AND":
+        if len(children) == 1:
+            return children[0]
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            for child in children:
+                if not child(record):
+                    return False
+            return True
+    elif expression.operator == "OR":
+        if len(children) == 1:
+            return children[0]
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            for child in children:
+                if child(record):
+                    return True
+            return False
+    elif expression.operator == "NOT":
+        inner = children[0]
+
+        def predicate(record: Dict[str, Any]) -> bool:
+            return not inner(record)
+    else:
+        return children[0]
+
+    return predicate
+
+
+def _has_ordered(expression: Any) -> bool:
+    """Whether a WHERE tree has a comparison that raises on mixed types"""
+    if isinstance(expression, QueryExpression):
+        return any(_has_ordered(c) for c in expression.conditions)
+    return isinstance(expression, QueryCondition) and expression.operator in ORDERED_OPERATORS
+
+
+def _reordered(plan: Any, written: Any) -> bool:
+    """Whether a plan may evaluate an ordered comparison ahead of its guard"""
+    return plan != written and _has_ordered(written)
+
+
+def _written_order(predicate: Predicate, fallback: Predicate) -> Predicate:
+    """Predicate that re-evaluates a record in written order on TypeError"""
+    def guarded(record: Dict[str, Any]) -> bool:
+        try:
+            return predicate(record)
+        except TypeError:
+            return fallback(record)
+    return guarded
+
+
+def compile_plan(plan: Any, written: Any) -> Predicate:
+    """Compile a reordered WHERE plan that keeps the written order's errors.
+
+    Statistics are sampled, so a value type outside the sample can reach a
+    comparison the plan moved ahead of the condition guarding it
+    (``kind = 'n' AND v > 1``). Such records are evaluated again in written
+    order, which raises only where the query as written would.
+    """
+    predicate = compile_expression(plan)
+    if not _reordered(plan, written):
+        return predicate
+    return _written_order(predicate, compile_expression(written))
+
+
+def _has_parameter(condition: QueryCondition) -> bool:
+    values = condition.value if isinstance(condition.value, tuple) else (condition.value,)
+    return any(isinstance(v, QueryParameter) for v in values + (condition.value2,))
+
+
+def compile_template(expression: Any, slots: List[QueryCondition]) -> Template:
+    """Compile a WHERE tree with ? placeholders into a template predicate.
+
+    Conditions holding placeholders are appended to ``slots``; the template
+    calls ``leaves[i]`` for slot ``i``, so binding only has to compile those
+    leaves with their values while the tree itself is compiled once.
+    """
+    if isinstance(expression, QueryCondition):
+        if _has_parameter(expression):
+            slot = len(slots)
+            slots.append(expression)
+
+            def template(leaves: Sequence[Predicate], record: Dict[str, Any]) -> bool:
+                return leaves[slot](record)
+        else:
+            fixed = compile_condition(expression)
+
+            def template(leaves: Sequence[Predicate], record: Dict[str, Any]) -> bool:
+                return fixed(record)
+        return template
+    if not isinstance(expression, QueryExpression):
+        return lambda leaves, record: False
+
+    children = [compile_template(c, slots) for c in expression.conditions]
+
+    if expression.operator in ("AND", "OR") and len(children) == 1:
+        return children[0]
+    if expression.operator == "AND":
+        def template(leaves: Sequence[Predicate], record: Dict[str, Any]) -> bool:
+            for child in children:
+                if not child(leaves, record):
+                    return False
+            return True
+    elif expression.operator == "OR":
+        def template(leaves: Sequence[Predicate], record: Dict[str, Any]) -> bool:
+            for child in children:
+                if child(leaves, record):
+                    return True
+            return False
+    elif expression.operator == "NOT":
+        inner = children[0]
+
+        def template(leaves: Sequence[Predicate], record: Dict[str, Any]) -> bool:
+            return not inner(leaves, record)
+    else:
+        return children[0]
+
+    return template
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    """Immutable parsed query plus its compiled WHERE predicate.
+
+    ``plan`` is the WHERE tree in evaluation order: AND/OR children are
+    reordered by estimated cost and selectivity when table statistics are
+    available, otherwise it is the tree as written.
+    """
+    query: ParsedQuery
+    predicate: Optional[Predicate] = None
+    plan: Optional[Any] = None
+    stats: Optional[TableStats] = None
+
+    @classmethod
+    def from_query(cls, query: ParsedQuery,
+                   stats: Optional[TableStats] = None) -> "CompiledQuery":
+        """Compile the WHERE clause of a parsed query"""
+        predicate = plan = None
+        if query.where_expression:
+            plan = query.where_expression
+            if stats is not None:
+                plan = reorder(plan, stats)
+            if not query.parameter_count:
+                predicate = compile_plan(plan, query.where_expression)
+        return cls(query=query, predicate=predicate, plan=plan, stats=stats)
+
+
+def _bound(value: Any, params: Sequence[Any]) -> Any:
+    return params[value.index] if isinstance(value, QueryParameter) else value
+
+
+def bind_parameters(expression: Any, params: Sequence[Any]) -> Any:
+    """Copy of a WHERE tree with ? placeholders replaced by params"""
+    if isinstance(expression, QueryExpression):
+        return QueryExpression(
+            conditions=[bind_parameters(c, params) for c in expression.conditions],
+            operator=expression.operator,
+        )
+    if not isinstance(expression, QueryCondition):
+        return expression
+
+    value = expression.value
+    if isinstance(value, QueryParameter) and expression.operator in ("IN", "NOT IN"):
+        value = params[value.index]
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise ATONQueryError(
+                f"Parameter {expression.value.index + 1} for IN must be a list, tuple or set"
+            )
+        value = tuple(value)
+    elif isinstance(value, tuple):
+        value = tuple(_bound(v, params) for v in value)
+    else:
+        value = _bound(value, params)
+    return replace(expression, value=value, value2=_bound(expression.value2, params))
+
+
+@dataclass(frozen=True)
+class PreparedQuery:
+    """Parsed query template with ``?`` placeholders.
+
+    The WHERE plan is ordered and compiled once, from estimates that do not
+    depend on the values; bind() compiles only the conditions holding
+    placeholders, so the query text is never tokenized or parsed again and
+    values need no quoting or escaping.
+    """
+    query: ParsedQuery
+    stats: Optional[TableStats] = None
+    plan: Optional[Any] = None
+    _template: Optional[Template] = field(init=False, repr=False, compare=False)
+    _slots: List[QueryCondition] = field(init=False, repr=False, compare=False)
+    # Written-order template and its slots' positions in _slots (see compile_plan)
+    _fallback: Optional[Template] = field(init=False, repr=False, compare=False)
+    _fallback_slots: List[int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        plan = self.plan if self.plan is not None else self.query.where_expression
+        slots: List[QueryCondition] = []
+        template = compile_template(plan, slots) if plan is not None else None
+        written = self.query.where_expression
+        fallback = None
+        written_slots: List[QueryCondition] = []
+        if template is not None and _reordered(plan, written):
+            fallback = compile_template(written, written_slots)
+        # Frozen, so set through object
+        object.__setattr__(self, "plan", plan)
+        object.__setattr__(self, "_template", template)
+        object.__setattr__(self, "_slots", slots)
+        object.__setattr__(self, "_fallback", fallback)
+        object.__setattr__(self, "_fallback_slots", [slots.index(c) for c in written_slots])
+
+    @property
+    def parameter_count(self) -> int:
+        """Number of ? placeholders to bind"""
+        return self.query.parameter_count
+
+    def bind(self, *params: Any) -> CompiledQuery:
+        """Bind positional parameter values, returning an executable plan"""
+        if len(params) != self.query.parameter_count:
+            raise ATONQueryError(
+                f"Expected {self.query.parameter_count} parameters, got {len(params)}"
+            )
+        query, plan = self.query, self.plan
+        predicate: Optional[Predicate] = None
+        if params:
+            query = replace(query, parameter_count=0,
+                            where_expression=bind_parameters(query.where_expression, params))
+            plan = bind_parameters(plan, params)
+        if self._template is not None:
+            leaves = [compile_condition(bind_parameters(c, params)) for c in self._slots]
+            predicate = partial(self._template, leaves)
+            if self._fallback is not None:
+                written = partial(self._fallback, [leaves[i] for i in self._fallback_slots])
+                predicate = _written_order(predicate, written)
+        return CompiledQuery(query=query, predicate=predicate, plan=plan, stats=self.stats)
@@ -2,54 +2,418 @@
 ATON Format - Query Engine
 """
 
-from typing import Any, Dict, List
+from collections import abc
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
 from .parser import QueryParser
-from ..core.types import SortOrder, ParsedQuery
+from .cache import LRUCache, normalize_query, query_key
+from .aggregates import HashAggregator
+from .compiler import CompiledQuery, PreparedQuery
+from .index import INDEX_TYPES, plan_candidates
+from .join import execute_joins
+from .ordering import sort_rows, top_k
+from .parallel import PARTITION_SIZE, ParallelExecutor
+from .statistics import TableStats, collect_statistics, explain_expression
+from ..core.types import ParsedQuery
 from ..exceptions import ATONQueryError
 
+# Heap-based top-K is used when the input has at least TOPK_RATIO times
+# LIMIT+OFFSET rows; for larger prefixes a full C timsort is faster.
+TOPK_RATIO = 20
+
+# Statistics of a registered table are recollected once its row count has
+# drifted by more than this fraction since they were taken
+STATS_STALE_RATIO = 0.2
+
 
 class ATONQueryEngine:
     """Execute parsed queries on data"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 256, result_cache_size: int = 0):
         self.parser = QueryParser()
+        self.query_cache = LRUCache(maxsize=cache_size)
+        # Results over registered tables, keyed by query and table versions
+        # (disabled by default: in-place edits need touch() to invalidate)
+        self.result_cache = LRUCache(maxsize=result_cache_size) if result_cache_size else None
+        self.tables: Dict[str, List[Dict]] = {}
+        self.versions: Dict[str, int] = {}
+        self.indexes: Dict[str, Dict[str, List[Any]]] = {}
+        self.statistics: Dict[str, TableStats] = {}
+        self._columnar: Any = None  # ColumnarExecutor, imported on first use
+    
+    def register_table(self, name: str, records: List[Dict]) -> None:
+        """Register an in-memory table (indexes on it are rebuilt)"""
+        if not isinstance(records, list):
+            raise ATONQueryError(f"Table '{name}' must be a list of records")
+        self.tables[name] = records
+        self.touch(name)
+        self.statistics.pop(name, None)
+        for field_indexes in self.indexes.get(name, {}).values():
+            for i, index in enumerate(field_indexes):
+                field_indexes[i] = self._build_index(records, index.field, index.kind)
+    
+    def append(self, name: str, records: List[Dict]) -> None:
+        """Append records to a registered table, maintaining its indexes"""
+        table = self._registered(name)
+        table.extend(records)
+        self.touch(name)
+        for field_indexes in self.indexes.get(name, {}).values():
+            for index in field_indexes:
+                index.catch_up(table)
+    
+    def touch(self, name: str) -> int:
+        """Bump a table's version, invalidating cached results that read it.
+        
+        register_table() and append() do this; call it after editing a
+        registered table's records in place.
+        """
+        self.versions[name] = self.versions.get(name, 0) + 1
+        return self.versions[name]
+    
+    def create_index(self, table: str, field: str, kind: str = "hash") -> Any:
+        """Create a hash or sorted index on a registered table's field"""
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Invalid index kind: {kind}")
+        records = self._registered(table)
+        field_indexes = self.indexes.setdefault(table, {}).setdefault(field, [])
+        for index in field_indexes:
+            if index.kind == kind:
+                return index
+        index = self._build_index(records, field, kind)
+        field_indexes.append(index)
+        return index
+    
+    def drop_index(self, table: str, field: str, kind: Optional[str] = None) -> None:
+        """Drop indexes on a field (all kinds unless kind is given)"""
+        field_indexes = self.indexes.get(table, {}).get(field, [])
+        field_indexes[:] = [i for i in field_indexes if kind is not None and i.kind != kind]
+    
+    def analyze(self, table: str, records: Optional[List[Dict]] = None) -> TableStats:
+        """Collect column statistics for a table (registered unless records given)"""
+        if records is None:
+            records = self._registered(table)
+        stats = collect_statistics(records)
+        self.statistics[table] = stats
+        return stats
     
     def parse(self, query_string: str) -> ParsedQuery:
         """Parse query string"""
-        return self.parser.parse(query_string)
+        return self.compile(query_string).query
     
-    def execute(self, data: Dict[str, List[Dict]], query: ParsedQuery) -> List[Dict]:
-        """Execute parsed query on data"""
+    def compile(self, query_string: str) -> CompiledQuery:
+        """Parse and compile query string, reusing cached plans"""
+        key = normalize_query(query_string)
+        compiled: CompiledQuery = self.query_cache.get_or_create(
+            key, lambda: self._plan(self.parser.parse(key))
+        )
+        # Re-plan cached queries whose table statistics have been refreshed
+        stats = self._query_stats(compiled.query)
+        if stats is not compiled.stats:
+            compiled = CompiledQuery.from_query(compiled.query, stats)
+            self.query_cache.put(key, compiled)
+        return compiled
+    
+    def prepare(self, query_string: str) -> PreparedQuery:
+        """Parse a query with ? placeholders once for repeated execution"""
+        compiled = self.compile(query_string)
+        return PreparedQuery(query=compiled.query, stats=compiled.stats, plan=compiled.plan)
+    
+    def explain(self, query: Union[str, ParsedQuery, CompiledQuery]) -> str:
+        """Describe how a query would be executed.
+        
+        Shows the access path, the WHERE conditions in the order they will
+        be evaluated with their estimated selectivity and per-row cost, and
+        the ORDER BY / LIMIT strategy.
+        """
+        if isinstance(query, str):
+            text = query.strip()
+            if text[:8].upper() == "EXPLAIN ":
+                text = text[8:]
+            query = self.compile(text)
+        elif not isinstance(query, CompiledQuery):
+            query = self._plan(query)
+        compiled, query = query, query.query
+        stats = compiled.stats
+        
+        lines = [f"Query on {query.table}"]
+        records = self.tables.get(query.table)
+        if records is not None:
+            lines.append(f"  Rows: {len(records)}")
+        if stats is not None:
+            lines.append(f"  Statistics: {stats.sample_size} of {stats.row_count} rows sampled")
+        for join in query.joins or []:
+            lines.append(f"  {join.kind} hash join {join.table} "
+                         f"ON {join.left_field} = {join.right_field}")
+        
+        if compiled.plan is not None:
+            positions = None
+            if records is not None and not query.joins:
+                positions = self._index_candidates(query)
+            if positions is not None:
+                lines.append(f"  Access: index lookup ({len(positions)} candidate rows)")
+            else:
+                lines.append("  Access: full scan")
+            lines.append("  Filter:")
+            lines.extend(explain_expression(compiled.plan, stats, "    "))
+        else:
+            lines.append("  Access: full scan")
+        
+        if query.is_aggregate:
+            keys = ", ".join(query.group_by or []) or "(all rows)"
+            lines.append(f"  Aggregate: hash group by {keys}")
+        if query.sort_keys:
+            k = query.offset + query.limit if query.limit else None
+            size = len(records) if records is not None else None
+            strategy = "sort"
+            if k is not None and (size is None or k * TOPK_RATIO <= size):
+                strategy = f"top-K heap (k={k})"
+            keys = ", ".join(
+                f"{key.field} {key.direction.value}" + (" NULLS FIRST" if key.nulls_first else "")
+                for key in query.sort_keys
+            )
+            lines.append(f"  Order: {keys} [{strategy}]")
+        if query.offset or query.limit:
+            lines.append(f"  Limit: {query.limit or 'none'} offset {query.offset}")
+        return "\n".join(lines)
+    
+    def execute(self, data: Optional[Dict[str, List[Dict]]],
+                query: Union[ParsedQuery, CompiledQuery, PreparedQuery],
+                params: Sequence[Any] = ()) -> List[Dict]:
+        """Execute parsed query on data (or on registered tables if data is None).
+        
+        With a result cache, results over registered tables are reused
+        until one of the tables they read changes version. Each call gets
+        fresh row dicts, but nested lists and dicts inside cached rows are
+        shared between calls and must be treated as read-only.
+        """
+        compiled = self._compiled(query, params)
+        key = self.result_key(data, compiled)
+        if key is None or self.result_cache is None:
+            return list(self.execute_iter(data, compiled))
+        rows = self.result_cache.get_or_create(
+            key, lambda: tuple(dict(row) for row in self.execute_iter(data, compiled))
+        )
+        return [dict(row) for row in rows]
+    
+    def result_key(self, data: Any, query: Union[ParsedQuery, CompiledQuery]) -> Optional[tuple]:
+        """Result cache key for query over data, or None if it can't be cached.
+        
+        Only queries that read registered tables (data is None, or holds the
+        registered lists themselves) are cacheable. The key combines the
+        query with each table's version and length, so appends made directly
+        to a registered list are noticed too. Queries with unhashable bound
+        values are not cached.
+        """
+        if self.result_cache is None:
+            return None
+        if isinstance(query, CompiledQuery):
+            query = query.query
+        names = [query.table] + [join.table for join in query.joins or []]
+        for name in names:
+            table = self.tables.get(name)
+            if table is None:
+                return None
+            if data is not None:
+                source = data.get(name) if isinstance(data, abc.Mapping) else (
+                    data if name == query.table else None
+                )
+                if source is not table:
+                    return None
+        try:
+            query_id = query_key(query)
+        except TypeError:
+            return None
+        versions = tuple((name, self.versions[name], len(self.tables[name])) for name in names)
+        return (query_id, versions)
+    
+    def execute_iter(self, data: Union[None, Mapping[str, Iterable[Dict]], Iterable[Dict]],
+                     query: Union[ParsedQuery, CompiledQuery, PreparedQuery],
+                     params: Sequence[Any] = ()) -> Iterator[Dict]:
+        """Execute query lazily, yielding result rows.
+        
+        data may be a mapping of tables (any iterable of records per table),
+        a bare iterable of records for query.table, or None for registered
+        tables. Without ORDER BY, filter -> offset -> limit -> projection are
+        chained as iterators and the source stops being read after LIMIT rows.
+        A PreparedQuery is bound to params first.
+        """
+        query = self._compiled(query, params)
+        predicate = query.predicate
+        query = query.query
+        
         # Get table
+        if data is None:
+            data = self.tables
+        records = self._records(data, query)
+        
+        # JOINs produce the rows the rest of the pipeline works on
+        hidden = None
+        if query.joins:
+            if not isinstance(data, abc.Mapping):
+                raise ATONQueryError("JOIN queries need a mapping of tables")
+            records, hidden = execute_joins(data, query, records)
+        
+        # Index lookup narrows the rows the WHERE predicate has to visit
+        table = self.tables.get(query.table)
+        if predicate is not None and table is not None and records is table:
+            positions = self._index_candidates(query)
+            if positions is not None:
+                records = [table[i] for i in positions]
+        
+        # WHERE filtering
+        rows: Iterable[Dict] = records
+        if predicate is not None:
+            rows = filter(predicate, rows)
+        
+        # GROUP BY / aggregates (single-pass hash aggregation)
+        if query.is_aggregate:
+            aggregator = HashAggregator(query.group_by or [], query.aggregates or [],
+                                        query.select_fields)
+            rows = aggregator.consume(rows).results()
+        
+        # ORDER BY (top-K selection when only a small prefix is needed)
+        sort_keys = query.sort_keys
+        if sort_keys:
+            k = query.offset + query.limit if query.limit else None
+            # Upper bound on rows reaching the sort: the materialized rows,
+            # or the unfiltered source when rows are still a lazy filter
+            sized = rows if isinstance(rows, abc.Sized) else records
+            size = len(sized) if isinstance(sized, abc.Sized) else None
+            if k is not None and (size is None or k * TOPK_RATIO <= size):
+                rows = top_k(rows, sort_keys, k)
+            else:
+                rows = sort_rows(rows, sort_keys)
+        
+        # OFFSET / LIMIT
+        if query.offset or query.limit:
+            stop = query.offset + query.limit if query.limit else None
+            rows = islice(rows, query.offset, stop)
+        
+        # SELECT projection (only for the rows actually returned)
+        if query.select_fields and not query.is_aggregate:
+            fields = query.select_fields
+            rows = ({field: record.get(field) for field in fields} for record in rows)
+        elif hidden:
+            rows = ({k: v for k, v in record.items() if k not in hidden} for record in rows)
+        
+        return iter(rows)
+    
+    def execute_parallel(self, data: Optional[Mapping[str, Iterable[Dict]]],
+                         query: Union[ParsedQuery, CompiledQuery, PreparedQuery],
+                         params: Sequence[Any] = (), workers: Optional[int] = None,
+                         backend: str = "auto",
+                         partition_size: int = PARTITION_SIZE) -> List[Dict]:
+        """Execute query over partitions of the table on a worker pool.
+        
+        Returns the same rows as execute(). backend is "process", "thread"
+        or "auto" (threads on free-threaded Python, processes otherwise).
+        Use ParallelExecutor directly to keep the pool across queries.
+        """
+        with ParallelExecutor(self, workers, backend, partition_size) as executor:
+            return executor.execute(data, query, params)
+    
+    def execute_columnar(self, data: Mapping[str, Mapping[str, Any]],
+                         query: Union[ParsedQuery, CompiledQuery, PreparedQuery],
+                         materialize: bool = True, params: Sequence[Any] = ()) -> Any:
+        """Execute query over columnar tables ({table: {column: ndarray}}).
+        
+        Returns result records, or the result row index array when
+        materialize is False. Requires NumPy.
+        """
+        if isinstance(query, PreparedQuery):
+            query = query.bind(*params)
+        if isinstance(query, CompiledQuery):
+            query = query.query
+        if query.parameter_count:
+            raise ATONQueryError(
+                "Query has unbound ? parameters; use prepare() and bind values"
+            )
         if query.table not in data:
             raise ATONQueryError(f"Table '{query.table}' not found")
+        if query.is_aggregate or query.joins:
+            raise ATONQueryError(
+                "Aggregate and JOIN queries are not supported by the columnar backend"
+            )
         
-        records = data[query.table]
+        if self._columnar is None:
+            from .columnar import ColumnarExecutor
+            self._columnar = ColumnarExecutor()
         
-        # WHERE filtering
-        if query.where_expression:
-            records = [r for r in records if query.where_expression.evaluate(r)]
-        
-        # SELECT projection
-        if query.select_fields:
-            records = [
-                {field: record.get(field) for field in query.select_fields}
-                for record in records
-            ]
-        
-        # ORDER BY
-        if query.order_by:
-            reverse = query.order_direction == SortOrder.DESC
-            records = sorted(records, 
-                           key=lambda x: x.get(query.order_by, 0), 
-                           reverse=reverse)
-        
-        # OFFSET
-        if query.offset:
-            records = records[query.offset:]
-        
-        # LIMIT
-        if query.limit:
-            records = records[:query.limit]
-        
-        return records
+        columns = data[query.table]
+        indices = self._columnar.select_indices(columns, query)
+        if not materialize:
+            return indices
+        return self._columnar.materialize(columns, indices, query.select_fields)
+    
+    def _registered(self, name: str) -> List[Dict]:
+        """Get a registered table or raise"""
+        if name not in self.tables:
+            raise ATONQueryError(f"Table '{name}' is not registered")
+        return self.tables[name]
+    
+    def _compiled(self, query: Union[ParsedQuery, CompiledQuery, PreparedQuery],
+                  params: Sequence[Any] = ()) -> CompiledQuery:
+        """Executable plan for any query form, binding prepared queries"""
+        if isinstance(query, PreparedQuery):
+            query = query.bind(*params)
+        elif not isinstance(query, CompiledQuery):
+            query = self._plan(query)
+        if query.query.parameter_count:
+            raise ATONQueryError(
+                "Query has unbound ? parameters; use prepare() and bind values"
+            )
+        return query
+    
+    def _records(self, data: Any, query: ParsedQuery) -> Any:
+        """The query's table from a mapping of tables, or data itself"""
+        if isinstance(data, abc.Mapping):
+            if query.table not in data:
+                raise ATONQueryError(f"Table '{query.table}' not found")
+            return data[query.table]
+        return data
+    
+    def _plan(self, query: ParsedQuery) -> CompiledQuery:
+        """Compile a parsed query using the statistics of its table"""
+        return CompiledQuery.from_query(query, self._query_stats(query))
+    
+    def _query_stats(self, query: ParsedQuery) -> Optional[TableStats]:
+        """Up-to-date statistics for a query's table, if it has any.
+        
+        Registered tables are analyzed on first use and again once they have
+        grown or shrunk noticeably. JOIN queries filter joined rows, which
+        the base table's statistics do not describe.
+        """
+        if query.where_expression is None or query.joins:
+            return None
+        name = query.table
+        stats = self.statistics.get(name)
+        records = self.tables.get(name)
+        if records is not None:
+            if stats is None or abs(len(records) - stats.row_count) > (
+                    STATS_STALE_RATIO * max(stats.row_count, 1)):
+                stats = self.analyze(name)
+        return stats
+    
+    def _build_index(self, records: List[Dict], field: str, kind: str) -> Any:
+        """Build a fresh index over records"""
+        index = INDEX_TYPES[kind](field)
+        index.add(records)
+        return index
+    
+    def _index_candidates(self, query: ParsedQuery) -> Optional[List[int]]:
+        """Candidate row positions from indexes, or None to fall back to a scan"""
+        table_indexes = self.indexes.get(query.table)
+        if not table_indexes:
+            return None
+        
+        records = self.tables[query.table]
+        for field_indexes in table_indexes.values():
+            for i, index in enumerate(field_indexes):
+                # Catch up with rows appended to the list directly, and
+                # rebuild if rows were removed behind the engine's back
+                if index.covered > len(records):
+                    field_indexes[i] = self._build_index(records, index.field, index.kind)
+                else:
+                    index.catch_up(records)
+        
+        return plan_candidates(query.where_expression, table_indexes)
@@ -0,0 +1,214 @@
+"""
+ATON Format - Secondary Indexes
+
+In-memory hash and sorted indexes over registered tables. Indexes map
+field values to row positions; the planner uses them to narrow the rows a
+WHERE clause has to look at, and the full predicate is still applied to the
+candidates, so results are identical to a full scan.
+
+Each index has a lock: appends and the lazy catch-up with rows added to
+the registered list directly run under it, so concurrent queries never
+index the same rows twice.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
+
+from ..core.types import QueryCondition, QueryExpression
+
+_MISSING = object()
+
+
+class HashIndex:
+    """Value -> row positions map for =, IN lookups"""
+
+    kind = "hash"
+
+    def __init__(self, field: str):
+        self.field = field
+        self.buckets: Dict[Any, List[int]] = {}
+        self.covered = 0
+        self.valid = True
+        self.lock = threading.Lock()
+
+    def catch_up(self, records: Sequence[Dict[str, Any]]) -> None:
+        """Index the rows appended to records since they were last covered"""
+        with self.lock:
+            if self.covered < len(records):
+                self.add(records, self.covered)
+
+    def add(self, records: Sequence[Dict[str, Any]], start: int = 0) -> None:
+        """Index records[start:], whose positions are start, start+1, ..."""
+        field = self.field
+        buckets = self.buckets
+        end = len(records)
+        for pos in range(start, end):
+            value = records[pos].get(field, _MISSING)
+            if value is _MISSING:
+                continue
+            try:
+                bucket = buckets.get(value)
+            except TypeError:  # Unhashable values can never equal a literal
+                continue
+            if bucket is None:
+                buckets[value] = [pos]
+            else:
+                bucket.append(pos)
+        self.covered = end
+
+    def candidates(self, condition: QueryCondition) -> Optional[List[int]]:
+        """Row positions that may satisfy condition, or None if unsupported"""
+        try:
+            if condition.operator == "=":
+                return self.buckets.get(condition.value, [])
+            if condition.operator == "IN" and condition.value:
+                hits = [self.buckets.get(v, ()) for v in condition.value]
+                return sorted(set(chain.from_iterable(hits)))
+        except TypeError:
+            return None
+        return None
+
+
+class SortedIndex:
+    """Sorted (value, position) arrays for =, IN, range and BETWEEN lookups"""
+
+    kind = "sorted"
+
+    def __init__(self, field: str):
+        self.field = field
+        self.keys: List[Any] = []
+        self.positions: List[int] = []
+        self.covered = 0
+        self.valid = True
+        self.lock = threading.Lock()
+
+    def catch_up(self, records: Sequence[Dict[str, Any]]) -> None:
+        """Index the rows appended to records since they were last covered"""
+        with self.lock:
+            if self.covered < len(records):
+                self.add(records, self.covered)
+
+    def add(self, records: Sequence[Dict[str, Any]], start: int = 0) -> None:
+        """Index records[start:], merging into the existing sorted arrays"""
+        field = self.field
+        end = self.covered = len(records)
+        if not self.valid:
+            return
+
+        batch = []
+        for pos in range(start, end):
+            value = records[pos].get(field)
+            # None never satisfies a range predicate and NaN compares false
+            # against everything, so neither can appear in a result.
+            if value is not None and value == value:
+                batch.append((value, pos))
+        if not batch:
+            return
+
+        try:
+            batch.sort(key=itemgetter(0))
+            if not self.keys or not batch[0][0] < self.keys[-1]:
+                self.keys.extend(v for v, _ in batch)
+                self.positions.extend(p for _, p in batch)
+            else:
+                merged = list(heapq.merge(zip(self.keys, self.positions), batch,
+                                          key=itemgetter(0)))
+                self.keys = [v for v, _ in merged]
+                self.positions = [p for _, p in merged]
+        except TypeError:
+            # Mixed, incomparable types: the index cannot answer range queries
+            self.valid = False
+            self.keys = []
+            self.positions = []
+
+    def candidates(self, condition: QueryCondition) -> Optional[List[int]]:
+        """Row positions that may satisfy condition, or None if unsupported"""
+        with self.lock:  # keys and positions are replaced together when merging
+            return self._candidates(condition, self.keys, self.positions)
+
+    def _candidates(self, condition: QueryCondition, keys: List[Any],
+                    positions: List[int]) -> Optional[List[int]]:
+        if not self.valid:
+            return None
+
+        op = condition.operator
+        value = condition.value
+        # NULLs are not indexed, so the index cannot find them
+        if value is None or (op == "IN" and value and None in value):
+            return None
+        try:
+            if op == "=":
+                lo, hi = bisect_left(keys, value), bisect_right(keys, value)
+            elif op == "<":
+                lo, hi = 0, bisect_left(keys, value)
+            elif op == "<=":
+                lo, hi = 0, bisect_right(keys, value)
+            elif op == ">":
+                lo, hi = bisect_right(keys, value), len(keys)
+            elif op == ">=":
+                lo, hi = bisect_left(keys, value), len(keys)
+            elif op == "BETWEEN":
+                lo, hi = bisect_left(keys, value), bisect_right(keys, condition.value2)
+            elif op == "IN" and value:
+                spans = [(bisect_left(keys, v), bisect_right(keys, v)) for v in value]
+                return sorted(set(chain.from_iterable(
+                    positions[a:b] for a, b in spans
+                )))
+            else:
+                return None
+        except TypeError:
+            return None
+
+        if hi <= lo:
+            return []
+        return sorted(positions[lo:hi])
+
+
+INDEX_TYPES: Dict[str, Union[Type[HashIndex], Type[SortedIndex]]] = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+}
+
+
+def plan_candidates(expression: Any,
+                    indexes: Dict[str, List[Any]]) -> Optional[List[int]]:
+    """Use field indexes to narrow a WHERE tree to candidate row positions.
+
+    Returns ascending positions that are a superset of the matching rows,
+    or None when the expression cannot be answered from indexes.
+    """
+    if isinstance(expression, QueryCondition):
+        best = None
+        for index in indexes.get(expression.field, ()):
+            found = index.candidates(expression)
+            if found is not None and (best is None or len(found) < len(best)):
+                best = found
+        return best
+
+    if not isinstance(expression, QueryExpression):
+        return None
+
+    if expression.operator == "AND":
+        best = None
+        for child in expression.conditions:
+            found = plan_candidates(child, indexes)
+            if found is not None and (best is None or len(found) < len(best)):
+                best = found
+        return best
+
+    if expression.operator == "OR":
+        parts = []
+        for child in expression.conditions:
+            found = plan_candidates(child, indexes)
+            if found is None:
+                return None
+            parts.append(found)
+        if len(parts) == 1:
+            return parts[0]
+        return sorted(set(chain.from_iterable(parts)))
+
+    return None
@@ -0,0 +1,212 @@
+"""
+ATON Format - Hash Joins
+
+Executes ``JOIN other ON a.x = other.y`` (or ``a.x -> other.y``) clauses as
+hash joins. Joined rows carry each referenced field under the name the
+query uses for it (``name`` or ``customers.name``), so the rest of the
+pipeline (WHERE, GROUP BY, ORDER BY, SELECT) runs on them unchanged.
+
+When the query has a SELECT list, only referenced fields are copied out of
+either input (projection pushdown); without one, every field is kept under
+its qualified ``table.field`` name.
+"""
+
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from ..core.types import ParsedQuery, QueryCondition, QueryExpression
+from ..exceptions import ATONQueryError
+
+# Records sampled per table to learn which table owns an unqualified field
+COLUMN_SAMPLE_SIZE = 100
+
+
+def referenced_fields(query: ParsedQuery) -> List[str]:
+    """Field names a query reads, as written, in first-use order"""
+    aliases = {a.alias for a in query.aggregates or []}
+    names: List[str] = []
+
+    def add(name: Any) -> None:
+        if name and name not in aliases and name not in names:
+            names.append(name)
+
+    for name in query.select_fields or []:
+        add(name)
+    for aggregate in query.aggregates or []:
+        add(aggregate.field)
+    for name in query.group_by or []:
+        add(name)
+    for key in query.sort_keys:
+        add(key.field)
+
+    stack = [query.where_expression]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, QueryCondition):
+            add(node.field)
+        elif isinstance(node, QueryExpression):
+            stack.extend(reversed(node.conditions))
+    return names
+
+
+def _sample_columns(records: Sequence[Dict[str, Any]]) -> Set[str]:
+    columns: Set[str] = set()
+    for record in islice(records, COLUMN_SAMPLE_SIZE):
+        columns.update(record)
+    return columns
+
+
+def _projector(table: str, pairs: List[Tuple[str, str]],
+               keep_all: bool) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Build a function copying (output key, column) pairs out of a record"""
+    if keep_all:
+        prefix = table + "."
+
+        def project(record: Dict[str, Any]) -> Dict[str, Any]:
+            row = {prefix + k: v for k, v in record.items()}
+            for out, column in pairs:
+                if column in record:
+                    row[out] = record[column]
+            return row
+    else:
+        def project(record: Dict[str, Any]) -> Dict[str, Any]:
+            return {out: record[column] for out, column in pairs if column in record}
+    return project
+
+
+def hash_join(left_rows: List[Dict[str, Any]], left_key: str,
+              right_records: Sequence[Dict[str, Any]], right_column: str,
+              project_right: Callable[[Dict[str, Any]], Dict[str, Any]],
+              kind: str = "INNER",
+              null_right: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Join rows on left_row[left_key] == right_record[right_column].
+
+    Output is left-major (right matches in their original order) whichever
+    side the hash table is built on. NULL and unhashable keys never match.
+    For LEFT joins, unmatched left rows are padded with null_right.
+    """
+    if kind == "INNER" and len(left_rows) < len(right_records):
+        # Build on the (smaller) left side, probe with the right records
+        buckets: Dict[Any, List[int]] = {}
+        for i, row in enumerate(left_rows):
+            key = row.get(left_key)
+            if key is None:
+                continue
+            try:
+                buckets.setdefault(key, []).append(i)
+            except TypeError:
+                continue
+
+        pairs: List[Tuple[int, Dict[str, Any]]] = []
+        for record in right_records:
+            key = record.get(right_column)
+            if key is None:
+                continue
+            try:
+                hits = buckets.get(key)
+            except TypeError:
+                continue
+            if hits:
+                projected = project_right(record)
+                pairs.extend((i, projected) for i in hits)
+        pairs.sort(key=itemgetter(0))  # Stable: keeps right order per left row
+        return [{**left_rows[i], **right} for i, right in pairs]
+
+    # Build on the right side, probe in left order
+    table: Dict[Any, List[Dict[str, Any]]] = {}
+    for record in right_records:
+        key = record.get(right_column)
+        if key is None:
+            continue
+        try:
+            bucket = table.setdefault(key, [])
+        except TypeError:
+            continue
+        bucket.append(project_right(record))
+
+    joined: List[Dict[str, Any]] = []
+    for row in left_rows:
+        key = row.get(left_key)
+        matches = None
+        if key is not None:
+            try:
+                matches = table.get(key)
+            except TypeError:
+                pass
+        if matches:
+            joined.extend({**row, **right} for right in matches)
+        elif kind == "LEFT":
+            joined.append({**row, **null_right} if null_right else row)
+    return joined
+
+
+def execute_joins(tables: Mapping[str, Any], query: ParsedQuery,
+                  base_records: Any) -> Tuple[List[Dict[str, Any]], Set[str]]:
+    """Join query.table with every JOIN clause.
+
+    Returns the joined rows and the set of helper keys that must be dropped
+    from the output (unqualified names added only for WHERE/ORDER BY when
+    the query has no SELECT list).
+    """
+    names = [query.table] + [j.table for j in query.joins or []]
+    if len(set(names)) != len(names):
+        raise ATONQueryError("A table can only appear once in a JOIN query")
+
+    sources: Dict[str, Sequence[Dict[str, Any]]] = {
+        query.table: base_records if isinstance(base_records, list) else list(base_records)
+    }
+    for join in query.joins or []:
+        if join.table not in tables:
+            raise ATONQueryError(f"Table '{join.table}' not found")
+        records = tables[join.table]
+        sources[join.table] = records if isinstance(records, list) else list(records)
+    columns = {name: _sample_columns(records) for name, records in sources.items()}
+
+    def resolve(ref: str) -> Tuple[str, str]:
+        table, _, column = ref.partition(".")
+        if column and table in sources:
+            return table, column
+        owners = [name for name in names if ref in columns[name]]
+        if len(owners) > 1:
+            raise ATONQueryError(f"Ambiguous field '{ref}', qualify it as table.{ref}")
+        return (owners[0] if owners else query.table), ref
+
+    keep_all = not query.select_fields and not query.is_aggregate
+    wanted: Dict[str, List[Tuple[str, str]]] = {name: [] for name in names}
+    refs = referenced_fields(query)
+    for ref in refs:
+        table, column = resolve(ref)
+        wanted[table].append((ref, column))
+
+    join_keys = []
+    joined = {query.table}
+    for join in query.joins or []:
+        left, right = resolve(join.left_field), resolve(join.right_field)
+        if right[0] != join.table:
+            left, right = right, left
+        if right[0] != join.table or left[0] not in joined:
+            raise ATONQueryError(
+                f"JOIN {join.table} must compare one of its fields with an earlier table"
+            )
+        left_key = f"{left[0]}.{left[1]}"
+        wanted[left[0]].append((left_key, left[1]))
+        join_keys.append((left_key, right[1]))
+        joined.add(join.table)
+
+    projectors = {
+        name: _projector(name, list(dict.fromkeys(pairs)), keep_all)
+        for name, pairs in wanted.items()
+    }
+
+    project_base = projectors[query.table]
+    rows = [project_base(record) for record in sources[query.table]]
+    for join, (left_key, right_column) in zip(query.joins or [], join_keys):
+        null_right = {out: None for out, _ in wanted[join.table]}
+        if keep_all:
+            null_right.update((f"{join.table}.{c}", None) for c in sorted(columns[join.table]))
+        rows = hash_join(rows, left_key, sources[join.table], right_column,
+                         projectors[join.table], join.kind, null_right)
+
+    hidden = {ref for ref in refs if "." not in ref} if keep_all else set()
+    return rows, hidden
@@ -0,0 +1,89 @@
+"""
+ATON Format - ORDER BY
+
+Multi-key sorting that never compares incompatible values. NULL and
+missing values sort together (last by default, or first with NULLS FIRST);
+numbers sort before strings, and strings before other types, so mixed
+columns order deterministically instead of raising TypeError.
+"""
+
+import heapq
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from ..core.types import OrderKey, SortOrder
+
+_NUMBER_TYPES = frozenset((int, float, bool))
+_UNORDERED_TYPES = (set, frozenset, dict)
+_DEFAULT_LT = getattr(object, "__lt__")  # Inherited by types without an ordering
+
+
+def _null_rank(key: OrderKey, reverse: bool) -> int:
+    """Rank that puts NULLs at the requested end after a (reversed) sort"""
+    return 0 if key.nulls_first != reverse else 2
+
+
+def normalize(value: Any, null_rank: int = 0) -> Tuple:
+    """Totally ordered sort key for any value.
+
+    Agrees with the values' own ordering wherever that is defined, so
+    sorting on raw values and on normalized keys gives the same result.
+    """
+    if value is None:
+        return (null_rank, 0, 0)
+    kind = type(value)
+    if kind in _NUMBER_TYPES:
+        return (1, 0, value)
+    if kind is str:
+        return (1, 1, value)
+    if isinstance(value, (list, tuple)):
+        return (1, 2, kind.__name__, tuple(normalize(v) for v in value))
+    if isinstance(value, _UNORDERED_TYPES) or kind.__lt__ is _DEFAULT_LT:
+        return (1, 2, kind.__name__, repr(value))
+    return (1, 2, kind.__name__, value)
+
+
+def sort_rows(rows: Iterable[Dict[str, Any]], keys: Sequence[OrderKey]) -> List[Dict[str, Any]]:
+    """Stable multi-key sort.
+
+    Applies one stable sort per key, from the last key to the first, so
+    each key can have its own direction. Columns whose values all compare
+    natively are sorted with a C-level itemgetter key; NULLs, missing
+    fields and mixed types fall back to normalized keys.
+    """
+    rows = list(rows)
+    for key in reversed(keys):
+        reverse = key.direction == SortOrder.DESC
+        try:
+            # sorted() leaves rows untouched if a comparison fails midway,
+            # preserving the order established by the previous passes
+            rows = sorted(rows, key=itemgetter(key.field), reverse=reverse)
+        except (KeyError, TypeError):
+            field, null_rank = key.field, _null_rank(key, reverse)
+            rows.sort(key=lambda row: normalize(row.get(field), null_rank), reverse=reverse)
+    return rows
+
+
+def row_key(keys: Sequence[OrderKey]) -> Callable[[Dict[str, Any]], Any]:
+    """Per-row sort key for keys that all share one direction"""
+    reverse = keys[0].direction == SortOrder.DESC
+    specs = [(key.field, _null_rank(key, reverse)) for key in keys]
+    if len(specs) == 1:
+        field, null_rank = specs[0]
+        return lambda row: normalize(row.get(field), null_rank)
+    return lambda row: tuple(normalize(row.get(f), r) for f, r in specs)
+
+
+def top_k(rows: Iterable[Dict[str, Any]], keys: Sequence[OrderKey],
+          k: int) -> List[Dict[str, Any]]:
+    """First k rows of sort_rows(rows, keys), reading rows in one pass.
+
+    Mixed directions cannot share one heap key, so they fall back to a
+    full sort.
+    """
+    directions = {key.direction for key in keys}
+    if len(directions) > 1:
+        return sort_rows(rows, keys)[:k]
+    select = heapq.nlargest if SortOrder.DESC in directions else heapq.nsmallest
+    # nsmallest/nlargest are equivalent to sorted(...)[:k], ties included
+    return select(k, rows, key=row_key(keys))
@@ -0,0 +1,156 @@
+"""
+ATON Format - Parallel Query Execution
+
+Opt-in partitioned execution for large in-memory tables. The table is cut
+into contiguous partitions; workers filter (and, with ORDER BY, sort and
+truncate to LIMIT) their partition, and the results are merged in partition
+order, so the output is identical to ``ATONQueryEngine.execute``.
+
+Workers are processes by default and threads on free-threaded CPython
+builds, where threads run predicates in parallel without pickling rows.
+"""
+
+import heapq
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import replace
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..core.types import OrderKey, SortOrder
+from .compiler import CompiledQuery, compile_plan
+from .ordering import row_key, sort_rows, top_k
+
+# Rows per partition; tables smaller than two partitions run serially
+PARTITION_SIZE = 50_000
+
+BACKENDS = ("auto", "process", "thread")
+
+
+def free_threaded() -> bool:
+    """Whether this interpreter runs without the GIL"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _scan_partition(where: Optional[Tuple[Any, Any]], sort_keys: Sequence[OrderKey],
+                    k: Optional[int], records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Filter one partition, then sort it and keep its first k rows.
+
+    Runs in worker processes, so it gets the (picklable) WHERE plan and
+    written tree and compiles them locally rather than receiving a closure.
+    """
+    rows = records
+    if where is not None:
+        rows = list(filter(compile_plan(*where), records))
+    if sort_keys:
+        if k is not None and k < len(rows):
+            return top_k(rows, sort_keys, k)
+        return sort_rows(rows, sort_keys)
+    return rows[:k] if k is not None else rows
+
+
+class ParallelExecutor:
+    """Execute queries over partitions of a table on a worker pool.
+
+    Use as a context manager (or call close()) to shut the pool down.
+    JOIN queries, and tables smaller than two partitions, run serially.
+    Aggregates run their WHERE filter in parallel and aggregate in order
+    in the calling thread, so floating-point sums match the serial path.
+    """
+
+    def __init__(self, engine: Any, workers: Optional[int] = None,
+                 backend: str = "auto", partition_size: int = PARTITION_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid parallel backend: {backend}")
+        if partition_size < 1:
+            raise ValueError("partition_size must be >= 1")
+        if backend == "auto":
+            backend = "thread" if free_threaded() else "process"
+
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.partition_size = partition_size
+        self._pool: Optional[Executor] = None
+
+    def __enter__(self) -> "ParallelExecutor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def execute(self, data: Any, query: Any, params: Sequence[Any] = ()) -> List[Dict]:
+        """Execute query like ATONQueryEngine.execute, partitioned across workers"""
+        engine = self.engine
+        serial: Callable[..., List[Dict]] = engine.execute
+        compiled = engine._compiled(query, params)
+        query = compiled.query
+        if query.joins:
+            return serial(data, compiled)
+
+        records = engine._records(engine.tables if data is None else data, query)
+        if not isinstance(records, list):
+            records = list(records)
+        size = self.partition_size
+        if self.workers < 2 or len(records) < 2 * size:
+            return serial(records, compiled)
+
+        partitions = [records[i:i + size] for i in range(0, len(records), size)]
+        where = (compiled.plan, query.where_expression) if compiled.plan is not None else None
+        # WHERE has run; the serial engine finishes the remaining clauses
+        rest = replace(query, where_expression=None)
+
+        if query.is_aggregate:
+            filtered = chain.from_iterable(self._scan(where, (), None, partitions))
+            return serial(filtered, CompiledQuery.from_query(rest))
+
+        k = query.offset + query.limit if query.limit else None
+        sort_keys = query.sort_keys
+        results = self._scan(where, sort_keys, k, partitions)
+        if not sort_keys:
+            rows: Any = chain.from_iterable(results)
+        elif len({key.direction for key in sort_keys}) == 1:
+            # k-way merge; heapq.merge keeps earlier partitions first on ties
+            rows = heapq.merge(*results, key=row_key(sort_keys),
+                               reverse=sort_keys[0].direction == SortOrder.DESC)
+        else:
+            rows = sort_rows(chain.from_iterable(results), sort_keys)
+        if k is not None:
+            rows = islice(rows, k)  # Stops pulling partitions once k rows are out
+
+        rest = replace(rest, order_by=None, order_keys=None)
+        return serial(list(rows), CompiledQuery.from_query(rest))
+
+    def _scan(self, where: Optional[Tuple[Any, Any]], sort_keys: Sequence[OrderKey],
+              k: Optional[int], partitions: List[List[Dict]]) -> Iterator[List[Dict]]:
+        """Partition results in partition order, keeping a bounded window in flight.
+
+        Partitions are only submitted as earlier results are consumed, so a
+        caller that stops iterating (LIMIT) leaves the rest unscanned.
+        """
+        if self._pool is None:
+            pool_type = ThreadPoolExecutor if self.backend == "thread" else ProcessPoolExecutor
+            self._pool = pool_type(max_workers=self.workers)
+
+        pending: deque = deque()
+        remaining = iter(partitions)
+        try:
+            for part in islice(remaining, 2 * self.workers):
+                pending.append(self._pool.submit(_scan_partition, where, sort_keys, k, part))
+            while pending:
+                result = pending.popleft().result()
+                for part in islice(remaining, 1):
+                    pending.append(self._pool.submit(_scan_partition, where, sort_keys, k, part))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
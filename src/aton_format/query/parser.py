@@ -5,73 +5,127 @@ ATON Format - Query Parser
 import re
 from typing import Any, List, Optional, Tuple, Union
 from ..query.operators import QueryOperator, LogicalOperator
-from ..core.types import QueryExpression, ParsedQuery, SortOrder, QueryCondition
+from ..core.types import (
+    AggregateField, JoinClause, OrderKey, QueryExpression, ParsedQuery, SortOrder,
+    QueryCondition, QueryParameter
+)
 from ..exceptions import ATONQueryError
 
+AGGREGATE_FUNCTIONS = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+
+
+TOKEN_PATTERNS = [
+    ('SELECT', r'\bSELECT\b'),
+    ('FROM', r'\bFROM\b'),
+    ('WHERE', r'\bWHERE\b'),
+    ('ORDER', r'\bORDER\s+BY\b'),
+    ('GROUP', r'\bGROUP\s+BY\b'),
+    ('LIMIT', r'\bLIMIT\b'),
+    ('OFFSET', r'\bOFFSET\b'),
+    ('AND', r'\bAND\b'),
+    ('OR', r'\bOR\b'),
+    ('NOT', r'\bNOT\b'),
+    ('IN', r'\bIN\b'),
+    ('LIKE', r'\bLIKE\b'),
+    ('BETWEEN', r'\bBETWEEN\b'),
+    ('ASC', r'\bASC\b'),
+    ('DESC', r'\bDESC\b'),
+    ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*(?:\.[a-zA-Z_][a-zA-Z0-9_]*)*'),
+    ('NUMBER', r'-?\d+\.?\d*'),
+    ('STRING', r"'[^']*'|\"[^\"]*\""),
+    ('ARROW', r'->|\u2192'),
+    ('OPERATOR', r'<=|>=|!=|<>|=|<|>'),
+    ('COMMA', r','),
+    ('STAR', r'\*'),
+    ('PARAM', r'\?'),
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('WHITESPACE', r'\s+'),
+]
+
+# Single alternation of all token patterns, compiled once per process.
+# Alternatives are tried in TOKEN_PATTERNS order, so keywords still win
+# over IDENTIFIER exactly as with the old per-pattern loop.
+TOKEN_REGEX = re.compile(
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_PATTERNS),
+    re.IGNORECASE
+)
+
 
 class QueryTokenizer:
     """Tokenize SQL-like query strings"""
     
-    TOKEN_PATTERNS = [
-        ('SELECT', r'\bSELECT\b'),
-        ('FROM', r'\bFROM\b'),
-        ('WHERE', r'\bWHERE\b'),
-        ('ORDER', r'\bORDER\s+BY\b'),
-        ('LIMIT', r'\bLIMIT\b'),
-        ('OFFSET', r'\bOFFSET\b'),
-        ('AND', r'\bAND\b'),
-        ('OR', r'\bOR\b'),
-        ('NOT', r'\bNOT\b'),
-        ('IN', r'\bIN\b'),
-        ('LIKE', r'\bLIKE\b'),
-        ('BETWEEN', r'\bBETWEEN\b'),
-        ('ASC', r'\bASC\b'),
-        ('DESC', r'\bDESC\b'),
-        ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*'),
-        ('NUMBER', r'-?\d+\.?\d*'),
-        ('STRING', r"'[^']*'|\"[^\"]*\""),
-        ('OPERATOR', r'<=|>=|!=|<>|=|<|>'),
-        ('COMMA', r','),
-        ('LPAREN', r'\('),
-        ('RPAREN', r'\)'),
-        ('WHITESPACE', r'\s+'),
-    ]
-    
-    def __init__(self):
-        self.patterns = [(name, re.compile(pattern, re.IGNORECASE)) 
-                        for name, pattern in self.TOKEN_PATTERNS]
+    TOKEN_PATTERNS = TOKEN_PATTERNS
     
     def tokenize(self, query: str) -> List[Tuple[str, str]]:
         """Tokenize query string into tokens"""
-        tokens = []
+        tokens: List[Tuple[str, str]] = []
+        append = tokens.append
         pos = 0
         
-        while pos < len(query):
-            matched = False
-            
-            for token_name, pattern in self.patterns:
-                match = pattern.match(query, pos)
-                if match:
-                    value = match.group(0)
-                    if token_name != 'WHITESPACE':  # Skip whitespace
-                        tokens.append((token_name, value))
-                    pos = match.end()
-                    matched = True
-                    break
-            
-            if not matched:
-                raise ATONQueryError(f"Invalid character at position {pos}: '{query[pos]}'")
+        for match in TOKEN_REGEX.finditer(query):
+            if match.start() != pos:
+                break  # Skipped an untokenizable character
+            token_name = match.lastgroup
+            if token_name is not None and token_name != 'WHITESPACE':  # Skip whitespace
+                append((token_name, match.group()))
+            pos = match.end()
+        
+        if pos < len(query):
+            raise ATONQueryError(f"Invalid character at position {pos}: '{query[pos]}'")
         
         return tokens
 
 
+class TokenCursor:
+    """Position within one query's token list (one per parse call)"""
+    
+    __slots__ = ('tokens', 'pos', 'parameters')
+    
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.parameters = 0
+    
+    def current(self) -> Optional[Tuple[str, str]]:
+        """Get current token"""
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+    
+    def peek(self, token_type: str) -> bool:
+        """Check if current token matches type"""
+        current = self.current()
+        return current is not None and current[0] == token_type
+    
+    def peek_keyword(self, keyword: str) -> bool:
+        """Check if current token is the contextual keyword (an IDENTIFIER elsewhere)"""
+        current = self.current()
+        return current is not None and current[0] == 'IDENTIFIER' and current[1].upper() == keyword
+    
+    def consume_keyword(self, keyword: str) -> str:
+        """Consume a contextual keyword"""
+        if not self.peek_keyword(keyword):
+            current = self.current()
+            raise ATONQueryError(f"Expected {keyword}, got {current[1] if current else 'EOF'}")
+        return self.consume('IDENTIFIER')
+    
+    def consume(self, token_type: str) -> str:
+        """Consume and return token of expected type"""
+        current = self.current()
+        if not current or current[0] != token_type:
+            raise ATONQueryError(f"Expected {token_type}, got {current[0] if current else 'EOF'}")
+        self.pos += 1
+        return current[1]
+
+
 class QueryParser:
-    """Full AST parser for ATON query language"""
+    """Full AST parser for ATON query language.
+    
+    Parsing state lives in a TokenCursor created per parse() call, so one
+    parser (and the engine holding it) can be shared across threads.
+    """
     
     def __init__(self):
         self.tokenizer = QueryTokenizer()
-        self.tokens: List[Tuple[str, str]] = []
-        self.pos = 0
     
     def parse(self, query_string: str) -> ParsedQuery:
         """Parse complete query into AST"""
@@ -81,159 +135,247 @@ class QueryParser:
             query_string = query_match.group(1)
         
         # Tokenize
-        self.tokens = self.tokenizer.tokenize(query_string)
-        self.pos = 0
+        cursor = TokenCursor(self.tokenizer.tokenize(query_string))
+        
+        # Parse components: "table [SELECT ...]" or "SELECT ... FROM table"
+        if cursor.peek('SELECT'):
+            select_fields, aggregates = self._parse_select(cursor)
+            cursor.consume('FROM')
+            table = self._parse_table(cursor)
+            joins = self._parse_joins(cursor)
+        else:
+            table = self._parse_table(cursor)
+            joins = self._parse_joins(cursor)
+            select_fields, aggregates = (
+                self._parse_select(cursor) if cursor.peek('SELECT') else (None, None)
+            )
+        where_expr = self._parse_where(cursor) if cursor.peek('WHERE') else None
+        group_by = self._parse_group_by(cursor) if cursor.peek('GROUP') else None
+        order_keys = self._parse_order_by(cursor) if cursor.peek('ORDER') else None
+        limit = self._parse_limit(cursor) if cursor.peek('LIMIT') else None
+        offset = self._parse_offset(cursor) if cursor.peek('OFFSET') else 0
         
-        # Parse components
-        table = self._parse_table()
-        select_fields = self._parse_select() if self._peek('SELECT') else None
-        where_expr = self._parse_where() if self._peek('WHERE') else None
-        order_by, order_dir = self._parse_order_by() if self._peek('ORDER') else (None, SortOrder.ASC)
-        limit = self._parse_limit() if self._peek('LIMIT') else None
-        offset = self._parse_offset() if self._peek('OFFSET') else 0
+        current = cursor.current()
+        if current:
+            raise ATONQueryError(f"Unexpected {current[0]} '{current[1]}'")
+        
+        if aggregates or group_by:
+            self._validate_grouping(select_fields, aggregates, group_by)
         
         return ParsedQuery(
             table=table,
             select_fields=select_fields,
             where_expression=where_expr,
-            order_by=order_by,
-            order_direction=order_dir,
+            order_by=order_keys[0].field if order_keys else None,
+            order_direction=order_keys[0].direction if order_keys else SortOrder.ASC,
+            order_keys=order_keys,
             limit=limit,
-            offset=offset
+            offset=offset,
+            aggregates=aggregates,
+            group_by=group_by,
+            joins=joins,
+            parameter_count=cursor.parameters
         )
     
-    def _current(self) -> Optional[Tuple[str, str]]:
-        """Get current token"""
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
-    
-    def _peek(self, token_type: str) -> bool:
-        """Check if current token matches type"""
-        current = self._current()
-        return current and current[0] == token_type
-    
-    def _consume(self, token_type: str) -> str:
-        """Consume and return token of expected type"""
-        current = self._current()
-        if not current or current[0] != token_type:
-            raise ATONQueryError(f"Expected {token_type}, got {current[0] if current else 'EOF'}")
-        self.pos += 1
-        return current[1]
-    
-    def _parse_table(self) -> str:
+    def _parse_table(self, cursor: TokenCursor) -> str:
         """Parse table name"""
-        return self._consume('IDENTIFIER')
+        return cursor.consume('IDENTIFIER')
     
-    def _parse_select(self) -> List[str]:
-        """Parse SELECT clause"""
-        self._consume('SELECT')
+    def _parse_joins(self, cursor: TokenCursor) -> Optional[List[JoinClause]]:
+        """Parse [INNER | LEFT] JOIN table ON a = b (or a -> b) clauses"""
+        joins = []
+        while any(cursor.peek_keyword(word) for word in ('JOIN', 'INNER', 'LEFT')):
+            kind = 'INNER'
+            if cursor.peek_keyword('LEFT'):
+                cursor.consume_keyword('LEFT')
+                kind = 'LEFT'
+            elif cursor.peek_keyword('INNER'):
+                cursor.consume_keyword('INNER')
+            cursor.consume_keyword('JOIN')
+            table = cursor.consume('IDENTIFIER')
+            cursor.consume_keyword('ON')
+            left = cursor.consume('IDENTIFIER')
+            if cursor.peek('ARROW'):
+                cursor.consume('ARROW')
+            elif cursor.consume('OPERATOR') != '=':
+                raise ATONQueryError("JOIN conditions must use '=' or '->'")
+            right = cursor.consume('IDENTIFIER')
+            joins.append(JoinClause(table=table, left_field=left, right_field=right, kind=kind))
+        return joins or None
+    
+    def _parse_select(self, cursor: TokenCursor
+                      ) -> Tuple[Optional[List[str]], Optional[List[AggregateField]]]:
+        """Parse SELECT clause into output field names and aggregates"""
+        cursor.consume('SELECT')
         
-        fields = []
-        fields.append(self._consume('IDENTIFIER'))
+        if cursor.peek('STAR'):
+            cursor.consume('STAR')
+            return None, None
         
-        while self._peek('COMMA'):
-            self._consume('COMMA')
-            fields.append(self._consume('IDENTIFIER'))
+        fields: List[str] = []
+        aggregates: List[AggregateField] = []
+        while True:
+            name = cursor.consume('IDENTIFIER')
+            if cursor.peek('LPAREN') and name.upper() in AGGREGATE_FUNCTIONS:
+                aggregate = self._parse_aggregate(cursor, name.upper())
+                aggregates.append(aggregate)
+                name = aggregate.alias
+            if name in fields:
+                raise ATONQueryError(f"Duplicate output field '{name}'")
+            fields.append(name)
+            
+            if not cursor.peek('COMMA'):
+                break
+            cursor.consume('COMMA')
+        
+        return fields, aggregates or None
+    
+    def _parse_aggregate(self, cursor: TokenCursor, function: str) -> AggregateField:
+        """Parse FUNC(field) or COUNT(*) with optional AS alias"""
+        cursor.consume('LPAREN')
+        if cursor.peek('STAR'):
+            if function != 'COUNT':
+                raise ATONQueryError(f"{function}(*) is not supported")
+            cursor.consume('STAR')
+            field = None
+        else:
+            field = cursor.consume('IDENTIFIER')
+        cursor.consume('RPAREN')
         
+        if cursor.peek_keyword('AS'):
+            cursor.consume_keyword('AS')
+            alias = cursor.consume('IDENTIFIER')
+        else:
+            alias = function.lower() if field is None else f"{function.lower()}_{field}"
+        
+        return AggregateField(function=function, field=field, alias=alias)
+    
+    def _parse_group_by(self, cursor: TokenCursor) -> List[str]:
+        """Parse GROUP BY clause"""
+        cursor.consume('GROUP')
+        fields = [cursor.consume('IDENTIFIER')]
+        while cursor.peek('COMMA'):
+            cursor.consume('COMMA')
+            fields.append(cursor.consume('IDENTIFIER'))
         return fields
     
-    def _parse_where(self) -> QueryExpression:
+    def _validate_grouping(self, select_fields: Optional[List[str]],
+                           aggregates: Optional[List[AggregateField]],
+                           group_by: Optional[List[str]]) -> None:
+        """Plain selected fields must be grouped when aggregating"""
+        aliases = {a.alias for a in aggregates or []}
+        grouped = set(group_by or [])
+        for name in select_fields or []:
+            if name not in aliases and name not in grouped:
+                raise ATONQueryError(
+                    f"Field '{name}' must appear in GROUP BY or be aggregated"
+                )
+    
+    def _parse_where(self, cursor: TokenCursor) -> QueryExpression:
         """Parse WHERE clause into expression tree"""
-        self._consume('WHERE')
-        return self._parse_or_expression()
+        cursor.consume('WHERE')
+        return self._parse_or_expression(cursor)
     
-    def _parse_or_expression(self) -> QueryExpression:
+    def _parse_or_expression(self, cursor: TokenCursor) -> QueryExpression:
         """Parse OR expressions"""
-        left = self._parse_and_expression()
+        left = self._parse_and_expression(cursor)
         
-        if self._peek('OR'):
+        if cursor.peek('OR'):
             conditions = [left]
-            while self._peek('OR'):
-                self._consume('OR')
-                conditions.append(self._parse_and_expression())
+            while cursor.peek('OR'):
+                cursor.consume('OR')
+                conditions.append(self._parse_and_expression(cursor))
             return QueryExpression(conditions=conditions, operator="OR")
         
         return left
     
-    def _parse_and_expression(self) -> QueryExpression:
+    def _parse_and_expression(self, cursor: TokenCursor) -> QueryExpression:
         """Parse AND expressions"""
-        conditions = [self._parse_condition()]
+        conditions = [self._parse_condition(cursor)]
         
-        while self._peek('AND'):
-            self._consume('AND')
-            conditions.append(self._parse_condition())
+        while cursor.peek('AND'):
+            cursor.consume('AND')
+            conditions.append(self._parse_condition(cursor))
         
         return QueryExpression(conditions=conditions, operator="AND")
     
-    def _parse_condition(self) -> Union[QueryCondition, QueryExpression]:
+    def _parse_condition(self, cursor: TokenCursor) -> Union[QueryCondition, QueryExpression]:
         """Parse single condition"""
         # Handle parentheses
-        if self._peek('LPAREN'):
-            self._consume('LPAREN')
-            expr = self._parse_or_expression()
-            self._consume('RPAREN')
+        if cursor.peek('LPAREN'):
+            cursor.consume('LPAREN')
+            expr = self._parse_or_expression(cursor)
+            cursor.consume('RPAREN')
             return expr
         
         # Handle NOT
-        if self._peek('NOT'):
-            self._consume('NOT')
-            inner = self._parse_condition()
+        if cursor.peek('NOT'):
+            cursor.consume('NOT')
+            inner = self._parse_condition(cursor)
             return QueryExpression(conditions=[inner], operator="NOT")
         
         # Parse field
-        field = self._consume('IDENTIFIER')
+        field = cursor.consume('IDENTIFIER')
         
         # Parse operator
-        if self._peek('IN') or self._peek('LIKE') or self._peek('BETWEEN'):
-            return self._parse_special_condition(field)
+        if cursor.peek('IN') or cursor.peek('LIKE') or cursor.peek('BETWEEN'):
+            return self._parse_special_condition(cursor, field)
         
         # Standard operator
-        op_str = self._consume('OPERATOR')
+        op_str = cursor.consume('OPERATOR')
         operator = op_str
         
         # Parse value
-        value = self._parse_value()
+        value = self._parse_value(cursor)
         
         return QueryCondition(field=field, operator=operator, value=value)
     
-    def _parse_special_condition(self, field: str) -> QueryCondition:
+    def _parse_special_condition(self, cursor: TokenCursor, field: str) -> QueryCondition:
         """Parse IN, LIKE, BETWEEN conditions"""
-        if self._peek('IN'):
-            self._consume('IN')
-            self._consume('LPAREN')
+        if cursor.peek('IN'):
+            cursor.consume('IN')
+            if cursor.peek('PARAM'):
+                # IN ? binds a whole sequence of values
+                return QueryCondition(field=field, operator="IN", value=self._parse_value(cursor))
+            cursor.consume('LPAREN')
             
-            values = [self._parse_value()]
-            while self._peek('COMMA'):
-                self._consume('COMMA')
-                values.append(self._parse_value())
+            values = [self._parse_value(cursor)]
+            while cursor.peek('COMMA'):
+                cursor.consume('COMMA')
+                values.append(self._parse_value(cursor))
             
-            self._consume('RPAREN')
+            cursor.consume('RPAREN')
             return QueryCondition(field=field, operator="IN", value=values)
         
-        elif self._peek('LIKE'):
-            self._consume('LIKE')
-            pattern = self._parse_value()
+        elif cursor.peek('LIKE'):
+            cursor.consume('LIKE')
+            pattern = self._parse_value(cursor)
             return QueryCondition(field=field, operator="LIKE", value=pattern)
         
-        elif self._peek('BETWEEN'):
-            self._consume('BETWEEN')
-            val1 = self._parse_value()
-            self._consume('AND')
-            val2 = self._parse_value()
+        elif cursor.peek('BETWEEN'):
+            cursor.consume('BETWEEN')
+            val1 = self._parse_value(cursor)
+            cursor.consume('AND')
+            val2 = self._parse_value(cursor)
             return QueryCondition(field=field, operator="BETWEEN", value=val1, value2=val2)
         
         raise ATONQueryError("Invalid special condition")
     
-    def _parse_value(self) -> Any:
-        """Parse value (string, number, identifier)"""
-        if self._peek('STRING'):
-            value = self._consume('STRING')
+    def _parse_value(self, cursor: TokenCursor) -> Any:
+        """Parse value (string, number, identifier or ? parameter)"""
+        if cursor.peek('PARAM'):
+            cursor.consume('PARAM')
+            cursor.parameters += 1
+            return QueryParameter(cursor.parameters - 1)
+        elif cursor.peek('STRING'):
+            value = cursor.consume('STRING')
             return value[1:-1]  # Remove quotes
-        elif self._peek('NUMBER'):
-            value = self._consume('NUMBER')
+        elif cursor.peek('NUMBER'):
+            value = cursor.consume('NUMBER')
             return float(value) if '.' in value else int(value)
-        elif self._peek('IDENTIFIER'):
+        elif cursor.peek('IDENTIFIER'):
             # Could be boolean or null
-            value = self._consume('IDENTIFIER')
+            value = cursor.consume('IDENTIFIER')
             if value.upper() == 'TRUE':
                 return True
             elif value.upper() == 'FALSE':
@@ -244,28 +386,44 @@ class QueryParser:
         else:
             raise ATONQueryError("Expected value")
     
-    def _parse_order_by(self) -> Tuple[str, SortOrder]:
-        """Parse ORDER BY clause"""
-        self._consume('ORDER')
-        field = self._consume('IDENTIFIER')
+    def _parse_order_by(self, cursor: TokenCursor) -> List[OrderKey]:
+        """Parse ORDER BY field [ASC|DESC] [NULLS FIRST|LAST], ..."""
+        cursor.consume('ORDER')
+        keys = [self._parse_order_key(cursor)]
+        while cursor.peek('COMMA'):
+            cursor.consume('COMMA')
+            keys.append(self._parse_order_key(cursor))
+        return keys
+    
+    def _parse_order_key(self, cursor: TokenCursor) -> OrderKey:
+        """Parse a single ORDER BY key"""
+        field = cursor.consume('IDENTIFIER')
         
         direction = SortOrder.ASC
-        if self._peek('ASC'):
-            self._consume('ASC')
-        elif self._peek('DESC'):
-            self._consume('DESC')
+        if cursor.peek('ASC'):
+            cursor.consume('ASC')
+        elif cursor.peek('DESC'):
+            cursor.consume('DESC')
             direction = SortOrder.DESC
         
-        return field, direction
+        nulls_first = False
+        if cursor.peek_keyword('NULLS'):
+            cursor.consume_keyword('NULLS')
+            position = cursor.consume('IDENTIFIER').upper()
+            if position not in ('FIRST', 'LAST'):
+                raise ATONQueryError(f"Expected NULLS FIRST or NULLS LAST, got NULLS {position}")
+            nulls_first = position == 'FIRST'
+        
+        return OrderKey(field=field, direction=direction, nulls_first=nulls_first)
     
-    def _parse_limit(self) -> int:
+    def _parse_limit(self, cursor: TokenCursor) -> int:
         """Parse LIMIT clause"""
-        self._consume('LIMIT')
-        value = self._consume('NUMBER')
+        cursor.consume('LIMIT')
+        value = cursor.consume('NUMBER')
         return int(value)
     
-    def _parse_offset(self) -> int:
+    def _parse_offset(self, cursor: TokenCursor) -> int:
         """Parse OFFSET clause"""
-        self._consume('OFFSET')
-        value = self._consume('NUMBER')
+        cursor.consume('OFFSET')
+        value = cursor.consume('NUMBER')
         return int(value)
@@ -3,14 +3,33 @@ ATON Format V2.0 - Compression Tests
 Tests for compression engine and algorithms.
 """
 
+import json
+
 import pytest
 from aton_format import CompressionMode
-from aton_format.compression import ATONCompressionEngine
+from aton_format.compression import (
+    ATONCompressionEngine,
+    CompressionPlan,
+    SharedDictionary,
+    plan_compression,
+    train_dictionary,
+)
+from aton_format.compression.engine import sample_rows
 from aton_format.compression.algorithms import (
     DictionaryCompression,
     DeltaCompression,
     PatternCompression,
+    RunLengthCompression,
+    RefAllocator,
+    AffixRef,
+    DITTO,
+    MISSING,
+    decode_deltas,
+    encode_deltas,
+    frequent_prefixes,
+    undo_ditto,
 )
+from aton_format.exceptions import ATONCompressionError
 
 
 class TestCompressionModeEnum:
@@ -140,6 +159,260 @@ class TestDictionaryCompression:
         assert isinstance(savings, float)
         assert savings >= 0.0
 
+    def test_compress_replaces_only_hits(self):
+        """Rows and tables without dictionary hits are reused, not copied."""
+        algo = DictionaryCompression(min_length=3, min_occurrences=2)
+        plain = [{"id": i, "code": "x"} for i in range(3)]
+        statuses = ["completed", "new", "completed", "completed", "completed"]
+        data = {
+            "items": [{"id": i, "status": s} for i, s in enumerate(statuses)],
+            "plain": plain,
+        }
+        compressed, metadata = algo.compress(data)
+        assert metadata["dictionary"] == {"#0": "completed"}
+        assert [r["status"] for r in compressed["items"]] == ["#0", "new", "#0", "#0", "#0"]
+        assert compressed["items"][1] is data["items"][1]
+        assert compressed["plain"] is plain
+        assert data["items"][0]["status"] == "completed"  # Input untouched
+
+    def test_compress_nested_values(self):
+        """Strings inside nested lists and dicts are replaced too."""
+        algo = DictionaryCompression(min_length=3, min_occurrences=2)
+        record = {"tags": ["alpha-team", "beta"], "meta": {"owner": "alpha-team"}}
+        compressed, metadata = algo.compress({"items": [record, record]})
+        assert metadata["dictionary"] == {"#0": "alpha-team"}
+        assert compressed["items"][0] == {"tags": ["#0", "beta"], "meta": {"owner": "#0"}}
+
+    def test_frequent_strings_get_shortest_refs(self):
+        """Refs are assigned by descending frequency."""
+        algo = DictionaryCompression()
+        rows = [{"city": "Amsterdam"}] * 4 + [{"city": "Copenhagen"}] * 30
+        compressed, metadata = algo.compress({"items": rows})
+        assert metadata["dictionary"] == {"#0": "Copenhagen", "#1": "Amsterdam"}
+        assert compressed["items"][0]["city"] == "#1"
+
+    def test_unprofitable_dictionary_not_emitted(self):
+        """Entries whose definition costs more than they save are dropped."""
+        algo = DictionaryCompression()
+        data = {"items": [{"a": "hello"}, {"a": "hello"}, {"a": "hello"}]}
+        compressed, metadata = algo.compress(data)
+        assert metadata["dictionary"] == {}
+        assert compressed["items"] is data["items"]
+        assert algo.estimate_savings(data) == 0.0
+
+    def test_max_entries_keeps_biggest_savings(self):
+        """The cap keeps the entries with the highest net savings."""
+        algo = DictionaryCompression(max_entries=1)
+        rows = ([{"v": "a fairly long repeated description"}] * 5
+                + [{"v": "short-ish"}] * 8)
+        _, metadata = algo.compress({"items": rows})
+        assert metadata["dictionary"] == {"#0": "a fairly long repeated description"}
+
+    def test_invalid_max_entries(self):
+        """Negative caps are rejected."""
+        with pytest.raises(ValueError):
+            DictionaryCompression(max_entries=-1)
+
+    def test_counting_handles_deep_nesting(self):
+        """Counting is iterative, so deep structures don't hit the recursion limit."""
+        algo = DictionaryCompression(min_length=3, min_occurrences=2)
+        nested = ["deep value"]
+        for _ in range(5000):
+            nested = [nested, "deep value"]
+        assert algo._count_strings({"items": [{"v": nested}]}) == {"deep value": 5001}
+
+    def test_replacing_handles_deep_nesting(self):
+        """Replacement is iterative too and still copies only changed containers."""
+        algo = DictionaryCompression(min_length=3, min_occurrences=2)
+        untouched = {"keep": ["x", "y"]}
+        nested = [{"leaf": "deep value"}]
+        for _ in range(5000):
+            nested = [nested, "deep value"]
+        data = {"items": [{"v": nested, "other": untouched}, {"v": "deep value"}]}
+        compressed, metadata = algo.compress(data)
+        assert metadata["dictionary"] == {"#0": "deep value"}
+        assert compressed["items"][0]["other"] is untouched
+        level, depth = compressed["items"][0]["v"], 0
+        while len(level) == 2:
+            assert level[1] == "#0"
+            level, depth = level[0], depth + 1
+        assert (depth, level) == (5000, [{"leaf": "#0"}])
+        assert nested[1] == "deep value"  # Input untouched
+
+    def test_refs_reset_per_document(self):
+        """A reused instance numbers every document's refs from the start."""
+        algo = DictionaryCompression()
+        first = {"items": [{"city": "Copenhagen"}] * 10}
+        second = {"items": [{"city": "Amsterdam"}] * 10}
+        assert algo.compress(first)[1]["dictionary"] == {"#0": "Copenhagen"}
+        assert algo.compress(second)[1]["dictionary"] == {"#0": "Amsterdam"}
+
+    def test_tokenizer_picks_cheapest_refs(self):
+        """With a custom tokenizer, single-token refs go to the most frequent strings."""
+        def tokenizer(text):
+            return 1 if text in ("#x", "#q") else max(2, len(text) // 2)
+
+        algo = DictionaryCompression(tokenizer=tokenizer)
+        rows = [{"city": "Amsterdam"}] * 4 + [{"city": "Copenhagen"}] * 30
+        _, metadata = algo.compress({"items": rows})
+        assert metadata["dictionary"] == {"#q": "Copenhagen", "#x": "Amsterdam"}
+
+    def test_tokens_saved_reported(self):
+        """Net token savings of the dictionary are reported in the metadata."""
+        algo = DictionaryCompression()
+        rows = [{"city": "Copenhagen"}] * 30
+        _, metadata = algo.compress({"items": rows})
+        # 30 uses of '"Copenhagen"' (3 tokens) become '#0' (1), minus the entry (4)
+        assert metadata["tokens_saved"] == algo.tokens_saved == 30 * 2 - 4
+
+    def test_many_entries_use_alphanumeric_refs(self):
+        """Refs past #9 stay two characters long."""
+        algo = DictionaryCompression()
+        rows = [{"v": f"repeated value {i:02d}"} for i in range(20) for _ in range(5)]
+        _, metadata = algo.compress({"items": rows})
+        assert len(metadata["dictionary"]) == 20
+        assert all(len(ref) == 2 for ref in metadata["dictionary"])
+
+
+class TestAffixDictionary:
+    """Tests for prefix/suffix dictionary entries."""
+
+    HOSTS = ["https://api.example.com/v1/users/", "https://cdn.example.org/assets/img/"]
+
+    def test_shared_prefixes(self):
+        """Unique URLs share their host prefixes through inline refs."""
+        rows = [{"url": f"{self.HOSTS[i % 2]}{i * 7919 % 104729}"} for i in range(40)]
+        compressed, metadata = DictionaryCompression().compress({"links": rows})
+        assert sorted(metadata["dictionary"].values()) == sorted(self.HOSTS)
+        refs = {s: ref for ref, s in metadata["dictionary"].items()}
+        value = compressed["links"][1]["url"]
+        assert isinstance(value, AffixRef)
+        assert value == f'{refs[self.HOSTS[1]]}"7919"'
+        assert rows[1]["url"] == f"{self.HOSTS[1]}7919"  # Input untouched
+        assert metadata["tokens_saved"] > 0
+
+    def test_shared_suffixes(self):
+        """E-mail addresses share their domain as a suffix ref."""
+        rows = [{"email": f"person{i}@mail.example-company.com"} for i in range(20)]
+        compressed, metadata = DictionaryCompression().compress({"users": rows})
+        assert metadata["dictionary"] == {"#0": "@mail.example-company.com"}
+        assert compressed["users"][3]["email"] == '"person3"#0'
+
+    def test_affixes_disabled(self):
+        """min_affix_length=0 keeps whole-string matching only."""
+        rows = [{"url": f"{self.HOSTS[i % 2]}{i}"} for i in range(40)]
+        compressed, metadata = DictionaryCompression(min_affix_length=0).compress({"links": rows})
+        assert metadata["dictionary"] == {}
+        assert compressed["links"] is rows
+
+    def test_only_planned_columns(self):
+        """Columns outside the columns restriction are not spliced."""
+        rows = [{"url": f"{self.HOSTS[0]}{i}", "copy": f"{self.HOSTS[0]}{i}"} for i in range(40)]
+        compressed, _ = DictionaryCompression().compress(
+            {"links": rows}, columns={"links": {"url"}}
+        )
+        assert isinstance(compressed["links"][0]["url"], AffixRef)
+        assert compressed["links"][0]["copy"] == rows[0]["copy"]
+
+    def test_frequent_prefixes(self):
+        """Branching prefixes are found; a longer one must beat the shorter."""
+        values = ([f"/srv/app/logs/{c}" for c in "abcdef"]
+                  + [f"/srv/app/data/x{n}" for n in range(6)])
+
+        def gain(prefix, shorter, members):
+            return (len(prefix) - (shorter or 2)) * len(members) - len(prefix) - 6
+
+        assert set(frequent_prefixes(values, 8, 3, gain)) == {"/srv/app/logs/", "/srv/app/data/x"}
+        assert frequent_prefixes(values, 8, 7, gain).keys() == {"/srv/app/"}
+        assert frequent_prefixes(["/srv/a1", "/srv/a2", "/srv/a3"], 4, 3, gain) == {}
+
+
+class TestRefAllocator:
+    """Tests for tokenizer-ranked dictionary refs."""
+
+    def test_default_order(self):
+        """With the default estimate, refs are digits, then letters."""
+        assert RefAllocator().refs(12) == [f"#{i}" for i in range(10)] + ["#a", "#b"]
+
+    def test_exclude(self):
+        """Excluded refs (e.g. a shared dictionary's) are skipped."""
+        assert RefAllocator().refs(2, exclude={"#0", "#2"}) == ["#1", "#3"]
+
+    def test_grows_past_ranked_lengths(self):
+        """Longer refs are generated once the ranked ones run out."""
+        refs = RefAllocator().refs(62 + 62 * 62 + 1)
+        assert len(set(refs)) == len(refs)
+        assert refs[-1] == "#000"
+
+
+class TestSharedDictionary:
+    """Tests for pre-trained shared dictionaries."""
+
+    SAMPLES = [
+        {"orders": [{"status": "shipped-express", "region": "north-america"}] * 3},
+        {"orders": [{"status": "shipped-express", "region": "europe-west"}] * 3},
+    ]
+
+    def test_train_dictionary(self):
+        """Strings frequent across samples become entries."""
+        shared = train_dictionary(self.SAMPLES, version=3)
+        assert shared.dict_id.startswith("v3-")
+        assert shared.entries == {
+            "#0": "shipped-express", "#1": "europe-west", "#2": "north-america"
+        }
+
+    def test_save_and_load(self, tmp_path):
+        """A saved dictionary loads back equal."""
+        shared = train_dictionary(self.SAMPLES)
+        path = tmp_path / "orders.dict.json"
+        shared.save(str(path))
+        assert SharedDictionary.load(str(path)) == shared
+
+    def test_id_hashes_entries(self):
+        """Dictionaries with the same version but other entries get other IDs."""
+        first = SharedDictionary(version=1, entries={"#0": "shipped-express"})
+        second = SharedDictionary(version=1, entries={"#0": "north-america"})
+        assert first.dict_id != second.dict_id
+        assert first.dict_id == SharedDictionary(1, {"#0": "shipped-express"}).dict_id
+
+    def test_load_rejects_mismatched_id(self, tmp_path):
+        """Entries edited after saving no longer match the stored ID."""
+        payload = train_dictionary(self.SAMPLES).to_dict()
+        payload["entries"] = {"#0": "something-else"}
+        with pytest.raises(ATONCompressionError, match="do not match"):
+            SharedDictionary.from_dict(payload)
+
+    def test_load_rejects_other_files(self, tmp_path):
+        """Files that are not shared dictionaries raise ATONCompressionError."""
+        path = tmp_path / "other.json"
+        path.write_text('{"entries": {}}')
+        with pytest.raises(ATONCompressionError):
+            SharedDictionary.load(str(path))
+
+    def test_extend_bumps_version(self):
+        """extend() returns a new version including the added entries."""
+        shared = SharedDictionary(version=3, entries={"#0": "shipped-express"})
+        extended = shared.extend({"#1": "north-america"})
+        assert extended.version == 4
+        assert extended.entries == {"#0": "shipped-express", "#1": "north-america"}
+        assert shared.entries == {"#0": "shipped-express"}
+
+    def test_compress_with_shared(self):
+        """Shared strings use shared refs; new entries skip them."""
+        shared = SharedDictionary(version=1, entries={"#0": "shipped-express"})
+        algo = DictionaryCompression(shared=shared)
+        rows = [{"status": "shipped-express", "region": "asia-pacific-south"}] * 4
+        compressed, metadata = algo.compress({"orders": rows})
+        assert metadata["shared_dictionary"] is shared
+        assert metadata["dictionary"] == {"#1": "asia-pacific-south"}
+        assert compressed["orders"][0] == {"status": "#0", "region": "#1"}
+
+    def test_shared_unused(self):
+        """Without shared hits, metadata carries no shared dictionary."""
+        shared = SharedDictionary(version=1, entries={"#0": "shipped-express"})
+        _, metadata = DictionaryCompression(shared=shared).compress({"orders": [{"id": 1}]})
+        assert "shared_dictionary" not in metadata
+
 
 class TestDeltaCompression:
     """Tests for delta compression algorithm."""
@@ -177,6 +450,41 @@ class TestDeltaCompression:
         savings = algo.estimate_savings(data)
         assert isinstance(savings, float)
 
+    def test_compress_monotonic_columns(self):
+        """Sequential ids and timestamps are delta encoded column-wise."""
+        algo = DeltaCompression()
+        rows = [{"id": 1000 + i, "ts": 1700000000 + 60 * i, "qty": (i * 37) % 101}
+                for i in range(10)]
+        compressed, metadata = algo.compress({"tx": rows})
+        assert metadata["delta_fields"] == {"tx": {"id": "delta", "ts": "delta2"}}
+        assert [r["id"] for r in compressed["tx"]][:3] == [1000, 1, 1]
+        assert [r["ts"] for r in compressed["tx"]][:3] == [1700000000, 60, 0]
+        assert [r["qty"] for r in compressed["tx"]] == [r["qty"] for r in rows]
+        assert rows[1]["id"] == 1001  # Input untouched
+
+    def test_skips_columns_with_non_ints(self):
+        """Columns with missing, null, bool or float values are left alone."""
+        algo = DeltaCompression()
+        rows = [{"id": 1000 + i, "ts": 1700000000 + i} for i in range(10)]
+        rows[7] = {"id": None, "ts": 1700000007}
+        compressed, metadata = algo.compress({"tx": rows})
+        assert metadata["delta_fields"] == {"tx": {"ts": "delta"}}
+        assert compressed["tx"][7]["id"] is None
+
+    def test_random_column_not_encoded(self):
+        """Columns whose deltas are not shorter stay as they are."""
+        data = {"items": [{"value": v} for v in [5, 100, 3, 999, 1, 42]]}
+        compressed, metadata = DeltaCompression().compress(data)
+        assert metadata["delta_fields"] == {}
+        assert compressed["items"] is data["items"]
+
+    @pytest.mark.parametrize("codec", ["delta", "delta2"])
+    def test_delta_codecs_round_trip(self, codec):
+        """decode_deltas inverts encode_deltas."""
+        values = [7, 9, 14, 14, 3, -20, 1]
+        assert decode_deltas(encode_deltas(values, codec), codec) == values
+        assert decode_deltas(encode_deltas([], codec), codec) == []
+
 
 class TestPatternCompression:
     """Tests for pattern compression algorithm."""
@@ -224,6 +532,171 @@ class TestPatternCompression:
         assert isinstance(savings, float)
         assert savings >= 0.0
 
+    def test_compress_prefix_and_suffix(self):
+        """Shared prefix/suffix become a template; rows keep the varying part."""
+        algo = PatternCompression()
+        rows = [{"img": f"https://cdn.example.com/img/{n}.png"} for n in (7, 12, 3, 40)]
+        compressed, metadata = algo.compress({"items": rows})
+        assert metadata["patterns"] == {"items": {"img": ("https://cdn.example.com/img/", ".png")}}
+        assert [r["img"] for r in compressed["items"]] == [7, 12, 3, 40]
+        assert rows[0]["img"] == "https://cdn.example.com/img/7.png"
+
+    def test_prefers_integer_varying_part(self):
+        """Trailing prefix digits move into the varying part to make it an int."""
+        rows = [{"uid": f"u-{1000 + 7 * i}"} for i in range(12)]
+        compressed, metadata = PatternCompression().compress({"items": rows})
+        assert metadata["patterns"] == {"items": {"uid": ("u-", "")}}
+        assert compressed["items"][0]["uid"] == 1000
+
+    def test_leading_zeros_stay_strings(self):
+        """Zero-padded parts are kept as strings so they read back unchanged."""
+        rows = [{"sku": f"SKU-2024-{n:05d}"} for n in (1, 20, 300, 4000)]
+        compressed, metadata = PatternCompression().compress({"items": rows})
+        assert metadata["patterns"]["items"]["sku"] == ("SKU-2024-0", "")
+        assert [r["sku"] for r in compressed["items"]] == ["0001", "0020", "0300", "4000"]
+
+    def test_sample_template_checked_on_full_column(self):
+        """Values outside the sample shrink the template to what all share."""
+        algo = PatternCompression(sample_size=2)
+        rows = [{"path": f"/var/log/app/{i}.log"} for i in range(9)]
+        rows.append({"path": "/var/tmp/other.txt"})
+        compressed, metadata = algo.compress({"items": rows})
+        assert metadata["patterns"]["items"]["path"] == ("/var/", "")
+        assert compressed["items"][-1]["path"] == "tmp/other.txt"
+
+    def test_column_with_non_strings_skipped(self):
+        """Columns that are not strings in every row get no template."""
+        rows = [{"code": f"ABC-{i}"} for i in range(5)] + [{"code": None}]
+        _, metadata = PatternCompression().compress({"items": rows})
+        assert metadata["patterns"] == {}
+
+
+class TestRunLengthCompression:
+    """Tests for run-length encoding."""
+
+    LOGS = [
+        {"host": host, "level": "INFO", "code": code}
+        for host in ("web-01", "web-02", "db-01")
+        for code in (200, 200, 200, 304, 200)
+    ]
+
+    def test_collapse_repeated_rows(self):
+        """Rows equal to the previous one are counted, not kept."""
+        rows = [{"a": 1}, {"a": 1}, {"a": 1}, {"a": 2}, {"a": 1}, {"a": 1}]
+        compressed, metadata = RunLengthCompression().compress({"t": rows})
+        assert compressed["t"] == [{"a": 1}, {"a": 2}, {"a": 1}]
+        assert metadata["row_runs"] == {"t": {0: 2, 2: 1}}
+
+    def test_ditto_repeated_column_values(self):
+        """Columns made mostly of runs get DITTO cells."""
+        compressed, metadata = RunLengthCompression().compress({"logs": self.LOGS})
+        assert metadata["rle_fields"] == {"logs": ["host", "level"]}
+        rows = compressed["logs"]
+        assert rows[0] == {"host": "web-01", "level": "INFO", "code": 200}
+        assert rows[1]["host"] is DITTO and rows[1]["level"] is DITTO
+        assert metadata["row_runs"] == {"logs": {0: 2, 3: 2, 6: 2}}
+        assert rows[3]["host"] == "web-02"
+        assert self.LOGS[1]["host"] == "web-01"  # Input untouched
+
+    def test_types_are_not_conflated(self):
+        """1, 1.0 and True are different values for runs."""
+        rows = [{"v": 1}, {"v": 1.0}, {"v": True}, {"v": 1}]
+        compressed, metadata = RunLengthCompression(min_repeat_ratio=0.0).compress({"t": rows})
+        assert metadata["row_runs"] == {}
+        assert compressed["t"] is rows
+
+    def test_no_runs(self):
+        """Tables without runs are returned unchanged."""
+        rows = [{"id": i, "name": f"n{i}"} for i in range(10)]
+        compressed, metadata = RunLengthCompression().compress({"t": rows})
+        assert compressed["t"] is rows
+        assert metadata == {"rle_fields": {}, "row_runs": {}}
+        assert RunLengthCompression().estimate_savings({"t": rows}) == 0.0
+
+    def test_estimate_savings(self):
+        """Grouped tables report positive savings."""
+        assert RunLengthCompression().estimate_savings({"logs": self.LOGS}) > 0.2
+
+    def test_undo_ditto(self):
+        """undo_ditto fills DITTO cells from the value above."""
+        assert undo_ditto(["a", DITTO, DITTO, "b", DITTO]) == ["a", "a", "a", "b", "b"]
+
+
+class TestCompressionPlan:
+    """Tests for per-column compression planning."""
+
+    ROWS = [
+        {
+            "id": 1000 + i,
+            "user": f"user_{i:06d}",
+            "host": "web-01" if i < 10 else "web-02",
+            "city": ["Amsterdam", "Copenhagen", "Barcelona"][i % 3],
+            "note": f"free text number {i * 7919 % 104729} here",
+            "score": (i * 37) % 101,
+        }
+        for i in range(20)
+    ]
+
+    def test_plan_picks_method_per_column(self):
+        """Each column gets the method that saves most on the sample."""
+        plan = plan_compression({"events": self.ROWS})
+        assert plan.tables["events"] == {
+            "id": "delta",
+            "user": "pattern",
+            "host": "rle",
+            "city": "dictionary",
+            "note": "pattern",
+            "score": "none",
+        }
+        assert plan.method("events", "missing") == "none"
+        assert plan.columns("dictionary") == {"events": {"city"}}
+
+    def test_plan_restricted_methods(self):
+        """Only the requested methods are considered."""
+        plan = plan_compression({"events": self.ROWS}, methods=("dictionary",))
+        # user and note only share prefixes, which the dictionary can also take
+        assert plan.columns("dictionary") == {"events": {"city", "host", "note", "user"}}
+        assert set(plan.tables["events"].values()) == {"dictionary", "none"}
+        with pytest.raises(ValueError):
+            plan_compression({"events": self.ROWS}, methods=("zstd",))
+
+    def test_score_column(self):
+        """Each algorithm scores a sampled column on its own terms."""
+        ids = [r["id"] for r in self.ROWS]
+        users = [r["user"] for r in self.ROWS]
+        hosts = [r["host"] for r in self.ROWS]
+        assert DeltaCompression().score_column(ids) > 0
+        assert DeltaCompression().score_column(users) == 0
+        assert PatternCompression().score_column(users) == len("user_0000") * 20
+        assert RunLengthCompression().score_column(hosts) == 18 * len('"web-01"') - 18
+        assert RunLengthCompression().score_column([MISSING] * 20) == 0
+        assert DictionaryCompression().score_column([[1], [2]]) == 1
+        assert DictionaryCompression().score_column(ids) == 0
+
+    def test_free_text_skipped_by_dictionary(self):
+        """Mostly-unique strings are not dictionary candidates."""
+        rows = [{"text": f"msg {i * 7919 % 104729} of {i}"} for i in range(50)]
+        plan = plan_compression({"t": rows}, methods=("dictionary",))
+        assert plan.tables == {"t": {"text": "none"}}
+
+    def test_balanced_only_touches_planned_columns(self):
+        """BALANCED leaves columns planned as none untouched."""
+        engine = ATONCompressionEngine(CompressionMode.BALANCED)
+        rows = [{"tag": "repeated-tag", "text": f"note {i}"} for i in range(20)]
+        rows[1]["text"] = rows[2]["text"] = "repeated-tag"
+        compressed, metadata = engine.compress({"t": rows})
+        assert isinstance(metadata["plan"], CompressionPlan)
+        assert metadata["plan"].tables["t"] == {"tag": "dictionary", "text": "none"}
+        assert compressed["t"][0]["tag"] == "#0"
+        assert compressed["t"][1]["text"] == "repeated-tag"
+
+    def test_ultra_round_trip_with_plan(self):
+        """ULTRA output built from a plan decodes to the input."""
+        from aton_format import ATONDecoder, ATONEncoder
+        data = {"events": self.ROWS}
+        encoded = ATONEncoder(compression=CompressionMode.ULTRA).encode(data)
+        assert ATONDecoder().decode(encoded) == data
+
 
 class TestCompressionComparison:
     """Tests comparing different compression approaches."""
@@ -356,3 +829,31 @@ class TestAdaptiveCompression:
         for data in test_cases:
             compressed, _ = engine.compress(data)
             assert compressed is not None
+
+    def test_sample_rows_takes_contiguous_chunks(self):
+        """Large tables are sampled in evenly spaced contiguous chunks."""
+        rows = list(range(1000))
+        assert sample_rows(rows[:50], size=100) == rows[:50]
+        sample = sample_rows(rows, size=8, chunks=4)
+        assert sample == [0, 1, 332, 333, 665, 666, 998, 999]
+
+    def test_adaptive_size_estimated_from_sample(self):
+        """The estimated size tracks the serialized size without dumping everything."""
+        engine = ATONCompressionEngine(mode=CompressionMode.ADAPTIVE)
+        data = {"items": [{"id": i, "name": f"user_{i:06d}"} for i in range(5000)]}
+        size = engine._profile(data)["items"][0]
+        assert abs(size - len(json.dumps(data))) / len(json.dumps(data)) < 0.05
+
+    def test_adaptive_profile_cached(self):
+        """Savings estimates are reused while the sampled rows are unchanged."""
+        engine = ATONCompressionEngine(mode=CompressionMode.ADAPTIVE)
+        data = {"items": [{"id": i, "city": ["Rome", "Paris"][i % 2]} for i in range(2000)]}
+        engine.compress(data)
+        profile = engine._profile(data)["items"]
+        assert profile[1] is not None
+        engine.compress(data)
+        assert engine._profile(data)["items"] is profile
+        assert len(engine._profiles) == 1
+
+        data["items"][0] = {"id": -1, "city": "Oslo"}
+        assert engine._profile(data)["items"] is not profile
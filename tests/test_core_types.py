@@ -82,6 +82,7 @@ class TestCompressionStats:
         )
         # dictionary_size and metadata may have defaults
         assert stats.original_size == 100
+        assert stats.phase_times_ns == {}
 
 
 class TestQueryCondition:
@@ -279,7 +280,7 @@ class TestParsedQuery:
         )
 
         assert query.table == "products"
-        assert query.select_fields == ["id", "name", "price"]
+        assert query.select_fields == ("id", "name", "price")
         assert query.where_expression == where_expr
         assert query.order_by == "price"
         assert query.order_direction == SortOrder.DESC
@@ -4,7 +4,7 @@ Tests for ATONDecoder class.
 """
 
 import pytest
-from aton_format import ATONEncoder, ATONDecoder, CompressionMode
+from aton_format import ATONEncoder, ATONDecoder, CompressionMode, SharedDictionary
 from aton_format.exceptions import ATONDecodingError
 
 
@@ -171,6 +171,158 @@ class TestATONDecoderDictionary:
         assert decoded == data
 
 
+    def test_decode_with_shared_dictionary(self):
+        """Messages referencing a shared dictionary decode with it."""
+        shared = SharedDictionary(version=2, entries={"#0": "Electronics", "#1": "Furniture"})
+        data = {
+            "items": [
+                {"id": i, "category": ["Electronics", "Furniture"][i % 2],
+                 "city": ["Copenhagen", "Amsterdam"][i % 2]}
+                for i in range(10)
+            ]
+        }
+        encoded = ATONEncoder(shared_dictionary=shared).encode(data)
+        assert f"@dict-ref[{shared.dict_id}]" in encoded
+        assert '#0:"Electronics"' not in encoded
+        assert "@dict+[" in encoded  # City names are per-message entries
+
+        assert ATONDecoder(shared_dictionaries=[shared]).decode(encoded) == data
+
+    def test_decode_alphanumeric_refs(self, decoder):
+        """Dictionaries with more than ten entries round-trip."""
+        data = {
+            "items": [
+                {"id": i, "label": f"repeated label {i % 15:02d}"}
+                for i in range(60)
+            ]
+        }
+        encoded = ATONEncoder().encode(data)
+        assert '#a:"' in encoded
+        assert decoder.decode(encoded) == data
+
+    def test_decode_affix_refs(self, encoder, decoder):
+        """Values with prefix/suffix refs (and quotes or commas in between) round-trip."""
+        middles = ["42", 'say "hi"', "a, b", ""]
+        data = {
+            "files": [
+                {"id": i,
+                 "url": f"https://files.example.com/share/{i}/{middles[i % 4]}",
+                 "owner": f"user{i}@storage.example-corp.com"}
+                for i in range(24)
+            ]
+        }
+        encoded = encoder.encode(data)
+        assert encoded.count("https://files.example.com/share/") == 1
+        assert decoder.decode(encoded) == data
+
+    def test_decode_entry_ending_in_quote(self, decoder):
+        """A dictionary entry may end with an escaped quote."""
+        aton = '@dict[#0:"say \\"hi\\""]\n\n@schema[a:str]\n\nt(1):\n  #0'
+        assert decoder.decode(aton) == {"t": [{"a": 'say "hi"'}]}
+
+    def test_decode_unknown_affix_ref(self, decoder):
+        """Inline refs missing from the dictionary fail."""
+        with pytest.raises(ATONDecodingError):
+            decoder.decode('@schema[a:str]\n\nt(1):\n  #4"rest"')
+
+    def test_decode_unknown_shared_dictionary(self):
+        """Referencing a dictionary the decoder doesn't have fails."""
+        with pytest.raises(ATONDecodingError):
+            ATONDecoder().decode('@dict-ref[v9]\n\n@schema[a:str]\n\nt(1):\n  #0')
+
+    def test_decode_rejects_other_dictionary_same_version(self):
+        """A different dictionary with the same version must not be substituted."""
+        used = SharedDictionary(version=1, entries={"#0": "Electronics"})
+        other = SharedDictionary(version=1, entries={"#0": "Furniture"})
+        encoded = ATONEncoder(shared_dictionary=used).encode(
+            {"items": [{"category": "Electronics"}] * 5}
+        )
+        with pytest.raises(ATONDecodingError, match="Unknown shared dictionary"):
+            ATONDecoder(shared_dictionaries=[other]).decode(encoded)
+
+    def test_dictionary_does_not_leak_between_messages(self, decoder):
+        """Each decode starts without a dictionary."""
+        decoder.decode('@dict[#0:"hello"]\n\n@schema[a:str]\n\nt(1):\n  #0')
+        assert decoder.decode('@schema[a:str]\n\nt(1):\n  #0') == {"t": [{"a": "#0"}]}
+
+
+class TestATONDecoderDeltaColumns:
+    """Tests for delta-encoded columns."""
+
+    def test_decode_delta_columns(self):
+        """ULTRA output with ~delta columns decodes to the original values."""
+        data = {
+            "tx": [
+                {"id": 1000 + i, "ts": 1700000000 + 60 * i, "amount": (i * 37) % 101}
+                for i in range(20)
+            ]
+        }
+        encoded = ATONEncoder(compression=CompressionMode.ULTRA).encode(data)
+        assert "id:int~delta" in encoded
+        assert ATONDecoder().decode(encoded) == data
+
+    def test_decode_handwritten_delta2(self, decoder):
+        """Second-order deltas accumulate twice."""
+        aton = "@schema[ts:int~delta2]\n\nt(4):\n  100\n  10\n  0\n  5"
+        assert decoder.decode(aton) == {"t": [{"ts": 100}, {"ts": 110}, {"ts": 120}, {"ts": 135}]}
+
+    def test_unknown_column_encoding(self, decoder):
+        """Unknown ~codec annotations are rejected."""
+        with pytest.raises(ATONDecodingError):
+            decoder.decode("@schema[ts:int~zigzag]\n\nt(1):\n  1")
+
+
+class TestATONDecoderRunLength:
+    """Tests for run-length encoded tables."""
+
+    def test_decode_runs(self):
+        """ULTRA output with ditto cells and repeat lines decodes exactly."""
+        rows = []
+        for host in ("web-01.prod", "web-02.prod", "db-01.prod"):
+            rows.extend({"host": host, "level": "INFO", "msg": "heartbeat ok"} for _ in range(6))
+        rows[3] = {"host": "web-01.prod", "level": "WARN", "msg": "slow request"}
+        data = {"logs": rows}
+        encoded = ATONEncoder(compression=CompressionMode.ULTRA).encode(data)
+        assert "host:str~rle" in encoded
+        assert "  *" in encoded
+        assert ATONDecoder().decode(encoded) == data
+
+    def test_quoted_caret_is_a_string(self, decoder):
+        """Only a bare ^ is a ditto marker."""
+        aton = '@schema[a:str~rle]\n\nt(3):\n  "x"\n  ^\n  "^"'
+        assert decoder.decode(aton) == {"t": [{"a": "x"}, {"a": "x"}, {"a": "^"}]}
+
+    def test_repeat_line(self, decoder):
+        """*N repeats the previous record N more times."""
+        aton = "@schema[a:int]\n\nt(4):\n  1\n  *2\n  5"
+        assert decoder.decode(aton) == {"t": [{"a": 1}, {"a": 1}, {"a": 1}, {"a": 5}]}
+
+
+class TestATONDecoderPatterns:
+    """Tests for templated string columns."""
+
+    def test_decode_templates(self):
+        """ULTRA output with @pattern templates decodes to the original strings."""
+        data = {
+            "users": [
+                {"id": f"user_{123 + i:06d}",
+                 "avatar": f"https://cdn.example.com/img/{i * 7 % 13}.png",
+                 "sku": "SKU-2024-" + "ABCDEFG"[i % 7] * 3}
+                for i in range(12)
+            ]
+        }
+        encoded = ATONEncoder(compression=CompressionMode.ULTRA).encode(data)
+        assert '@pattern[' in encoded
+        assert encoded.count("cdn.example.com") == 1
+        assert ATONDecoder().decode(encoded) == data
+
+    def test_templates_apply_to_their_table_only(self, decoder):
+        """A table without @pattern doesn't inherit the previous table's."""
+        aton = ('@schema[a:int]\n@pattern[a:"x-{}"]\n\nt(1):\n  1\n\n'
+                '@schema[a:int]\n\nu(1):\n  2')
+        assert decoder.decode(aton) == {"t": [{"a": "x-1"}], "u": [{"a": 2}]}
+
+
 class TestATONDecoderSchemaAndDefaults:
     """Tests for schema and defaults handling."""
 
@@ -3,8 +3,10 @@ ATON Format V2.0 - Encoder Tests
 Tests for ATONEncoder class.
 """
 
+import json
+
 import pytest
-from aton_format import ATONEncoder, CompressionMode
+from aton_format import ATONEncoder, CompressionMode, CompressionStats
 from aton_format.exceptions import ATONEncodingError
 
 
@@ -318,3 +320,65 @@ class TestATONEncoderDefaults:
         }
         result = encoder.encode(data)
         assert isinstance(result, str)
+
+
+class TestATONEncoderStats:
+    """Tests for encode(..., return_stats=True)."""
+
+    def test_returns_text_and_stats(self, encoder, large_dataset):
+        """With return_stats, encode returns the same text plus CompressionStats."""
+        text, stats = encoder.encode(large_dataset, return_stats=True)
+        assert text == encoder.encode(large_dataset)
+        assert isinstance(stats, CompressionStats)
+        assert stats.mode == "balanced"
+        assert stats.compressed_size == len(text)
+
+    def test_sizes_and_savings(self, encoder, large_dataset):
+        """Sizes estimate the JSON input; savings follow from them."""
+        _, stats = encoder.encode(large_dataset, return_stats=True)
+        original = len(json.dumps(large_dataset["records"]))
+        assert abs(stats.original_size - original) <= 0.1 * original
+        assert stats.compression_ratio == stats.compressed_size / stats.original_size
+        assert stats.tokens_saved == round((stats.original_size - stats.compressed_size) / 4)
+
+    def test_original_size_of_one_row(self, encoder):
+        """A sampled row is measured exactly like json.dumps, escapes included."""
+        row = {"name": 'say "hi"', "path": "C:\\tmp", "city": "Zürich", "tab\tkey": 1,
+               "ratio": 0.5, "big": 10 ** 20, "inf": float("inf"), "flag": False,
+               "none": None, "tags": ["a", "b"]}
+        _, stats = encoder.encode({"rows": [row]}, return_stats=True)
+        assert stats.original_size == len(json.dumps([row], default=str))
+
+    def test_original_size_of_small_table(self, encoder):
+        """Tables too small to sample are measured row by row."""
+        rows = [{"id": i, "note": "x" * (i * 7 % 50)} for i in range(100)]
+        _, stats = encoder.encode({"rows": rows}, return_stats=True)
+        assert stats.original_size == len(json.dumps(rows))
+
+    def test_adaptive_reuses_estimated_size(self, employees_data):
+        """ADAPTIVE mode's own size estimate becomes the original size."""
+        encoder = ATONEncoder(compression=CompressionMode.ADAPTIVE)
+        _, metadata = encoder.compression_engine.compress(employees_data)
+        _, stats = encoder.encode(employees_data, return_stats=True)
+        assert stats.original_size == metadata["estimated_size"]
+
+    def test_phase_timings(self, encoder, employees_data):
+        """Every phase is timed in nanoseconds and they add up to the total."""
+        _, stats = encoder.encode(employees_data, return_stats=True)
+        assert set(stats.phase_times_ns) == {"validation", "compression", "inference", "formatting"}
+        assert all(isinstance(t, int) and t >= 0 for t in stats.phase_times_ns.values())
+        assert stats.encoding_time_ms == sum(stats.phase_times_ns.values()) / 1e6
+
+    def test_dictionary_tokens_saved(self, encoder):
+        """The dictionary's own token savings are kept in the metadata."""
+        data = {"items": [{"id": i, "city": "Copenhagen"} for i in range(30)]}
+        _, stats = encoder.encode(data, return_stats=True)
+        assert stats.dictionary_size == 1
+        assert stats.metadata["dictionary_tokens_saved"] > 0
+
+    def test_uncompressed_stats(self, encoder_fast, employees_data):
+        """Without compression there is no dictionary."""
+        _, stats = encoder_fast.encode(employees_data, return_stats=True)
+        assert stats.mode == "fast"
+        assert stats.dictionary_size == 0
+        assert stats.metadata == {}
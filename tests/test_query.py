@@ -3,10 +3,34 @@ ATON Format V2.0 - Query Tests
 Tests for query parser and engine.
 """
 
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-from aton_format.query import ATONQueryEngine, QueryParser
+from aton_format import ATONEncoder
+from aton_format.query import (
+    ATONQueryEngine,
+    LRUCache,
+    ParallelExecutor,
+    QueryParser,
+    QueryTokenizer,
+    normalize_query,
+)
+from aton_format.query.aggregates import Accumulator, HashAggregator, MaxAccumulator, SumAccumulator
+from aton_format.query.index import plan_candidates
+from aton_format.query.parser import TOKEN_REGEX
+from aton_format.query.statistics import collect_statistics, condition_selectivity
 from aton_format.query.operators import QueryOperator, LogicalOperator
-from aton_format.core.types import SortOrder, ParsedQuery
+from aton_format.core.types import (
+    AggregateField,
+    JoinClause,
+    OrderKey,
+    ParsedQuery,
+    QueryCondition,
+    QueryParameter,
+    SortOrder,
+)
 from aton_format.exceptions import ATONQueryError
 
 
@@ -40,6 +64,57 @@ class TestLogicalOperatorEnum:
         assert LogicalOperator.NOT.value == "NOT"
 
 
+class TestQueryTokenizer:
+    """Tests for the single-regex QueryTokenizer."""
+
+    def test_tokenize_keywords_and_values(self):
+        """Keywords, identifiers, values and punctuation should be tokenized."""
+        tokens = QueryTokenizer().tokenize("items WHERE name = 'x' ORDER BY id DESC LIMIT 5")
+        assert tokens == [
+            ("IDENTIFIER", "items"),
+            ("WHERE", "WHERE"),
+            ("IDENTIFIER", "name"),
+            ("OPERATOR", "="),
+            ("STRING", "'x'"),
+            ("ORDER", "ORDER BY"),
+            ("IDENTIFIER", "id"),
+            ("DESC", "DESC"),
+            ("LIMIT", "LIMIT"),
+            ("NUMBER", "5"),
+        ]
+
+    def test_keyword_prefix_is_identifier(self):
+        """Identifiers that start with a keyword should not be split."""
+        tokens = QueryTokenizer().tokenize("orders WHERE inventory > 1")
+        assert tokens[0] == ("IDENTIFIER", "orders")
+        assert tokens[2] == ("IDENTIFIER", "inventory")
+
+    def test_case_insensitive_keywords(self):
+        """Keywords should match regardless of case."""
+        tokens = QueryTokenizer().tokenize("items where id in (1, 2)")
+        assert [t[0] for t in tokens][:4] == ["IDENTIFIER", "WHERE", "IDENTIFIER", "IN"]
+
+    def test_long_in_list(self):
+        """Long IN lists should tokenize completely."""
+        values = ", ".join(str(i) for i in range(5000))
+        tokens = QueryTokenizer().tokenize(f"items WHERE id IN ({values})")
+        assert sum(1 for t in tokens if t[0] == "NUMBER") == 5000
+
+    def test_invalid_character_position(self):
+        """Invalid characters should report their position."""
+        with pytest.raises(ATONQueryError, match="position 9"):
+            QueryTokenizer().tokenize("items id @ 1")
+
+    def test_regex_compiled_once(self, monkeypatch):
+        """Tokenizing uses the module-level regex and compiles nothing."""
+        def fail(*args, **kwargs):
+            raise AssertionError("re.compile called while tokenizing")
+
+        monkeypatch.setattr(re, "compile", fail)
+        assert QueryTokenizer().tokenize("items WHERE id = 1")[0] == ("IDENTIFIER", "items")
+        assert TOKEN_REGEX.groupindex.keys() == {name for name, _ in QueryTokenizer.TOKEN_PATTERNS}
+
+
 class TestQueryParser:
     """Tests for QueryParser class."""
 
@@ -389,3 +464,1138 @@ class TestQueryWithTypes:
 
         assert len(results) == 1
         assert results[0]["name"] == "B"
+
+
+class TestCompiledQuery:
+    """Tests for compiled WHERE predicates."""
+
+    @pytest.mark.parametrize("where", [
+        "price > 100",
+        "price <= 79",
+        "category = 'Electronics'",
+        "category != 'Office'",
+        "name LIKE '%desk%'",
+        "category IN ('Furniture', 'Office')",
+        "price BETWEEN 50 AND 300",
+        "NOT stock < 20",
+        "(price > 100 AND stock > 5) OR category = 'Office'",
+        "missing = 1",
+        "missing != 1",
+    ])
+    def test_predicate_matches_evaluate(self, query_engine, query_test_data, where):
+        """Compiled predicates should agree with AST evaluation."""
+        compiled = query_engine.compile(f"products WHERE {where}")
+        for record in query_test_data["products"]:
+            expected = compiled.query.where_expression.evaluate(record)
+            assert compiled.predicate(record) == expected
+
+    def test_parsed_query_is_immutable(self, query_engine):
+        """Cached parsed queries should not be mutable."""
+        parsed = query_engine.parse("products WHERE price > 1")
+        with pytest.raises(AttributeError):
+            parsed.table = "other"
+
+    def test_execute_accepts_compiled_query(self, query_engine, query_test_data):
+        """execute() should accept both parsed and compiled queries."""
+        compiled = query_engine.compile("products WHERE price > 100")
+        assert query_engine.execute(query_test_data, compiled) == \
+            query_engine.execute(query_test_data, compiled.query)
+
+
+class TestQueryCache:
+    """Tests for the parsed/compiled query LRU cache."""
+
+    def test_repeated_query_hits_cache(self, query_engine):
+        """Repeated queries should be served from the cache."""
+        first = query_engine.compile("products WHERE price > 1")
+        second = query_engine.compile("products WHERE price > 1")
+        assert first is second
+        assert query_engine.query_cache.hits == 1
+        assert query_engine.query_cache.misses == 1
+
+    def test_normalized_whitespace_shares_entry(self, query_engine):
+        """Whitespace and @query wrappers should not create new entries."""
+        first = query_engine.compile("products  WHERE\n price > 1")
+        second = query_engine.compile("@query[products WHERE price > 1]")
+        assert first is second
+        assert query_engine.query_cache.size == 1
+
+    def test_cached_query_is_immutable(self, query_engine):
+        """Cached queries hold tuples, so one caller cannot change another's."""
+        parsed = query_engine.parse(
+            "products SELECT name WHERE id IN (1, 2) AND price > 1 ORDER BY name"
+        )
+        assert isinstance(parsed.select_fields, tuple)
+        assert isinstance(parsed.order_keys, tuple)
+        assert isinstance(parsed.where_expression.conditions, tuple)
+        assert parsed.where_expression.conditions[0].value == (1, 2)
+        with pytest.raises(AttributeError):
+            parsed.select_fields.append("price")
+
+    def test_string_literals_not_normalized(self):
+        """Whitespace inside string literals should be preserved."""
+        assert normalize_query("t WHERE a = 'x  y'") == "t WHERE a = 'x  y'"
+
+    def test_eviction(self):
+        """Least recently used entries should be evicted at capacity."""
+        engine = ATONQueryEngine(cache_size=2)
+        engine.parse("a")
+        engine.parse("b")
+        engine.parse("a")
+        engine.parse("c")
+        stats = engine.query_cache.stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 1
+        engine.parse("a")
+        assert engine.query_cache.hits == 2
+
+    def test_parse_errors_not_cached(self, query_engine):
+        """Failed parses should raise every time and not be cached."""
+        for _ in range(2):
+            with pytest.raises(ATONQueryError):
+                query_engine.parse("WHERE id = 1")
+        assert query_engine.query_cache.size == 0
+
+    def test_invalid_maxsize(self):
+        """Cache size must be positive."""
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
+
+    def test_get_or_create_concurrent_miss(self):
+        """Threads racing on one missing key should all get the stored value."""
+        cache = LRUCache(maxsize=4)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            values = list(pool.map(lambda _: cache.get_or_create("k", object), range(64)))
+        assert all(v is values[0] for v in values)
+        assert cache.size == 1
+
+
+class TestQueryIndexes:
+    """Tests for hash/sorted secondary indexes on registered tables."""
+
+    QUERIES = [
+        "products WHERE category = 'Office'",
+        "products WHERE category IN ('Office', 'Furniture')",
+        "products WHERE price < 80",
+        "products WHERE price >= 299",
+        "products WHERE price BETWEEN 12 AND 399",
+        "products WHERE price > 50 AND category = 'Electronics'",
+        "products WHERE category = 'Office' OR price > 500",
+        "products WHERE NOT category = 'Office'",
+        "products WHERE price = 49",
+    ]
+
+    @pytest.fixture
+    def indexed_engine(self, query_test_data):
+        engine = ATONQueryEngine()
+        engine.register_table("products", list(query_test_data["products"]))
+        engine.create_index("products", "category", kind="hash")
+        engine.create_index("products", "price", kind="sorted")
+        return engine
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_indexed_results_match_scan(self, indexed_engine, query_test_data, query):
+        """Indexed execution should return exactly the full-scan result."""
+        parsed = indexed_engine.parse(query)
+        expected = ATONQueryEngine().execute(query_test_data, parsed)
+        assert indexed_engine.execute(None, parsed) == expected
+
+    def test_planner_narrows_candidates(self, indexed_engine):
+        """Indexable conditions should yield a small candidate set."""
+        parsed = indexed_engine.parse("products WHERE price > 50 AND category = 'Office'")
+        positions = plan_candidates(parsed.where_expression, indexed_engine.indexes["products"])
+        assert positions == [6, 7]
+
+    def test_planner_falls_back_without_index(self, indexed_engine):
+        """Conditions on unindexed fields should not be planned."""
+        parsed = indexed_engine.parse("products WHERE stock > 5")
+        assert plan_candidates(parsed.where_expression, indexed_engine.indexes["products"]) is None
+
+    def test_append_maintains_indexes(self, indexed_engine):
+        """Appended rows should be visible through the indexes."""
+        indexed_engine.append("products", [
+            {"id": 9, "name": "Stapler", "price": 7, "stock": 40, "category": "Office"},
+        ])
+        results = indexed_engine.execute(None, indexed_engine.parse(
+            "products WHERE category = 'Office' AND price < 10"
+        ))
+        assert [r["id"] for r in results] == [7, 9]
+
+    def test_direct_list_append_is_indexed(self, indexed_engine):
+        """Rows appended to the registered list directly should be caught up."""
+        indexed_engine.tables["products"].append(
+            {"id": 10, "name": "Lamp", "price": 1, "stock": 1, "category": "Office"}
+        )
+        results = indexed_engine.execute(None, indexed_engine.parse("products WHERE price < 6"))
+        assert [r["id"] for r in results] == [7, 10]
+
+    @pytest.mark.parametrize("kind", ["hash", "sorted"])
+    def test_concurrent_catch_up(self, kind):
+        """Threads catching up with direct appends should index each row once."""
+        engine = ATONQueryEngine()
+        rows = [{"id": i, "cat": i % 10} for i in range(1000)]
+        engine.register_table("t", rows)
+        engine.create_index("t", "cat", kind=kind)
+        rows.extend({"id": i, "cat": i % 10} for i in range(1000, 200_000))
+        query = engine.compile("t WHERE cat = 3")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            counts = list(pool.map(lambda _: len(engine.execute(None, query)), range(8)))
+        assert counts == [20_000] * 8
+
+    def test_sorted_index_null_lookup_scans(self):
+        """NULLs are not in a sorted index, so = NULL falls back to a scan."""
+        engine = ATONQueryEngine()
+        engine.register_table("t", [{"v": None}, {"v": None}])
+        engine.create_index("t", "v", kind="sorted")
+        parsed = engine.parse("t WHERE v = NULL")
+        assert plan_candidates(parsed.where_expression, engine.indexes["t"]) is None
+        assert engine.execute(None, parsed) == [{"v": None}, {"v": None}]
+
+    def test_sorted_index_mixed_types_falls_back(self):
+        """Incomparable values should disable the sorted index, not break queries."""
+        engine = ATONQueryEngine()
+        engine.register_table("t", [{"v": 1}, {"v": "a"}, {"v": 3}])
+        index = engine.create_index("t", "v", kind="sorted")
+        assert index.valid is False
+        results = engine.execute(None, engine.parse("t WHERE v = 3"))
+        assert results == [{"v": 3}]
+
+    def test_hash_index_handles_null_and_missing(self):
+        """NULL equality should use the index, missing fields never match."""
+        engine = ATONQueryEngine()
+        engine.register_table("t", [{"v": None}, {}, {"v": 2}, {"v": [1]}])
+        engine.create_index("t", "v")
+        assert engine.execute(None, engine.parse("t WHERE v = NULL")) == [{"v": None}]
+
+    def test_create_index_errors(self, indexed_engine):
+        """Unknown kinds and unregistered tables should raise."""
+        with pytest.raises(ValueError):
+            indexed_engine.create_index("products", "price", kind="btree")
+        with pytest.raises(ATONQueryError):
+            indexed_engine.create_index("missing", "price")
+
+    def test_drop_index(self, indexed_engine):
+        """Dropped indexes should no longer be planned."""
+        indexed_engine.drop_index("products", "category")
+        parsed = indexed_engine.parse("products WHERE category = 'Office'")
+        assert plan_candidates(parsed.where_expression, indexed_engine.indexes["products"]) is None
+
+    def test_unregistered_data_is_scanned(self, indexed_engine, query_test_data):
+        """Passing a different data dict should bypass the indexes."""
+        parsed = indexed_engine.parse("products WHERE category = 'Office'")
+        results = indexed_engine.execute({"products": query_test_data["products"][:7]}, parsed)
+        assert [r["id"] for r in results] == [7]
+
+
+class TestTopKExecution:
+    """Tests for heap-based ORDER BY ... LIMIT execution."""
+
+    @pytest.fixture
+    def ratings(self):
+        return {
+            "products": [
+                {"id": i, "rating": (i * 37) % 101, "name": f"p{i}"}
+                for i in range(2000)
+            ]
+        }
+
+    @pytest.mark.parametrize("direction", ["ASC", "DESC"])
+    @pytest.mark.parametrize("limit,offset", [(5, 0), (50, 0), (10, 20), (1500, 0)])
+    def test_topk_matches_full_sort(self, query_engine, ratings, direction, limit, offset):
+        """Top-K results should equal a stable full sort, ties included."""
+        parsed = query_engine.parse(
+            f"products ORDER BY rating {direction} LIMIT {limit} OFFSET {offset}"
+        )
+        expected = sorted(ratings["products"], key=lambda r: r["rating"],
+                          reverse=direction == "DESC")[offset:offset + limit]
+        assert query_engine.execute(ratings, parsed) == expected
+
+    def test_order_by_unselected_field(self, query_engine, ratings):
+        """Sorting should use fields that are not in the SELECT list."""
+        parsed = query_engine.parse("products SELECT id ORDER BY rating DESC LIMIT 3")
+        results = query_engine.execute(ratings, parsed)
+        by_id = {r["id"]: r["rating"] for r in ratings["products"]}
+        assert list(results[0]) == ["id"]
+        assert [by_id[r["id"]] for r in results] == [100, 100, 100]
+
+    def test_projection_after_limit(self, query_engine, ratings):
+        """Projection should only build dicts for returned rows."""
+        parsed = query_engine.parse("products SELECT id, name ORDER BY id LIMIT 2")
+        results = query_engine.execute(ratings, parsed)
+        assert results == [{"id": 0, "name": "p0"}, {"id": 1, "name": "p1"}]
+
+
+class TestMultiKeyOrdering:
+    """Tests for multi-key ORDER BY and NULL ordering."""
+
+    @pytest.fixture
+    def people(self):
+        return {"people": [
+            {"id": 1, "team": "b", "age": 30},
+            {"id": 2, "team": "a", "age": None},
+            {"id": 3, "team": "b", "age": 25},
+            {"id": 4, "team": "a", "age": 41},
+            {"id": 5, "age": 25},
+            {"id": 6, "team": "a", "age": 41},
+        ]}
+
+    def ids(self, engine, data, query):
+        return [r["id"] for r in engine.execute(data, engine.parse(query))]
+
+    def test_parse_order_keys(self, query_parser):
+        """Every key should keep its direction and NULL placement."""
+        parsed = query_parser.parse("people ORDER BY team DESC, age NULLS FIRST, id ASC")
+        assert parsed.order_keys == (
+            OrderKey("team", SortOrder.DESC),
+            OrderKey("age", SortOrder.ASC, nulls_first=True),
+            OrderKey("id", SortOrder.ASC),
+        )
+        assert (parsed.order_by, parsed.order_direction) == ("team", SortOrder.DESC)
+
+    def test_invalid_nulls_position(self, query_parser):
+        """Only NULLS FIRST and NULLS LAST should be accepted."""
+        with pytest.raises(ATONQueryError, match="NULLS"):
+            query_parser.parse("people ORDER BY age NULLS MIDDLE")
+
+    def test_nulls_as_field_name(self, query_engine):
+        """NULLS is only a keyword after an ORDER BY key."""
+        data = {"t": [{"id": 1, "nulls": 3}, {"id": 2, "nulls": 1}, {"id": 3, "nulls": None}]}
+        parsed = query_engine.parse("t WHERE nulls > 0 ORDER BY nulls NULLS FIRST")
+        assert [r["id"] for r in query_engine.execute(data, parsed)] == [2, 1]
+        parsed = query_engine.parse("t ORDER BY nulls DESC NULLS FIRST")
+        assert [r["id"] for r in query_engine.execute(data, parsed)] == [3, 1, 2]
+
+    def test_mixed_directions(self, query_engine, people):
+        """Later keys should break ties of earlier ones in their own direction."""
+        ids = self.ids(query_engine, people, "people ORDER BY team, age DESC")
+        assert ids == [4, 6, 2, 1, 3, 5]
+
+    def test_nulls_last_by_default(self, query_engine, people):
+        """NULL and missing values should sort last in both directions."""
+        assert self.ids(query_engine, people, "people ORDER BY age")[-1] == 2
+        assert self.ids(query_engine, people, "people ORDER BY age DESC")[-1] == 2
+        assert self.ids(query_engine, people, "people ORDER BY team DESC")[-1] == 5
+
+    def test_nulls_first(self, query_engine, people):
+        """NULLS FIRST should put NULL and missing values first."""
+        assert self.ids(query_engine, people, "people ORDER BY team NULLS FIRST, id")[0] == 5
+        ids = self.ids(query_engine, people, "people ORDER BY age DESC NULLS FIRST")
+        assert ids == [2, 4, 6, 1, 3, 5]
+
+    def test_mixed_types_do_not_raise(self, query_engine):
+        """Numbers, strings and other values should order without TypeError."""
+        values = ["b", 3, None, 1.5, "a", [1], {"k": 1}]
+        data = {"t": [{"id": i, "v": v} for i, v in enumerate(values)]}
+        assert self.ids(query_engine, data, "t ORDER BY v") == [3, 1, 4, 0, 6, 5, 2]
+
+    @pytest.mark.parametrize("order", ["team, age", "age DESC, team DESC NULLS FIRST",
+                                       "team DESC, id"])
+    def test_topk_matches_full_sort(self, query_engine, order):
+        """Top-K selection should return the prefix of the full sort."""
+        rows = [{"id": i, "team": [None, "a", "b", 7][i % 4], "age": (i * 37) % 11 or None}
+                for i in range(400)]
+        data = {"t": rows}
+        full = self.ids(query_engine, data, f"t ORDER BY {order}")
+        assert self.ids(query_engine, data, f"t ORDER BY {order} LIMIT 5") == full[:5]
+
+    def test_hand_built_order_by(self, query_engine, people):
+        """order_by/order_direction alone should still sort."""
+        parsed = ParsedQuery(table="people", order_by="id", order_direction=SortOrder.DESC)
+        assert [r["id"] for r in query_engine.execute(people, parsed)] == [6, 5, 4, 3, 2, 1]
+
+
+class TestLazyExecution:
+    """Tests for the iterator-based execute_iter pipeline."""
+
+    def test_execute_iter_matches_execute(self, query_engine, query_test_data):
+        """execute_iter should yield the same rows as execute."""
+        parsed = query_engine.parse(
+            "products SELECT name WHERE price > 10 LIMIT 3 OFFSET 1"
+        )
+        assert list(query_engine.execute_iter(query_test_data, parsed)) == \
+            query_engine.execute(query_test_data, parsed)
+
+    def test_limit_stops_reading_source(self, query_engine):
+        """Without ORDER BY the source should not be read past LIMIT matches."""
+        consumed = []
+
+        def source():
+            for i in range(1_000_000):
+                consumed.append(i)
+                yield {"id": i, "even": i % 2 == 0}
+
+        parsed = query_engine.parse("items WHERE even = true LIMIT 10")
+        results = query_engine.execute({"items": source()}, parsed)
+        assert [r["id"] for r in results] == list(range(0, 20, 2))
+        assert len(consumed) == 19
+
+    def test_bare_iterable_source(self, query_engine):
+        """A bare iterable of records should be accepted as the source."""
+        rows = ({"id": i} for i in range(100))
+        parsed = query_engine.parse("items WHERE id >= 95 ORDER BY id DESC LIMIT 2")
+        assert query_engine.execute(rows, parsed) == [{"id": 99}, {"id": 98}]
+
+    def test_execute_iter_is_lazy(self, query_engine):
+        """execute_iter should return an iterator, not a list."""
+        parsed = query_engine.parse("items")
+        result = query_engine.execute_iter({"items": iter([{"id": 1}])}, parsed)
+        assert iter(result) is result
+        assert next(result) == {"id": 1}
+
+    def test_missing_table_raises_eagerly(self, query_engine):
+        """Unknown tables should raise when execute_iter is called."""
+        with pytest.raises(ATONQueryError):
+            query_engine.execute_iter({}, query_engine.parse("items"))
+
+
+class TestColumnarExecution:
+    """Tests for the optional NumPy columnar backend."""
+
+    QUERIES = [
+        "metrics WHERE value > 50",
+        "metrics WHERE value <= 10 OR bucket = 3",
+        "metrics WHERE NOT bucket IN (1, 2) AND value BETWEEN 20 AND 80",
+        "metrics WHERE NOT bucket IN (1) LIMIT 5",
+        "metrics WHERE host LIKE '%-1%'",
+        "metrics WHERE host = 'web-2' ORDER BY value DESC",
+        "metrics ORDER BY value ASC LIMIT 7 OFFSET 3",
+        "metrics ORDER BY bucket DESC LIMIT 12",
+        "metrics SELECT host, value WHERE missing = 1",
+        "metrics SELECT id, missing ORDER BY value LIMIT 4",
+        "metrics ORDER BY bucket DESC, value ASC LIMIT 9",
+        "metrics ORDER BY host, value DESC",
+    ]
+
+    @pytest.fixture
+    def np(self):
+        return pytest.importorskip("numpy")
+
+    @pytest.fixture
+    def rows(self):
+        return [
+            {"id": i, "value": (i * 37) % 101, "bucket": i % 5, "host": f"web-{i % 3}"}
+            for i in range(300)
+        ]
+
+    @pytest.fixture
+    def columns(self, np, rows):
+        return {
+            "metrics": {
+                "id": np.array([r["id"] for r in rows]),
+                "value": np.array([r["value"] for r in rows], dtype=float),
+                "bucket": np.array([r["bucket"] for r in rows]),
+                "host": np.array([r["host"] for r in rows]),
+            }
+        }
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_matches_row_engine(self, query_engine, rows, columns, query):
+        """Columnar results should equal the row-by-row engine's results."""
+        parsed = query_engine.parse(query)
+        expected = query_engine.execute({"metrics": rows}, parsed)
+        if not parsed.select_fields:
+            expected = [{**r, "value": float(r["value"])} for r in expected]
+        assert query_engine.execute_columnar(columns, parsed) == expected
+
+    def test_index_array_result(self, np, query_engine, columns):
+        """materialize=False should return the row index array."""
+        parsed = query_engine.parse("metrics WHERE bucket = 0 ORDER BY id DESC LIMIT 3")
+        indices = query_engine.execute_columnar(columns, parsed, materialize=False)
+        assert isinstance(indices, np.ndarray)
+        assert indices.tolist() == [295, 290, 285]
+
+    def test_object_column_with_nulls(self, np, query_engine):
+        """None entries in object columns should never satisfy comparisons."""
+        data = {"t": {"v": np.array([1, None, 5], dtype=object)}}
+        parsed = query_engine.parse("t WHERE v > 0")
+        assert query_engine.execute_columnar(data, parsed) == [{"v": 1}, {"v": 5}]
+
+    @pytest.mark.parametrize("query", [
+        "t ORDER BY p",
+        "t ORDER BY p DESC",
+        "t ORDER BY p NULLS FIRST",
+        "t ORDER BY p DESC LIMIT 2",
+        "t ORDER BY p NULLS FIRST LIMIT 3",
+        "t ORDER BY g, p DESC NULLS FIRST",
+    ])
+    def test_nullable_sort_column(self, np, query_engine, query):
+        """NULLs in a sort column should land where the row engine puts them."""
+        rows = [{"id": i, "g": i % 2, "p": [3, None, 1, 7, None, 2][i]} for i in range(6)]
+        data = {"t": {name: np.array([r[name] for r in rows], dtype=object)
+                      for name in ("id", "g", "p")}}
+        parsed = query_engine.parse(query)
+        expected = query_engine.execute({"t": rows}, parsed)
+        assert query_engine.execute_columnar(data, parsed) == expected
+
+    def test_mixed_sort_column_rejected(self, np, query_engine):
+        """Sort columns numpy cannot order should raise a query error."""
+        data = {"t": {"v": np.array([1, "a", 2], dtype=object)}}
+        with pytest.raises(ATONQueryError):
+            query_engine.execute_columnar(data, query_engine.parse("t ORDER BY v"))
+
+    def test_not_in_condition(self, np, query_engine):
+        """NOT IN conditions should be vectorized as negated membership."""
+        query = ParsedQuery(table="t", where_expression=QueryCondition("v", "NOT IN", [1, 3]))
+        data = {"t": {"v": np.arange(5)}}
+        assert query_engine.execute_columnar(data, query, materialize=False).tolist() == [0, 2, 4]
+
+    def test_ragged_columns_rejected(self, np, query_engine):
+        """Columns of different lengths should raise a query error."""
+        data = {"t": {"a": np.arange(3), "b": np.arange(4)}}
+        with pytest.raises(ATONQueryError):
+            query_engine.execute_columnar(data, query_engine.parse("t"))
+
+
+class TestAggregation:
+    """Tests for COUNT/SUM/AVG/MIN/MAX and GROUP BY."""
+
+    def test_parse_aggregates(self, query_parser):
+        """Aggregates should be parsed with default and explicit aliases."""
+        parsed = query_parser.parse(
+            "products SELECT category, COUNT(*), AVG(price) AS avg GROUP BY category"
+        )
+        assert parsed.select_fields == ("category", "count", "avg")
+        assert parsed.aggregates == (
+            AggregateField("COUNT", None, "count"),
+            AggregateField("AVG", "price", "avg"),
+        )
+        assert parsed.group_by == ("category",)
+
+    def test_parse_select_from_form(self, query_parser):
+        """SQL-style SELECT ... FROM table should be accepted."""
+        parsed = query_parser.parse("SELECT name, price FROM products WHERE price > 5")
+        assert parsed.table == "products"
+        assert parsed.select_fields == ("name", "price")
+
+    def test_ungrouped_field_rejected(self, query_parser):
+        """Plain fields must be grouped when aggregating."""
+        with pytest.raises(ATONQueryError):
+            query_parser.parse("products SELECT name, COUNT(*) GROUP BY category")
+
+    def test_trailing_tokens_rejected(self, query_parser):
+        """Clauses in an unsupported position should not be silently ignored."""
+        with pytest.raises(ATONQueryError):
+            query_parser.parse("products WHERE price > 5 SELECT name")
+
+    def test_as_is_a_field_outside_select(self, query_engine):
+        """AS is only a keyword after an aggregate; elsewhere it names a field."""
+        data = {"items": [{"as": 1, "v": 2}, {"as": 2, "v": 3}]}
+        parsed = query_engine.parse("items WHERE as = 1")
+        assert query_engine.execute(data, parsed) == [{"as": 1, "v": 2}]
+        parsed = query_engine.parse("items SELECT as, SUM(v) AS total GROUP BY as")
+        assert query_engine.execute(data, parsed) == [{"as": 1, "total": 2}, {"as": 2, "total": 3}]
+
+    def test_group_by_execution(self, query_engine, query_test_data):
+        """Groups should be aggregated in first-seen order."""
+        parsed = query_engine.parse(
+            "products SELECT category, COUNT(*), SUM(stock), MIN(price), MAX(price) "
+            "GROUP BY category"
+        )
+        results = query_engine.execute(query_test_data, parsed)
+        assert results == [
+            {"category": "Electronics", "count": 4, "sum_stock": 175,
+             "min_price": 49, "max_price": 1299},
+            {"category": "Furniture", "count": 2, "sum_stock": 18,
+             "min_price": 299, "max_price": 599},
+            {"category": "Office", "count": 2, "sum_stock": 700,
+             "min_price": 5, "max_price": 12},
+        ]
+
+    def test_aggregate_without_group_by(self, query_engine, query_test_data):
+        """Aggregates without GROUP BY should produce a single row."""
+        parsed = query_engine.parse("SELECT COUNT(*), AVG(stock) FROM products WHERE price < 100")
+        assert query_engine.execute(query_test_data, parsed) == [{"count": 4, "avg_stock": 212.5}]
+
+    def test_aggregate_empty_input(self, query_engine):
+        """Global aggregates over no rows follow SQL semantics."""
+        parsed = query_engine.parse("items SELECT COUNT(*), SUM(v), AVG(v)")
+        assert query_engine.execute({"items": []}, parsed) == [
+            {"count": 0, "sum_v": None, "avg_v": None}
+        ]
+
+    def test_count_field_skips_nulls(self, query_engine):
+        """COUNT(field) should count non-null values only."""
+        data = {"items": [{"v": 1}, {"v": None}, {}]}
+        parsed = query_engine.parse("items SELECT COUNT(v), COUNT(*)")
+        assert query_engine.execute(data, parsed) == [{"count_v": 1, "count": 3}]
+
+    def test_order_and_limit_on_aggregates(self, query_engine, query_test_data):
+        """ORDER BY and LIMIT should apply to aggregated rows."""
+        parsed = query_engine.parse(
+            "products SELECT category, SUM(stock) AS total GROUP BY category "
+            "ORDER BY total DESC LIMIT 2"
+        )
+        results = query_engine.execute(query_test_data, parsed)
+        assert [r["category"] for r in results] == ["Office", "Electronics"]
+
+    def test_merge_partial_aggregates(self):
+        """Partial aggregators should merge into the single-pass result."""
+        rows = [{"g": i % 3, "v": i} for i in range(30)]
+        aggregates = [AggregateField("AVG", "v", "avg_v"), AggregateField("MAX", "v", "max_v")]
+        whole = HashAggregator(["g"], aggregates).consume(rows).results()
+        left = HashAggregator(["g"], aggregates).consume(rows[:10])
+        right = HashAggregator(["g"], aggregates).consume(rows[10:])
+        assert left.merge(right).results() == whole
+
+    def test_accumulator_contract(self):
+        """Accumulator is abstract and only merges accumulators of its kind."""
+        with pytest.raises(TypeError):
+            Accumulator()
+        with pytest.raises(TypeError):
+            SumAccumulator().merge(MaxAccumulator())
+
+    def test_encode_aggregated_result(self, encoder, decoder, query_test_data):
+        """Aggregated tables should encode through the normal encoder."""
+        aton = encoder.encode_with_query(
+            query_test_data, "products SELECT category, COUNT(*) GROUP BY category"
+        )
+        decoded = decoder.decode(aton)
+        assert {r["category"]: r["count"] for r in decoded["products"]} == {
+            "Electronics": 4, "Furniture": 2, "Office": 2
+        }
+
+
+class TestJoins:
+    """Tests for hash joins across tables."""
+
+    @pytest.fixture
+    def shop(self):
+        return {
+            "orders": [
+                {"id": 1, "customer_id": 10, "total": 250},
+                {"id": 2, "customer_id": 20, "total": 40},
+                {"id": 3, "customer_id": 10, "total": 90},
+                {"id": 4, "customer_id": 99, "total": 15},
+            ],
+            "customers": [
+                {"id": 10, "name": "Ada", "country": "IT"},
+                {"id": 20, "name": "Linus", "country": "FI"},
+                {"id": 30, "name": "Grace", "country": "US"},
+            ],
+        }
+
+    def test_parse_join(self, query_parser):
+        """JOIN clauses should be parsed with qualified field names."""
+        parsed = query_parser.parse(
+            "orders JOIN customers ON orders.customer_id = customers.id SELECT orders.id"
+        )
+        assert parsed.joins == (JoinClause("customers", "orders.customer_id", "customers.id"),)
+        assert parsed.select_fields == ("orders.id",)
+
+    def test_parse_arrow_reference(self, query_parser):
+        """-> and the arrow character should be accepted as join references."""
+        for arrow in ("->", "→"):
+            parsed = query_parser.parse(
+                f"orders LEFT JOIN customers ON customer_id {arrow} customers.id"
+            )
+            assert parsed.joins[0].kind == "LEFT"
+            assert parsed.joins[0].left_field == "customer_id"
+
+    def test_inner_join_with_pushdown(self, query_engine, shop):
+        """Only selected fields should be returned, in left-major order."""
+        parsed = query_engine.parse(
+            "SELECT orders.id, name FROM orders JOIN customers "
+            "ON orders.customer_id = customers.id WHERE country = 'IT'"
+        )
+        assert query_engine.execute(shop, parsed) == [
+            {"orders.id": 1, "name": "Ada"},
+            {"orders.id": 3, "name": "Ada"},
+        ]
+
+    def test_build_side_does_not_change_order(self, query_engine, shop):
+        """Results should not depend on which side the hash table is built on."""
+        parsed = query_engine.parse(
+            "orders JOIN customers ON customer_id = customers.id SELECT orders.id, name"
+        )
+        small_left = dict(shop, orders=shop["orders"][:2])
+        assert [r["orders.id"] for r in query_engine.execute(small_left, parsed)] == [1, 2]
+        assert [r["orders.id"] for r in query_engine.execute(shop, parsed)] == [1, 2, 3]
+
+    def test_join_without_select_uses_qualified_names(self, query_engine, shop):
+        """Without SELECT every field should be kept under table.field."""
+        parsed = query_engine.parse(
+            "orders JOIN customers ON customer_id -> customers.id WHERE total > 100"
+        )
+        assert query_engine.execute(shop, parsed) == [{
+            "orders.id": 1, "orders.customer_id": 10, "orders.total": 250,
+            "customers.id": 10, "customers.name": "Ada", "customers.country": "IT",
+        }]
+
+    def test_left_join_pads_nulls(self, query_engine, shop):
+        """Unmatched left rows should be kept with NULL right fields."""
+        parsed = query_engine.parse(
+            "orders LEFT JOIN customers ON customer_id = customers.id "
+            "SELECT orders.id, name WHERE name = NULL"
+        )
+        assert query_engine.execute(shop, parsed) == [{"orders.id": 4, "name": None}]
+
+    def test_join_with_aggregation(self, query_engine, shop):
+        """Joined rows should feed GROUP BY like any other rows."""
+        parsed = query_engine.parse(
+            "SELECT country, SUM(total) AS revenue FROM orders JOIN customers "
+            "ON customer_id = customers.id GROUP BY country ORDER BY revenue DESC"
+        )
+        assert query_engine.execute(shop, parsed) == [
+            {"country": "IT", "revenue": 340},
+            {"country": "FI", "revenue": 40},
+        ]
+
+    def test_ambiguous_field_rejected(self, query_engine, shop):
+        """Unqualified fields present in both tables should raise."""
+        parsed = query_engine.parse(
+            "orders JOIN customers ON customer_id = customers.id SELECT id"
+        )
+        with pytest.raises(ATONQueryError, match="Ambiguous"):
+            query_engine.execute(shop, parsed)
+
+    def test_join_keywords_as_field_names(self, query_engine):
+        """LEFT, ON, JOIN and INNER are keywords only in the join clause."""
+        data = {
+            "edges": [{"left": 1, "on": True}, {"left": 2, "on": False}],
+            "nodes": [{"id": 1, "join": "a"}, {"id": 2, "join": "b"}],
+        }
+        parsed = query_engine.parse("edges SELECT left WHERE on = true")
+        assert query_engine.execute(data, parsed) == [{"left": 1}]
+        parsed = query_engine.parse(
+            "SELECT left, join FROM edges LEFT JOIN nodes ON left = nodes.id WHERE on = false"
+        )
+        assert query_engine.execute(data, parsed) == [{"left": 2, "join": "b"}]
+
+    def test_missing_join_table(self, query_engine, shop):
+        """Joining an unknown table should raise."""
+        parsed = query_engine.parse("orders JOIN users ON customer_id = users.id")
+        with pytest.raises(ATONQueryError):
+            query_engine.execute(shop, parsed)
+
+    def test_encode_joined_result(self, encoder, decoder, shop):
+        """Joined rows should encode and decode through the normal codec."""
+        aton = encoder.encode_with_query(
+            shop, "orders JOIN customers ON customer_id = customers.id SELECT orders.id, name"
+        )
+        assert decoder.decode(aton)["orders"][0] == {"orders.id": 1, "name": "Ada"}
+
+
+class TestQueryStatistics:
+    """Tests for column statistics and cost-based predicate ordering."""
+
+    @pytest.fixture
+    def engine(self):
+        engine = ATONQueryEngine()
+        engine.register_table("items", [
+            {
+                "id": i,
+                "status": "open" if i % 2 else "closed",
+                "price": i % 100,
+                "note": None if i % 4 else f"note {i}",
+            }
+            for i in range(2000)
+        ])
+        return engine
+
+    def test_column_statistics(self):
+        """Statistics should capture distinct counts, bounds and nulls."""
+        stats = collect_statistics([
+            {"a": 1, "b": "x"}, {"a": 5, "b": None}, {"a": 3}, {"a": 5, "b": "y"},
+        ])
+        assert stats.row_count == 4
+        assert stats.columns["a"].min_value == 1
+        assert stats.columns["a"].max_value == 5
+        assert stats.columns["a"].distinct_count == 3
+        assert stats.columns["b"].presence == 0.75
+        assert stats.columns["b"].null_fraction == pytest.approx(1 / 3)
+
+    def test_selectivity_estimates(self, engine):
+        """Equality, range and missing-field estimates should follow the stats."""
+        stats = engine.analyze("items")
+        assert condition_selectivity(QueryCondition("status", "=", "open"), stats) == 0.5
+        assert condition_selectivity(QueryCondition("id", "=", 7), stats) < 0.01
+        low = condition_selectivity(QueryCondition("price", "<", 10), stats)
+        assert low == pytest.approx(10 / 99)
+        assert condition_selectivity(QueryCondition("nope", "=", 1), stats) == 0.0
+
+    def test_and_puts_selective_condition_first(self, engine):
+        """The most selective cheap conjunct should be evaluated first."""
+        compiled = engine.compile("items WHERE status = 'open' AND id = 7")
+        assert [c.field for c in compiled.plan.conditions] == ["id", "status"]
+        assert compiled.query.where_expression.conditions[0].field == "status"
+
+    def test_expensive_like_runs_last(self, engine):
+        """LIKE should move behind cheaper conditions in an AND."""
+        compiled = engine.compile("items WHERE note LIKE '%1%' AND price < 50")
+        assert [c.operator for c in compiled.plan.conditions] == ["<", "LIKE"]
+
+    def test_or_puts_likely_condition_first(self, engine):
+        """The disjunct most likely to be true should be evaluated first."""
+        compiled = engine.compile("items WHERE id = 3 OR status = 'closed'")
+        assert [c.field for c in compiled.plan.conditions] == ["status", "id"]
+
+    def test_reordered_results_unchanged(self, engine):
+        """Reordering must not change the rows a query returns."""
+        query = ("items WHERE note LIKE '%2%' AND (price < 30 OR status = 'open') "
+                 "AND id > 100")
+        compiled = engine.compile(query)
+        expected = [r for r in engine.tables["items"]
+                    if compiled.query.where_expression.evaluate(r)]
+        assert engine.execute(None, compiled) == expected
+
+    def test_guarded_comparison_not_reordered(self):
+        """A comparison on a mixed-type column must stay behind its guard."""
+        rows = [{"kind": "num", "v": i} if i % 2 else {"kind": "str", "v": str(i)}
+                for i in range(88)]
+        query = "items WHERE kind = 'num' AND v > 10"
+        plain = ATONQueryEngine()
+        expected = plain.execute({"items": rows}, plain.parse(query))
+        assert len(expected) == 39
+        engine = ATONQueryEngine()
+        engine.register_table("items", rows)
+        engine.analyze("items")
+        compiled = engine.compile(query)
+        assert engine.execute(None, compiled) == expected
+        assert [c.field for c in compiled.plan.conditions] == ["kind", "v"]
+
+    def test_guard_for_types_missing_from_sample(self):
+        """Rare types outside the statistics sample must not raise when guarded."""
+        rows = [{"kind": "n", "v": i % 50} for i in range(20000)]
+        rows += [{"kind": "s", "v": "text"}] * 5
+        engine = ATONQueryEngine()
+        engine.register_table("t", rows)
+        engine.analyze("t")
+        compiled = engine.compile("t WHERE kind = 'n' AND v > 48")
+        assert [c.field for c in compiled.plan.conditions] == ["v", "kind"]
+        assert len(engine.execute(None, compiled)) == 400
+        prepared = engine.prepare("t WHERE kind = ? AND v > ?")
+        assert len(engine.execute(None, prepared, ["n", 48])) == 400
+        with pytest.raises(TypeError):
+            engine.execute(None, engine.compile("t WHERE v > 48 AND kind = 'n'"))
+
+    def test_statistics_refreshed_after_growth(self, engine):
+        """Cached plans should be re-planned once the table grows noticeably."""
+        first = engine.compile("items WHERE id = 7")
+        engine.append("items", [{"id": i} for i in range(2000, 3000)])
+        second = engine.compile("items WHERE id = 7")
+        assert second.stats is not first.stats
+        assert second.stats.row_count == 3000
+
+    def test_unregistered_data_keeps_textual_order(self):
+        """Without statistics conditions keep the order they were written in."""
+        compiled = ATONQueryEngine().compile("t WHERE a LIKE 'x%' AND b = 1")
+        assert compiled.stats is None
+        assert [c.field for c in compiled.plan.conditions] == ["a", "b"]
+
+    def test_explain(self, engine):
+        """EXPLAIN should list conditions in evaluation order with estimates."""
+        engine.create_index("items", "status")
+        plan = engine.explain(
+            "EXPLAIN items WHERE note LIKE '%1%' AND status = 'open' "
+            "ORDER BY price DESC LIMIT 5"
+        )
+        lines = plan.splitlines()
+        assert lines[0] == "Query on items"
+        assert "Access: index lookup (1000 candidate rows)" in plan
+        first = next(i for i, l in enumerate(lines) if "1. " in l)
+        assert "status = 'open'" in lines[first]
+        assert "note LIKE '%1%'" in lines[first + 1]
+        assert "selectivity=0.5000" in lines[first]
+        assert "top-K heap (k=5)" in plan
+
+
+class TestConcurrentParsing:
+    """Tests for sharing one parser/engine across threads."""
+
+    @pytest.fixture
+    def fast_switching(self):
+        # Force frequent thread switches so interleaved parses actually overlap
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        yield
+        sys.setswitchinterval(interval)
+
+    def queries(self):
+        return [
+            f"SELECT name, price FROM products WHERE price > {i} AND "
+            f"(category = 'c{i % 7}' OR name LIKE '%{i}%') ORDER BY price DESC LIMIT {i % 5 + 1}"
+            if i % 2 else
+            f"products WHERE id IN ({i}, {i + 1}, {i + 2}) AND NOT stock BETWEEN {i} AND {i * 2}"
+            for i in range(300)
+        ]
+
+    def test_shared_parser_stress(self, fast_switching):
+        """One parser used from many threads should match serial parsing."""
+        queries = self.queries()
+        expected = [QueryParser().parse(q) for q in queries]
+        parser = QueryParser()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(3):
+                assert list(pool.map(parser.parse, queries)) == expected
+
+    def test_shared_engine_stress(self, fast_switching):
+        """A shared engine should execute concurrent queries correctly."""
+        engine = ATONQueryEngine(cache_size=32)  # Small cache: many misses
+        products = [
+            {"id": i, "name": f"item {i}", "price": i % 50,
+             "category": f"c{i % 7}", "stock": i % 13}
+            for i in range(200)
+        ]
+        data = {"products": products}
+        queries = self.queries()
+        expected = [ATONQueryEngine().execute(data, ATONQueryEngine().parse(q))
+                    for q in queries]
+
+        def run(query):
+            return engine.execute(data, engine.compile(query))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for _ in range(3):
+                assert list(pool.map(run, queries)) == expected
+
+
+class TestPreparedQueries:
+    """Tests for ? parameters and prepared queries."""
+
+    @pytest.fixture
+    def products(self):
+        return {"products": [
+            {"id": 1, "name": "O'Brien desk", "category": "Office", "price": 250},
+            {"id": 2, "name": "Chair", "category": "Office", "price": 90},
+            {"id": 3, "name": "Lamp", "category": "Home", "price": 40},
+            {"id": 4, "name": "Sofa", "category": "Home", "price": 900},
+        ]}
+
+    def test_parse_parameters(self, query_engine):
+        """? placeholders should parse into numbered parameters."""
+        parsed = query_engine.parse("products WHERE category = ? AND price BETWEEN ? AND ?")
+        assert parsed.parameter_count == 3
+        first, second = parsed.where_expression.conditions
+        assert first.value == QueryParameter(0)
+        assert (second.value, second.value2) == (QueryParameter(1), QueryParameter(2))
+
+    def test_bind_and_execute(self, query_engine, products):
+        """Bound values should behave exactly like literals."""
+        prepared = query_engine.prepare("products WHERE category = ? AND price < ?")
+        rows = query_engine.execute(products, prepared.bind("Office", 100))
+        assert [r["id"] for r in rows] == [2]
+        rows = query_engine.execute(products, prepared, ("Home", 1000))
+        assert [r["id"] for r in rows] == [3, 4]
+
+    def test_values_need_no_escaping(self, query_engine, products):
+        """Quotes in bound strings should be matched literally."""
+        prepared = query_engine.prepare("products WHERE name = ?")
+        assert query_engine.execute(products, prepared, ["O'Brien desk"])[0]["id"] == 1
+
+    def test_in_parameters(self, query_engine, products):
+        """IN accepts both a list of ? and a single ? bound to a sequence."""
+        listed = query_engine.prepare("products WHERE id IN (?, ?)")
+        assert len(query_engine.execute(products, listed, (1, 3))) == 2
+        whole = query_engine.prepare("products WHERE id IN ?")
+        assert len(query_engine.execute(products, whole, ([1, 2, 4],))) == 3
+        with pytest.raises(ATONQueryError):
+            whole.bind("1,2")
+
+    def test_bind_does_not_replan(self, query_engine, products, monkeypatch):
+        """bind() should reuse the compiled plan and only attach values."""
+        from aton_format.query import compiler
+        prepared = query_engine.prepare(
+            "products WHERE (category = ? OR name = 'Sofa') AND price < ?"
+        )
+
+        def fail(*args, **kwargs):
+            raise AssertionError("plan rebuilt on bind")
+        monkeypatch.setattr(compiler, "reorder", fail)
+        monkeypatch.setattr(compiler, "compile_expression", fail)
+        office = prepared.bind("Office", 1000)
+        home = prepared.bind("Home", 100)
+        assert [r["id"] for r in query_engine.execute(products, office)] == [1, 2, 4]
+        assert [r["id"] for r in query_engine.execute(products, home)] == [3]
+
+    def test_wrong_parameter_count(self, query_engine):
+        """Binding the wrong number of values should raise."""
+        prepared = query_engine.prepare("products WHERE price > ?")
+        with pytest.raises(ATONQueryError, match="Expected 1 parameters"):
+            prepared.bind(1, 2)
+
+    def test_unbound_query_rejected(self, query_engine, products):
+        """Executing a template without binding it should raise."""
+        with pytest.raises(ATONQueryError, match="unbound"):
+            query_engine.execute(products, query_engine.compile("products WHERE price > ?"))
+
+    def test_prepare_reuses_parse(self, query_engine, products):
+        """Preparing the same text twice should hit the query cache."""
+        query_engine.prepare("products WHERE price > ?")
+        query_engine.prepare("products  WHERE price > ?")
+        assert query_engine.query_cache.stats()["hits"] == 1
+
+
+class TestParallelExecution:
+    """Tests for partitioned parallel execution."""
+
+    QUERIES = [
+        "events WHERE kind = 'click' AND score > 40",
+        "events WHERE kind = 'view' OR score < 5 LIMIT 25 OFFSET 10",
+        "events WHERE score BETWEEN 10 AND 20 ORDER BY score DESC, id",
+        "events WHERE user LIKE '%7%' ORDER BY score LIMIT 15",
+        "events ORDER BY kind, score DESC LIMIT 40 OFFSET 5",
+        "events SELECT id, score WHERE kind != 'view' ORDER BY score DESC LIMIT 12",
+        "SELECT kind, COUNT(*), AVG(weight) AS w FROM events WHERE score > 30 GROUP BY kind",
+        "events LIMIT 7",
+    ]
+
+    @pytest.fixture
+    def events(self):
+        kinds = ["click", "view", "buy", None]
+        return {"events": [
+            {"id": i, "kind": kinds[i % 4], "score": (i * 37) % 101,
+             "user": f"u{i % 97}", "weight": i * 0.1}
+            for i in range(3000)
+        ]}
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_threads_match_serial(self, query_engine, events, query):
+        """Thread-partitioned results should equal serial execution."""
+        parsed = query_engine.parse(query)
+        expected = query_engine.execute(events, parsed)
+        with ParallelExecutor(query_engine, workers=4, backend="thread",
+                              partition_size=256) as executor:
+            assert executor.execute(events, parsed) == expected
+
+    def test_processes_match_serial(self, query_engine, events):
+        """Process workers should compile predicates locally and match serial."""
+        results = {}
+        for query in self.QUERIES[:5]:
+            results[query] = query_engine.execute(events, query_engine.parse(query))
+        with ParallelExecutor(query_engine, workers=2, backend="process",
+                              partition_size=500) as executor:
+            for query, expected in results.items():
+                assert executor.execute(events, query_engine.parse(query)) == expected
+
+    def test_limit_stops_early(self, query_engine, events, monkeypatch):
+        """Without ORDER BY, LIMIT should leave later partitions unscanned."""
+        from aton_format.query import parallel
+        scanned = []
+        original = parallel._scan_partition
+
+        def counting(where, keys, k, records):
+            scanned.append(records[0]["id"])
+            return original(where, keys, k, records)
+
+        monkeypatch.setattr(parallel, "_scan_partition", counting)
+        with ParallelExecutor(query_engine, workers=2, backend="thread",
+                              partition_size=100) as executor:
+            rows = executor.execute(events, query_engine.parse("events WHERE score > 10 LIMIT 5"))
+        assert [r["id"] for r in rows] == [1, 2, 4, 5, 6]
+        assert len(scanned) < 30
+
+    def test_engine_wrapper_with_params(self, query_engine, events):
+        """execute_parallel should accept prepared queries."""
+        prepared = query_engine.prepare("events WHERE kind = ? ORDER BY score LIMIT 3")
+        expected = query_engine.execute(events, prepared, ["buy"])
+        assert query_engine.execute_parallel(events, prepared, ["buy"], workers=3,
+                                             backend="thread", partition_size=200) == expected
+
+    def test_small_tables_run_serially(self, query_engine, events):
+        """Tables below two partitions should not start a pool."""
+        executor = ParallelExecutor(query_engine, workers=4, backend="thread")
+        executor.execute(events, query_engine.parse("events WHERE score > 3"))
+        assert executor._pool is None
+
+    def test_invalid_backend(self, query_engine):
+        """Unknown backends should raise ValueError."""
+        with pytest.raises(ValueError):
+            ParallelExecutor(query_engine, backend="gpu")
+
+
+class TestResultCache:
+    """Tests for the versioned query result cache."""
+
+    @pytest.fixture
+    def engine(self):
+        engine = ATONQueryEngine(result_cache_size=8)
+        engine.register_table("orders", [
+            {"id": i, "status": "open" if i % 3 else "done", "total": i * 10}
+            for i in range(30)
+        ])
+        return engine
+
+    def test_repeated_query_hits(self, engine):
+        """Identical queries over unchanged tables should be served from cache."""
+        first = engine.execute(None, engine.parse("orders WHERE status = 'done'"))
+        second = engine.execute(None, engine.parse("orders WHERE status = 'done'"))
+        assert first == second
+        stats = engine.result_cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+    def test_append_invalidates(self, engine):
+        """append() should bump the version so results are recomputed."""
+        query = engine.parse("SELECT COUNT(*) FROM orders")
+        assert engine.execute(None, query) == [{"count": 30}]
+        engine.append("orders", [{"id": 30, "status": "open", "total": 0}])
+        assert engine.execute(None, query) == [{"count": 31}]
+        assert engine.versions["orders"] == 2
+
+    def test_reregister_and_direct_append_invalidate(self, engine):
+        """Re-registering or growing the list directly should not serve stale rows."""
+        query = engine.parse("SELECT COUNT(*) FROM orders")
+        engine.execute(None, query)
+        engine.tables["orders"].append({"id": 99})
+        assert engine.execute(None, query) == [{"count": 31}]
+        engine.register_table("orders", [{"id": 1}])
+        assert engine.execute(None, query) == [{"count": 1}]
+
+    def test_touch_after_in_place_edit(self, engine):
+        """touch() should invalidate after editing records in place."""
+        query = engine.parse("SELECT status FROM orders WHERE id = 3")
+        assert engine.execute(None, query) == [{"status": "done"}]
+        engine.tables["orders"][3]["status"] = "open"
+        engine.touch("orders")
+        assert engine.execute(None, query) == [{"status": "open"}]
+
+    def test_results_are_copies(self, engine):
+        """Mutating returned rows should not corrupt the cache or the table."""
+        query = engine.parse("orders WHERE id = 1")
+        engine.execute(None, query)[0]["total"] = -1
+        assert engine.execute(None, query)[0]["total"] == 10
+        assert engine.tables["orders"][1]["total"] == 10
+
+    def test_unregistered_data_not_cached(self, engine):
+        """Queries over ad-hoc data should bypass the cache."""
+        data = {"orders": [{"id": 1}]}
+        engine.execute(data, engine.parse("orders"))
+        assert engine.result_cache.size == 0
+        assert engine.execute(engine.tables, engine.parse("orders LIMIT 1"))
+        assert engine.result_cache.size == 1
+
+    def test_prepared_parameters_in_key(self, engine):
+        """Different bound values should be cached separately."""
+        prepared = engine.prepare("orders WHERE id = ?")
+        assert engine.execute(None, prepared, [1])[0]["id"] == 1
+        assert engine.execute(None, prepared, [2])[0]["id"] == 2
+
+    def test_key_ignores_repr_of_values(self, engine):
+        """Bound values sharing a repr should still get separate entries."""
+        class Label(str):
+            def __repr__(self):
+                return "label"
+        prepared = engine.prepare("orders WHERE status = ?")
+        assert len(engine.execute(None, prepared, [Label("open")])) == 20
+        assert len(engine.execute(None, prepared, [Label("done")])) == 10
+        assert engine.result_cache.size == 2
+
+    def test_unhashable_values_not_cached(self, engine):
+        """Queries whose key cannot be hashed should run uncached."""
+        query = ParsedQuery(table="orders", where_expression=QueryCondition("id", "=", {"id": 1}))
+        assert engine.execute(None, query) == []
+        assert engine.result_cache.size == 0
+
+    def test_disabled_by_default(self, query_engine):
+        """Without result_cache_size there is no result cache."""
+        assert query_engine.result_cache is None
+
+    def test_encode_with_query_cached(self):
+        """Encoded text should be cached per table version."""
+        encoder = ATONEncoder(result_cache_size=4)
+        engine = encoder.query_engine
+        engine.register_table("orders", [{"id": 1, "total": 5}, {"id": 2, "total": 7}])
+        first = encoder.encode_with_query(None, "orders WHERE total > 6")
+        assert encoder.encode_with_query(None, "orders WHERE total > 6") is first
+        assert engine.result_cache.size == 1  # Text only, rows are not cached too
+        engine.append("orders", [{"id": 3, "total": 9}])
+        assert "orders(2)" in encoder.encode_with_query(None, "orders WHERE total > 6")